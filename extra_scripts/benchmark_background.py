@@ -0,0 +1,167 @@
+"""
+Benchmark of the static flat field against the adaptive background model of the detector.
+
+The first frame of the video is the flat field of both detectors, as in Coordinator.run with
+flat_field_flag. A lighting drift is simulated adding a brightness ramp to the frames (from 0 to
+--drift gray levels at the end of the video, e.g. the sun or a lamp warming up along a shift).
+The reference is the static detector on the frames without drift.
+
+For every mode it reports the latency of the detection, the cost of the background update
+(detect.background), and the agreement with the reference: frames with the same number of
+pieces and intersection over union of the segmented pixels.
+
+The simulated drift is much faster than a real one, hours compressed in a video: the model lags
+behind a ramp by about slope / learning rate gray levels. --rate sets a faster learning rate to
+compare the steady state.
+
+Usage:
+    python -m extra_scripts.benchmark_background --drift 40 --max-frames 600
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+import src.config_vars as cfv
+from src.benchmark import get_sample_videos, iter_video_frames, latency_summary
+from src.detector.background_model import BackgroundModel
+from src.detector.color_detector import ColorDetector
+from src.detector.denoise_method import DenoiseMethod
+from src.instrumentation import INSTRUMENTATION
+
+
+def create_detector(thresh: int, adaptive: bool, learning_rate: float = cfv.DETECTOR_BACKGROUND_RATE) -> ColorDetector:
+    """
+    Create a detector configured as in the coordinator.
+
+    Args:
+        thresh (int): Detector threshold, on the difference with the flat field.
+        adaptive (bool): Update the flat field with the background model.
+        learning_rate (float): Learning rate of the background model.
+
+    Returns:
+        ColorDetector: The detector.
+    """
+    background_model = BackgroundModel(learning_rate=learning_rate,
+                                       foreground_rate=cfv.DETECTOR_BACKGROUND_FOREGROUND_RATE,
+                                       margin=cfv.DETECTOR_BACKGROUND_MARGIN // cfv.DETECTOR_SCALE
+                                       ) if adaptive else None
+    return ColorDetector(thresh=thresh, min_area=cfv.DETECTOR_MIN_AREA, roi=cfv.BELT_ROI,
+                         denoise_method=DenoiseMethod(cfv.DETECTOR_DENOISE_METHOD),
+                         reuse_buffers=cfv.DETECTOR_REUSE_BUFFERS, background_model=background_model,
+                         scale=cfv.DETECTOR_SCALE)
+
+
+def add_drift(frame: np.ndarray, offset: float) -> np.ndarray:
+    """
+    Add a brightness offset to a frame, saturated.
+
+    Args:
+        frame (np.ndarray): The BGR frame.
+        offset (float): Gray levels added, negative darkens.
+
+    Returns:
+        np.ndarray: The new frame.
+    """
+    if offset >= 0:
+        return cv2.add(frame, (offset, offset, offset, 0))
+    return cv2.subtract(frame, (-offset, -offset, -offset, 0))
+
+
+def run_video(video_path: Path, thresh: int, drift: float, max_frames: int | None = None,
+              learning_rate: float = cfv.DETECTOR_BACKGROUND_RATE) -> dict:
+    """
+    Detect the pieces of a video with a drift in the static and the adaptive detectors.
+
+    Args:
+        video_path (Path): The video file.
+        thresh (int): Detector threshold.
+        drift (float): Gray levels added at the end of the video.
+        max_frames (int | None): Maximum number of frames.
+        learning_rate (float): Learning rate of the background model.
+
+    Returns:
+        dict: Results, JSON serializable.
+    """
+    frames = list(iter_video_frames(video_path, max_frames))
+    if not frames:
+        return {'video': video_path.name, 'frames': 0}
+
+    modes = {'reference': create_detector(thresh, adaptive=False),
+             'static': create_detector(thresh, adaptive=False),
+             'adaptive': create_detector(thresh, adaptive=True, learning_rate=learning_rate)}
+    for detector in modes.values():
+        detector.flat_field = frames[0]
+        detector.initialize()
+
+    instrumentation_enabled = INSTRUMENTATION.enabled
+    INSTRUMENTATION.enabled = True
+    results = {}
+    reference = []
+    for mode, detector in modes.items():
+        INSTRUMENTATION.reset()
+        detect_ns = []
+        same_count = 0
+        ious = []
+        for i, frame in enumerate(frames):
+            if mode != 'reference':
+                frame = add_drift(frame, drift * i / max(len(frames) - 1, 1))
+            t = time.perf_counter_ns()
+            threshold_image, pieces = detector.detect(frame, merge_pieces=False)
+            detect_ns.append(time.perf_counter_ns() - t)
+            mask = threshold_image > 0
+            if mode == 'reference':
+                reference.append((len(pieces), mask))
+                continue
+            reference_count, reference_mask = reference[i]
+            same_count += len(pieces) == reference_count
+            union = np.count_nonzero(mask | reference_mask)
+            if union:
+                ious.append(np.count_nonzero(mask & reference_mask) / union)
+        detector.release()
+        if mode == 'reference':
+            continue
+        background = INSTRUMENTATION.get_histogram('detect.background')
+        results[mode] = {'detect': latency_summary(detect_ns),
+                         'background_update': background.summary() if background is not None else {},
+                         'same_pieces_count': round(same_count / len(frames), 4),
+                         'mean_iou': round(float(np.mean(ious)), 4) if ious else None}
+    INSTRUMENTATION.enabled = instrumentation_enabled
+
+    return {'video': video_path.name, 'frames': len(frames), 'thresh': thresh, 'drift': drift,
+            'learning_rate': learning_rate, 'modes': results}
+
+
+def main():
+    """
+    main
+    """
+    parser = argparse.ArgumentParser(description='Static flat field against the adaptive background model.')
+    parser.add_argument('videos', nargs='*', type=Path, help='Video files. Default: the sample videos')
+    parser.add_argument('--thresh', type=int, default=cfv.RPI_CAM_THRESHOLD,
+                        help='Detector threshold. Default: config RPI_CAM_THRESHOLD')
+    parser.add_argument('--drift', type=float, default=40, help='Gray levels added at the end. Default: 40')
+    parser.add_argument('--rate', type=float, default=cfv.DETECTOR_BACKGROUND_RATE,
+                        help='Learning rate of the background model. Default: config DETECTOR_BACKGROUND_RATE')
+    parser.add_argument('--max-frames', type=int, default=None, help='Maximum frames per video')
+    parser.add_argument('--output', type=Path, default=None, help='JSON output file. Default: stdout')
+    args = parser.parse_args()
+
+    video_paths = args.videos or get_sample_videos()[:1]
+    results = [run_video(video_path, args.thresh, args.drift, args.max_frames, learning_rate=args.rate)
+               for video_path in video_paths]
+
+    if args.output is None:
+        print(json.dumps(results, indent=4))
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print('Results saved in', args.output)
+
+
+if __name__ == '__main__':
+    main()
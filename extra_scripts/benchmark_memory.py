@@ -0,0 +1,133 @@
+"""
+Memory benchmark of the frame loop (sensor read, detection and tracking) with and
+without the preallocated buffers (sensor frame pool and detector scratch buffers).
+
+tracemalloc traces the NumPy arrays, also the ones allocated by OpenCV, in every thread
+(the file camera decodes ahead in its own thread). For every frame it reports the
+transient memory (peak above the memory held before the frame) and, at the end, the
+number of buffers allocated by the pools after the warm up.
+
+Usage:
+    python -m extra_scripts.benchmark_memory --max-frames 300
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+import src.config_vars as cfv
+from src.benchmark import get_sample_videos, latency_summary
+from src.buffer_pool import FramePool
+from src.detector.color_detector import ColorDetector
+from src.detector.denoise_method import DenoiseMethod
+from src.sensor.file_camera import VideoFileCamera, EndOfStreamException
+from src.tracker import Tracker
+
+
+def run_frames(video_path: Path, reuse: bool, thresh: int | None = None, max_frames: int | None = None,
+               warmup: int = 10, denoise_method: str = cfv.DETECTOR_DENOISE_METHOD) -> dict:
+    """
+    Read, detect and track the frames of a video tracing the memory.
+
+    Args:
+        video_path (Path): The video file.
+        reuse (bool): Use the frame pool and the detector scratch buffers.
+        thresh (int | None): Detector threshold. None keeps the detector default.
+        max_frames (int | None): Maximum number of measured frames.
+        warmup (int): Frames processed before measuring, the pools are filled.
+        denoise_method (str): Noise reduction strategy of the detector (DenoiseMethod value).
+
+    Returns:
+        dict: Results, JSON serializable.
+    """
+    camera = VideoFileCamera(video_path, realtime=False)
+    camera.frame_pool = FramePool(cfv.SENSOR_FRAME_POOL_SIZE) if reuse else None
+    detector = ColorDetector(min_area=cfv.DETECTOR_MIN_AREA, denoise_method=DenoiseMethod(denoise_method),
+                             reuse_buffers=reuse)
+    if thresh is not None:
+        detector._thresh = thresh
+    tracker = Tracker(min_similarity=cfv.TRACKER_MIN_SIMILARITY)
+    tracker._x_addition_limit = cfv.X_ADDITION_LIMIT
+    tracker._x_expulsion_limit = cfv.X_EXPULSION_LIMIT
+    camera.initialize()
+    detector.initialize()
+
+    transient_bytes = []
+    frame_ns = []
+    pool_allocations = scratch_allocations = 0
+    frames = 0
+    tracemalloc.start()
+    try:
+        while max_frames is None or frames < warmup + max_frames:
+            if frames == warmup:
+                pool_allocations = camera.frame_pool.allocations if reuse else 0
+                scratch_allocations = detector.buffers.allocations if reuse else 0
+            held, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            t_0 = time.perf_counter_ns()
+            try:
+                frame = camera.read()
+            except EndOfStreamException:
+                break
+            _, pieces = detector.detect(frame, merge_pieces=False)
+            tracker.update(pieces)
+            t_1 = time.perf_counter_ns()
+            _, peak = tracemalloc.get_traced_memory()
+            camera.release_frame(frame)
+            del frame
+            if frames >= warmup:
+                transient_bytes.append(peak - held)
+                frame_ns.append(t_1 - t_0)
+            frames += 1
+    finally:
+        tracemalloc.stop()
+        camera.release()
+        detector.release()
+
+    transient_kb = np.array(transient_bytes, dtype=np.float64) / 1024
+    return {'video': video_path.name,
+            'reuse': reuse,
+            'frames': len(transient_bytes),
+            'transient_kb': {'p50': round(float(np.percentile(transient_kb, 50)), 1),
+                             'p99': round(float(np.percentile(transient_kb, 99)), 1),
+                             'max': round(float(transient_kb.max()), 1)} if transient_bytes else {},
+            'pool_allocations_after_warmup': (camera.frame_pool.allocations - pool_allocations) if reuse else None,
+            'scratch_allocations_after_warmup': (detector.buffers.allocations - scratch_allocations) if reuse else None,
+            'pool_size': len(camera.frame_pool) if reuse else None,
+            'scratch_kb': round(detector.buffers.nbytes / 1024, 1) if reuse else None,
+            'frame': latency_summary(frame_ns)}
+
+
+def main():
+    """
+    main
+    """
+    parser = argparse.ArgumentParser(description='Memory benchmark of the frame loop with and without buffer reuse.')
+    parser.add_argument('videos', nargs='*', type=Path, help='Video files. Default: the sample videos')
+    parser.add_argument('--thresh', type=int, default=None, help='Detector threshold. Default: detector default')
+    parser.add_argument('--max-frames', type=int, default=None, help='Maximum frames per video')
+    parser.add_argument('--denoise', default=cfv.DETECTOR_DENOISE_METHOD,
+                        choices=[method.value for method in DenoiseMethod],
+                        help='Detector noise reduction strategy. Default: config DETECTOR_DENOISE_METHOD')
+    parser.add_argument('--output', type=Path, default=None, help='JSON output file. Default: stdout')
+    args = parser.parse_args()
+
+    video_paths = args.videos or get_sample_videos()[:1]
+    results = [run_frames(video_path, reuse, thresh=args.thresh, max_frames=args.max_frames,
+                          denoise_method=args.denoise)
+               for video_path in video_paths for reuse in (False, True)]
+
+    if args.output is None:
+        print(json.dumps(results, indent=4))
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print('Results saved in', args.output)
+
+
+if __name__ == '__main__':
+    main()
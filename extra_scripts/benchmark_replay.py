@@ -0,0 +1,58 @@
+"""
+Replay the recorded belt videos through the detector, the tracker and the classifier
+without camera or window, and export the per-stage latencies as JSON.
+
+Usage:
+    python -m extra_scripts.benchmark_replay --output data/generated/benchmark.json
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import src.config_vars as cfv
+from src.detector.color_detector import ColorDetector
+from src.detector.denoise_method import DenoiseMethod
+from src.benchmark import SAMPLE_VIDEOS_PATH, SAMPLE_VIDEOS_PATTERN, get_sample_videos, run_benchmark
+
+
+def main():
+    """
+    main
+    """
+    parser = argparse.ArgumentParser(description='Headless replay benchmark over the sample videos.')
+    parser.add_argument('videos', nargs='*', type=Path,
+                        help=f'Video files. Default: {SAMPLE_VIDEOS_PATH}/{SAMPLE_VIDEOS_PATTERN}')
+    parser.add_argument('--thresh', type=int, default=None, help='Detector threshold. Default: detector default')
+    parser.add_argument('--merge-pieces', action='store_true', help='Merge close components')
+    parser.add_argument('--max-frames', type=int, default=None, help='Maximum frames per video')
+    parser.add_argument('--roi', type=int, nargs=4, default=cfv.BELT_ROI, metavar=('X', 'Y', 'W', 'H'),
+                        help='Belt region of interest. Default: config BELT_ROI')
+    parser.add_argument('--denoise', default=cfv.DETECTOR_DENOISE_METHOD,
+                        choices=[method.value for method in DenoiseMethod],
+                        help='Detector noise reduction strategy. Default: config DETECTOR_DENOISE_METHOD')
+    parser.add_argument('--scale', type=int, default=cfv.DETECTOR_SCALE, choices=ColorDetector.SCALES,
+                        help='Downscale factor of the segmentation. Default: config DETECTOR_SCALE')
+    parser.add_argument('--motion-gate', action='store_true', help='Skip the frames rejected by the motion gate')
+    parser.add_argument('--output', type=Path, default=None, help='JSON output file. Default: stdout')
+    args = parser.parse_args()
+
+    video_paths = args.videos or get_sample_videos()
+    if not video_paths:
+        raise FileNotFoundError(f'No videos found in {SAMPLE_VIDEOS_PATH}')
+
+    results = run_benchmark(video_paths, thresh=args.thresh, merge_pieces=args.merge_pieces,
+                            max_frames=args.max_frames, roi=tuple(args.roi) if args.roi else None,
+                            denoise_method=args.denoise, scale=args.scale, motion_gate=args.motion_gate,
+                            verbose=args.output is not None)
+
+    if args.output is None:
+        print(json.dumps(results, indent=4))
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print('Results saved in', args.output)
+
+
+if __name__ == '__main__':
+    main()
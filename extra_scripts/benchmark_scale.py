@@ -0,0 +1,179 @@
+"""
+Accuracy and speed of the downscaled segmentation of the detector (ColorDetector scale)
+against the full resolution one, on the sample videos.
+
+Every frame is detected at scale 1 (the reference) and at the other scales. The pieces are
+matched to the reference pieces by bounding box overlap and compared:
+    matched / missed / extra: pieces with an IoU of at least --min-iou, reference pieces not
+        found, pieces not in the reference.
+    bbox_iou, centroid_error_px, area_error: mean over the matched pieces.
+    color_error: mean euclidean distance of the BGR mean colors.
+    same_material: matched pieces classified as the same material.
+Then the videos are replayed with the tracker, as in benchmark_replay, to compare the
+released pieces per material and the detection latency.
+
+Usage:
+    python -m extra_scripts.benchmark_scale --scales 2 4 --max-frames 300
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+import src.config_vars as cfv
+import src.utils as ut
+from src.benchmark import (create_detector_and_tracker, get_sample_videos, iter_video_frames, latency_summary,
+                           replay_video)
+from src.detector.color_detector import ColorDetector
+from src.piece.piece import Piece, classify_pieces
+
+
+def get_bboxes_iou(bboxes_1: np.ndarray, bboxes_2: np.ndarray) -> np.ndarray:
+    """
+    Intersection over union of every pair of bounding boxes.
+
+    Args:
+        bboxes_1 (np.ndarray): (N, 4) bounding boxes (x, y, w, h).
+        bboxes_2 (np.ndarray): (M, 4) bounding boxes (x, y, w, h).
+
+    Returns:
+        np.ndarray: (N, M) IoU matrix.
+    """
+    x_1, y_1, w_1, h_1 = (bboxes_1[:, np.newaxis, i] for i in range(4))
+    x_2, y_2, w_2, h_2 = (bboxes_2[np.newaxis, :, i] for i in range(4))
+    inter_w = np.clip(np.minimum(x_1 + w_1, x_2 + w_2) - np.maximum(x_1, x_2), 0, None)
+    inter_h = np.clip(np.minimum(y_1 + h_1, y_2 + h_2) - np.maximum(y_1, y_2), 0, None)
+    intersection = inter_w * inter_h
+    return intersection / (w_1 * h_1 + w_2 * h_2 - intersection)
+
+
+def match_pieces(reference: list[Piece], pieces: list[Piece], min_iou: float) -> list[tuple[Piece, Piece, float]]:
+    """
+    Match the pieces to the reference pieces maximizing the bounding box overlap.
+
+    Args:
+        reference (list[Piece]): The pieces of the full resolution detection.
+        pieces (list[Piece]): The pieces of the downscaled detection.
+        min_iou (float): Minimum IoU of a match.
+
+    Returns:
+        list: (reference piece, piece, IoU) of every match.
+    """
+    if not reference or not pieces:
+        return []
+    iou = get_bboxes_iou(np.array([piece.bbox for piece in reference], dtype=np.float64),
+                         np.array([piece.bbox for piece in pieces], dtype=np.float64))
+    rows, cols = ut.linear_sum_assignment(-iou)
+    return [(reference[row], pieces[col], float(iou[row, col]))
+            for row, col in zip(rows, cols) if iou[row, col] >= min_iou]
+
+
+def compare_video(video_path: Path, scales: list[int], thresh: int | None = None, max_frames: int | None = None,
+                  min_iou: float = 0.5) -> dict:
+    """
+    Detect the frames of a video at full resolution and downscaled, and compare the pieces.
+
+    Args:
+        video_path (Path): The video file.
+        scales (list[int]): Downscale factors to compare with scale 1.
+        thresh (int | None): Detector threshold. None keeps the detector default.
+        max_frames (int | None): Maximum number of frames.
+        min_iou (float): Minimum bounding box IoU of a match.
+
+    Returns:
+        dict: Comparison per scale, JSON serializable.
+    """
+    detectors = {scale: create_detector_and_tracker(thresh, scale=scale)[0] for scale in [1] + scales}
+    detect_ns: dict[int, list[int]] = {scale: [] for scale in detectors}
+    counts = {scale: {'matched': 0, 'missed': 0, 'extra': 0, 'same_material': 0} for scale in scales}
+    errors: dict[int, dict[str, list[float]]] = {scale: {'bbox_iou': [], 'centroid_error_px': [],
+                                                          'area_error': [], 'color_error': []} for scale in scales}
+    frames = 0
+    for frame in iter_video_frames(video_path, max_frames):
+        frames += 1
+        pieces = {}
+        for scale, detector in detectors.items():
+            t = time.perf_counter_ns()
+            _, pieces[scale] = detector.detect(frame, merge_pieces=False)
+            detect_ns[scale].append(time.perf_counter_ns() - t)
+            classify_pieces(pieces[scale])
+        for scale in scales:
+            matches = match_pieces(pieces[1], pieces[scale], min_iou)
+            counts[scale]['matched'] += len(matches)
+            counts[scale]['missed'] += len(pieces[1]) - len(matches)
+            counts[scale]['extra'] += len(pieces[scale]) - len(matches)
+            for reference_piece, piece, iou in matches:
+                counts[scale]['same_material'] += reference_piece.name == piece.name
+                errors[scale]['bbox_iou'].append(iou)
+                errors[scale]['centroid_error_px'].append(
+                    float(np.hypot(*np.subtract(reference_piece.get_last_positon(), piece.get_last_positon()))))
+                reference_area = reference_piece.calculate_area()
+                errors[scale]['area_error'].append(abs(piece.calculate_area() - reference_area) / reference_area)
+                errors[scale]['color_error'].append(float(np.linalg.norm(
+                    np.subtract(reference_piece.calculate_mean_color(), piece.calculate_mean_color()))))
+
+    results = {'video': video_path.name, 'frames': frames,
+               'reference': {'pieces': sum(counts[scales[0]][key] for key in ('matched', 'missed')) if scales else 0,
+                             'detect': latency_summary(detect_ns[1])},
+               'scales': {}}
+    for scale in scales:
+        matched = counts[scale]['matched']
+        results['scales'][scale] = {
+            **counts[scale],
+            'same_material': round(counts[scale]['same_material'] / matched, 4) if matched else None,
+            **{error: round(float(np.mean(values)), 4) if values else None for error, values in errors[scale].items()},
+            'detect': latency_summary(detect_ns[scale])}
+    return results
+
+
+def main():
+    """
+    main
+    """
+    parser = argparse.ArgumentParser(description='Downscaled segmentation against full resolution.')
+    parser.add_argument('videos', nargs='*', type=Path, help='Video files. Default: the sample videos')
+    parser.add_argument('--scales', type=int, nargs='+', default=[2, 4], choices=ColorDetector.SCALES[1:],
+                        help='Downscale factors compared with the full resolution. Default: 2 4')
+    parser.add_argument('--thresh', type=int, default=None, help='Detector threshold. Default: detector default')
+    parser.add_argument('--max-frames', type=int, default=None, help='Maximum frames per video')
+    parser.add_argument('--min-iou', type=float, default=0.5, help='Minimum bounding box IoU of a match')
+    parser.add_argument('--no-replay', action='store_true', help='Do not replay the videos with the tracker')
+    parser.add_argument('--output', type=Path, default=None, help='JSON output file. Default: stdout')
+    args = parser.parse_args()
+
+    video_paths = args.videos or get_sample_videos()
+    results = []
+    for video_path in video_paths:
+        result = compare_video(video_path, args.scales, thresh=args.thresh, max_frames=args.max_frames,
+                               min_iou=args.min_iou)
+        if not args.no_replay:
+            # Released pieces per material, end to end with the tracker
+            result['replay'] = {}
+            for scale in [1] + args.scales:
+                replay = replay_video(video_path, thresh=args.thresh, max_frames=args.max_frames, instrument=False,
+                                      scale=scale)
+                result['replay'][scale] = {'fps': replay['fps'],
+                                           'detect_p50_ms': replay['stages']['detect'].get('p50_ms'),
+                                           'pieces_released': replay['pieces_released'],
+                                           'released_by_material': replay['released_by_material']}
+        results.append(result)
+        print(f"{video_path.name}: " + ', '.join(
+            f"x{scale} {values['matched']} matched {values['missed']} missed {values['extra']} extra, "
+            f"detect p50 {values['detect'].get('p50_ms')} ms" for scale, values in result['scales'].items()))
+
+    output = {'config': {'thresh': args.thresh, 'min_area': cfv.DETECTOR_MIN_AREA, 'roi': cfv.BELT_ROI,
+                         'denoise_method': cfv.DETECTOR_DENOISE_METHOD, 'min_iou': args.min_iou},
+              'videos': results}
+    if args.output is None:
+        print(json.dumps(output, indent=4))
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(output, f, indent=4)
+        print('Results saved in', args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Microbenchmark of the encoders of the released pieces: RawPiece.pack (native
+struct), Piece.pack (JSON) and the little-endian piece records of src/protocol.py.
+
+Usage:
+    python -m extra_scripts.benchmark_wire_format
+"""
+
+import timeit
+
+from src.coordinator import RawPiece
+from src.piece.piece import Piece
+from src.protocol import (PieceRecord, decode_record, decode_records, encode_record, encode_records,
+                          get_record_size)
+
+
+def create_piece() -> Piece:
+    """
+    Create a tracked piece with some history.
+    """
+    piece = Piece(id=7, bbox=(100, 200, 40, 30))
+    for i in range(20):
+        piece.add_position((100.0 + 10 * i, 200.0))
+        piece.add_mean_color((83, 105, 136))
+        piece.add_area(1200)
+    return piece
+
+
+def main():
+    """
+    main
+    """
+    piece = create_piece()
+    record = piece.to_record()
+    records = [record] * 32
+    raw_piece = RawPiece(record.material, record.timestamp_ms, record.speed)
+    buffer = bytearray(32 * get_record_size(extended=True))
+
+    cases = {
+        'RawPiece.pack': lambda: raw_piece.pack(),
+        'Piece.pack (JSON)': lambda: piece.pack(),
+        'Piece.to_record': lambda: piece.to_record(),
+        'encode_record': lambda: encode_record(record),
+        'encode_record extended': lambda: encode_record(record, extended=True),
+        'encode_records x32 extended': lambda: encode_records(records, extended=True, buffer=buffer),
+        'decode_record extended': lambda: decode_record(encode_record(record, extended=True)),
+        'decode_records x32 extended': lambda: decode_records(memoryview(buffer), get_record_size(extended=True)),
+    }
+    sizes = {'RawPiece.pack': len(raw_piece.pack()), 'Piece.pack (JSON)': len(piece.pack()),
+             'encode_record': get_record_size(), 'encode_record extended': get_record_size(extended=True)}
+
+    print(f"{'encoder':<30}{'us/call':>10}{'bytes':>8}")
+    for name, function in cases.items():
+        number, total = timeit.Timer(function).autorange()
+        print(f"{name:<30}{total / number * 1e6:>10.2f}{sizes.get(name, ''):>8}")
+
+
+if __name__ == '__main__':
+    main()
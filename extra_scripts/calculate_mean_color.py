@@ -2,18 +2,40 @@
 In this script, we calculate the mean color of the images in the dataset.
 The mean color is calculated by cropping the image and blurring it.
 The blurred image is used to calculate the mean color.
+
+Every image is decoded and detected once, the BGR and the LAB mean colors of the
+segmented pixels are calculated together. The images are processed by a pool of
+processes, one detector per process, and the results are written to the CSV files
+as they arrive, so a large dataset does not wait for the slowest material.
+
+Outputs in data/generated/dataset_N:
+    mean_colors/<material>.csv: One row per image with the number of pixels and the BGR and LAB mean colors.
+    mean_colors.json: {'bgr': {material: (b, g, r)}, 'lab': {material: (l, a, b)}}, mean of the images.
+
+Usage:
+    python -m extra_scripts.calculate_mean_color --dataset 4 --workers 4
 """
+import argparse
+import json
 import os
+import time
+from multiprocessing import Pool
 from pathlib import Path
+from typing import TextIO
 
 import cv2
 import numpy as np
-import json
 
 from src.classifier import MaterialEn
 
 from src.detector.color_detector import ColorDetector
-from src.utils import get_directory_filepaths, show_image
+from src.utils import get_directory_filepaths
+
+CSV_HEADER = ("image_filename;pixels;mean_color_blue;mean_color_green;mean_color_red;"
+              "mean_color_l;mean_color_a;mean_color_b\n")
+
+# Detector of each worker process, created once by init_worker()
+_detector: ColorDetector | None = None
 
 
 def export_mean_colors(mean_colors: dict[str, tuple[int, int, int]], output_file: str):
@@ -33,7 +55,7 @@ def get_directories_filepaths(directories: list[Path]) -> list[list[Path]]:
     get_directories_filepaths
     """
     directories_filepaths = []
-    for directory in directories:   
+    for directory in directories:
         filepaths = get_directory_filepaths(directory)
         directories_filepaths.append(filepaths)
     return directories_filepaths
@@ -57,116 +79,153 @@ def calculate_mean_color(mean_colors: list[tuple]) -> tuple[int, int, int]:
     return final_color
 
 
-def get_bgr_mean_color_for_image(image_filename: Path) -> tuple[int, int, int]:
-    """
-    get_mean_color
+def init_worker(thresh: int) -> None:
     """
-    detector = ColorDetector(thresh=80)
-    # 1. Load image
-    image = cv2.imread(str(image_filename))
+    Create the detector of a worker process.
 
-    threshold_image, _ = detector.detect(image)
-
-    # imagen
-    original_image = image.copy()
+    Args:
+        thresh (int): Detector threshold.
+    """
+    global _detector    # pylint: disable=global-statement
+    _detector = ColorDetector(thresh=thresh, reuse_buffers=True)
 
-    # Crear una máscara donde los píxeles negros en la binaria (valor 0) sean True
-    mask = threshold_image == 255  # Los píxeles negros son True
 
-    # Aplicar la máscara a la imagen original para seleccionar los píxeles relevantes
-    selected_pixels = original_image[mask]  # Extrae los píxeles correspondientes a los negros
+def get_mean_colors_for_image(
+        image_filename: Path) -> tuple[int, tuple[float, float, float], tuple[float, float, float]]:
+    """
+    Calculate the BGR and LAB mean colors of the segmented pixels of an image, with a single detection.
+    The detector of the process is created by init_worker().
 
-    # Calcular la media de los colores (en BGR)
-    mean_color = np.mean(selected_pixels, axis=0)
-    return mean_color
+    Args:
+        image_filename (Path): The image file.
 
+    Returns:
+        int: Number of segmented pixels.
+        tuple: BGR mean color.
+        tuple: LAB mean color, mean of the LAB pixels.
 
-def get_lab_mean_color_for_image(image_filename: Path) -> tuple[int, int, int]:
+    Raises:
+        RuntimeError: If init_worker() has not been called in this process.
     """
-    get_mean_color
-    """
-    # vars
-    detector = ColorDetector(thresh=80)
-
+    if _detector is None:
+        raise RuntimeError("No detector in this process, call init_worker(thresh) first.")
     # 1. Load image
     image = cv2.imread(str(image_filename))
+    if image is None:
+        raise ValueError(f"Unreadable image: {image_filename}")
 
-    threshold_image, _ = detector.detect(image)
+    threshold_image, _ = _detector.detect(image)
 
-    # LAB format
-    original_image = cv2.cvtColor(image, cv2.COLOR_BGR2Lab)
+    # Píxeles de la pieza (blancos en la imagen binaria)
+    selected_pixels = image[threshold_image == 255]
+    if len(selected_pixels) == 0:
+        return 0, (np.nan,) * 3, (np.nan,) * 3
+    bgr_mean_color = selected_pixels.mean(axis=0)
+    # LAB format, only of the selected pixels
+    lab_pixels = cv2.cvtColor(selected_pixels.reshape(-1, 1, 3), cv2.COLOR_BGR2Lab)
+    lab_mean_color = lab_pixels.reshape(-1, 3).mean(axis=0)
+    return len(selected_pixels), tuple(map(float, bgr_mean_color)), tuple(map(float, lab_mean_color))
 
-    # Crear una máscara donde los píxeles negros en la binaria (valor 0) sean True
-    mask = threshold_image == 255  # Los píxeles negros son True
 
-    # Aplicar la máscara a la imagen original para seleccionar los píxeles relevantes
-    selected_pixels = original_image[mask]  # Extrae los píxeles correspondientes a los negros
+def process_image(job: tuple[str, Path]) -> tuple[str, Path, int, tuple, tuple]:
+    """
+    Work of the pool: the mean colors of one image of a material.
 
-    # Calcular la media de los colores
-    mean_color = np.mean(selected_pixels, axis=0)
-    return mean_color
+    Args:
+        job (tuple): (material, image filename).
+
+    Returns:
+        tuple: material, image filename, number of pixels, BGR and LAB mean colors.
+    """
+    material, image_filename = job
+    pixels, bgr_mean_color, lab_mean_color = get_mean_colors_for_image(image_filename)
+    return material, image_filename, pixels, bgr_mean_color, lab_mean_color
 
 
-def get_mean_color_from_images(dataset: int, material: Path, image_filenames: list[Path], image_format: str = 'bgr') -> tuple[int, int, int]:
+def get_mean_colors_from_dataset(dataset: int, materials: list[str], workers: int | None = None,
+                                 thresh: int = 80, chunksize: int = 4) -> dict[str, dict[str, tuple[int, int, int]]]:
     """
-    get_mean_color_from_images
+    Calculate the mean colors of every image of the dataset in parallel, writing the CSV files as
+    the results arrive.
+
+    Args:
+        dataset (int): Number of the dataset, images in data/images/dataset_N/<material>.
+        materials (list[str]): The materials.
+        workers (int | None): Number of processes. None uses all the CPUs, 1 runs in this process.
+        thresh (int): Detector threshold.
+        chunksize (int): Images sent to a process at once.
+
+    Returns:
+        dict: {'bgr': {material: mean color}, 'lab': {material: mean color}}
     """
+    output_directory = Path(f'data/generated/dataset_{dataset}/mean_colors')
+    os.makedirs(output_directory, exist_ok=True)
+
+    directories = [Path(f'data/images/dataset_{dataset}/{material}') for material in materials]
+    materials_images_filenames = get_directories_filepaths(directories)
+    jobs = [(material, image_filename)
+            for material, image_filenames in zip(materials, materials_images_filenames)
+            for image_filename in image_filenames]
+
+    files: dict[str, TextIO] = {}
+    images_mean_colors: dict[str, dict[str, list[tuple]]] = {'bgr': {material: [] for material in materials},
+                                                             'lab': {material: [] for material in materials}}
+    pool = Pool(workers, initializer=init_worker, initargs=(thresh,)) if workers != 1 else None
     try:
-        os.mkdir(f'data/generated/dataset_{dataset}')
-        os.mkdir(f'data/generated/dataset_{dataset}/mean_colors')
-    except:
-        pass
-    file = open(f'data/generated/dataset_{dataset}/mean_colors/{material}.csv', 'w', encoding='utf-8')
-    file.write("image_filename;mean_color_red;mean_color_green;mean_color_blue\n")
-    images_mean_colors: list[tuple] = []
-
-    for image_filename in image_filenames:
-        # print(image_filename)
-        if image_format == 'bgr':
-            image_mean_color = get_bgr_mean_color_for_image(image_filename)
-        elif image_format == 'lab':
-            image_mean_color = get_lab_mean_color_for_image(image_filename)
+        # One CSV per material with images
+        for material in {material for material, _ in jobs}:
+            files[material] = open(output_directory / f'{material}.csv', 'w', encoding='utf-8')
+            files[material].write(CSV_HEADER)
+        if pool is None:
+            init_worker(thresh)
+            results = map(process_image, jobs)
         else:
-            raise ValueError("Unsupported image format. Use 'bgr' or 'lab'.")
-
-        images_mean_colors.append(image_mean_color)
-        file.write(f"{image_filename.stem};{image_mean_color[0]};{image_mean_color[1]};{image_mean_color[2]}\n")
-    file.close()
-
-    final_mean_color = calculate_mean_color(images_mean_colors)
-    return final_mean_color
+            results = pool.imap_unordered(process_image, jobs, chunksize=chunksize)
+
+        for count, (material, image_filename, pixels, bgr_mean_color, lab_mean_color) in enumerate(results, 1):
+            files[material].write(f"{image_filename.stem};{pixels};"
+                                  f"{';'.join(map(str, bgr_mean_color))};{';'.join(map(str, lab_mean_color))}\n")
+            if pixels == 0:
+                print(f'No piece found in {image_filename}')
+                continue
+            images_mean_colors['bgr'][material].append(bgr_mean_color)
+            images_mean_colors['lab'][material].append(lab_mean_color)
+            if count % 100 == 0:
+                print(f'{count}/{len(jobs)} images')
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+        for file in files.values():
+            file.close()
+
+    return {image_format: {material: calculate_mean_color(mean_colors)
+                           for material, mean_colors in materials_mean_colors.items() if mean_colors}
+            for image_format, materials_mean_colors in images_mean_colors.items()}
 
 
 def main():
     """
     main
     """
-
-    # VARS
-    dataset = 4
-    image_formats = ['bgr', 'lab']  # 'bgr' or 'lab'
+    parser = argparse.ArgumentParser(description='Mean BGR and LAB colors of the images of a dataset.')
+    parser.add_argument('--dataset', type=int, default=4, help='Number of the dataset. Default: 4')
+    parser.add_argument('--workers', type=int, default=None, help='Processes. Default: all the CPUs, 1 = no pool')
+    parser.add_argument('--thresh', type=int, default=80, help='Detector threshold. Default: 80')
+    parser.add_argument('--chunksize', type=int, default=4, help='Images sent to a process at once. Default: 4')
+    args = parser.parse_args()
 
     # 1. Get filenames from all images in the dataset
     materials = [material.name.lower() for material in MaterialEn]
     print('Materials:', materials)
 
-    directories: list[Path] = []
-    for material in materials:
-        directories.append(Path(f'data/images/dataset_{dataset}/{material}'))
-
-    # Get the file paths for each material directory
-    materials_images_filenames: list[list[Path]] = get_directories_filepaths(directories)
-
-    # 2. For each image, calculate the mean color
-    materials_mean_colors_dict = {image_format: {} for image_format in image_formats}
-
-    for image_format in image_formats:
-        for index, material_images_filenames in enumerate(materials_images_filenames):
-            material_mean_color = get_mean_color_from_images(dataset, materials[index], material_images_filenames,
-                                                             image_format=image_format)
-            materials_mean_colors_dict[image_format][materials[index]] = tuple(material_mean_color)
+    # 2. For each image, calculate the mean colors
+    start_time = time.perf_counter()
+    materials_mean_colors_dict = get_mean_colors_from_dataset(args.dataset, materials, workers=args.workers,
+                                                              thresh=args.thresh, chunksize=args.chunksize)
+    print(f'Elapsed time: {time.perf_counter() - start_time:.2f} s')
 
-    export_mean_colors(materials_mean_colors_dict, f'data/generated/dataset_{dataset}/mean_colors.json')
+    export_mean_colors(materials_mean_colors_dict, f'data/generated/dataset_{args.dataset}/mean_colors.json')
     print(materials_mean_colors_dict)
 
 
@@ -4,10 +4,10 @@ Check segmentation
 """
 
 import cv2
+import numpy as np
 
 from src.detector.color_detector import ColorDetector
 from src.classifier import LabClassifier
-from src.utils import bgr_to_lab
 
 
 # Color: (124, 123, 132) {<MaterialEn.COPPER: 0>: 19.1049731745428, <MaterialEn.ZINC: 1>: 4.47213595499958, <MaterialEn.BRASS: 2>: 21.587033144922902, <MaterialEn.PCB: 3>: 6.708203932499369}
@@ -17,11 +17,15 @@ from src.utils import bgr_to_lab
 def loop(detector: ColorDetector, image):
     """ main loop """
     _, pieces = detector.detect(image, merge_pieces=False)
+    if not pieces:
+        return image
 
-    for piece in pieces:
-        piece_mean_color_bgr = piece.calculate_mean_color()
-        piece_mean_color_lab = bgr_to_lab(piece_mean_color_bgr)
-        material, dist = LabClassifier.which_material(piece_mean_color_lab, verbose=True)
+    # All the pieces of the image in one call
+    mean_colors = np.array([piece.calculate_mean_color() for piece in pieces])
+    indices, distances = LabClassifier.classify_bgr(mean_colors)
+
+    for piece, material, dist in zip(pieces, LabClassifier.get_materials(indices), distances):
+        print('Color:', piece.calculate_mean_color(), material, dist)
         piece.name = f'{material.name.lower()}'
         piece.draw(image)
 
@@ -0,0 +1,97 @@
+"""
+Compare the noise reduction strategies of the detector against the reference
+(Gaussian blur of the BGR frame) on the sample videos.
+
+For every strategy it reports the time of the denoise step, the fraction of
+pixels of the segmentation that differ from the reference, the intersection over
+union of the foreground and the number of pieces detected.
+
+Usage:
+    python -m extra_scripts.check_denoise --max-frames 300
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+import src.config_vars as cfv
+from src.benchmark import get_sample_videos, iter_video_frames, latency_summary
+from src.detector import utils as dut
+from src.detector.color_detector import ColorDetector
+from src.detector.denoise_method import DenoiseMethod
+
+
+def compare_video(video_path: Path, thresh: int, max_frames: int | None = None) -> dict:
+    """
+    Compare the denoise strategies on one video.
+
+    Args:
+        video_path (Path): The video file.
+        thresh (int): Detector threshold.
+        max_frames (int | None): Maximum number of frames to compare.
+
+    Returns:
+        dict: Per strategy results, JSON serializable.
+    """
+    detectors = {method: ColorDetector(thresh=thresh, min_area=cfv.DETECTOR_MIN_AREA, denoise_method=method)
+                 for method in DenoiseMethod}
+    times_ns = {method: [] for method in DenoiseMethod}
+    different_pixels = {method: 0 for method in DenoiseMethod}
+    intersection = {method: 0 for method in DenoiseMethod}
+    union = {method: 0 for method in DenoiseMethod}
+    pieces = {method: 0 for method in DenoiseMethod}
+    total_pixels = 0
+
+    for frame in iter_video_frames(video_path, max_frames):
+        for method in DenoiseMethod:
+            t_0 = time.perf_counter_ns()
+            dut.reduce_noise_gray(frame, (31, 31), method)
+            times_ns[method].append(time.perf_counter_ns() - t_0)
+
+        reference_threshold, reference_pieces = detectors[DenoiseMethod.GAUSSIAN].detect(frame, merge_pieces=False)
+        reference_mask = reference_threshold > 0
+        total_pixels += reference_mask.size
+        for method, detector in detectors.items():
+            threshold_image, method_pieces = (detector.detect(frame, merge_pieces=False)
+                                              if method != DenoiseMethod.GAUSSIAN
+                                              else (reference_threshold, reference_pieces))
+            mask = threshold_image > 0
+            different_pixels[method] += int(np.count_nonzero(mask != reference_mask))
+            intersection[method] += int(np.count_nonzero(mask & reference_mask))
+            union[method] += int(np.count_nonzero(mask | reference_mask))
+            pieces[method] += len(method_pieces)
+
+    return {method.value: {'denoise': latency_summary(times_ns[method]),
+                           'different_pixels': round(different_pixels[method] / total_pixels, 6) if total_pixels else 0,
+                           'foreground_iou': round(intersection[method] / union[method], 6) if union[method] else 1.0,
+                           'pieces_detected': pieces[method]}
+            for method in DenoiseMethod}
+
+
+def main():
+    """
+    main
+    """
+    parser = argparse.ArgumentParser(description='Accuracy and speed of the detector denoise strategies.')
+    parser.add_argument('videos', nargs='*', type=Path, help='Video files. Default: sample videos')
+    parser.add_argument('--thresh', type=int, default=150, help='Detector threshold')
+    parser.add_argument('--max-frames', type=int, default=None, help='Maximum frames per video')
+    parser.add_argument('--output', type=Path, default=None, help='JSON output file. Default: stdout')
+    args = parser.parse_args()
+
+    video_paths = args.videos or get_sample_videos()
+    results = {video_path.name: compare_video(video_path, args.thresh, args.max_frames) for video_path in video_paths}
+
+    if args.output is None:
+        print(json.dumps(results, indent=4))
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=4)
+        print('Results saved in', args.output)
+
+
+if __name__ == '__main__':
+    main()
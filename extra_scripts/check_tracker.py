@@ -3,8 +3,6 @@
 Check segmentation
 """
 
-import time
-
 import cv2
 import numpy as np
 
@@ -12,6 +10,9 @@ from src.detector.color_detector import ColorDetector
 from src.tracker import Tracker
 from src.classifier import LabClassifier
 from src.utils import bgr_to_lab
+from src.factory import SensorFactory
+from src.sensor.sensor_type import SensorType
+from src.sensor.file_camera import EndOfStreamException
 
 
 def loop(detector: ColorDetector, tracker: Tracker, image: np.ndarray) -> np.ndarray:
@@ -75,28 +76,24 @@ def main() -> None:
 
     # ----- with video ----- #
 
-    video_mp4 = 'data/videos/samples/full_video_tspeed3_5.mp4'
-    cap = cv2.VideoCapture(video_mp4)
-    # Verificar si se abrió correctamente
-    if not cap.isOpened():
-        print("Error opening video file.")
-        exit()
+    camera = SensorFactory.create(SensorType.VIDEO_FILE, source='data/videos/samples/full_video_tspeed3_5.mp4',
+                                  fps=25)
+    camera.initialize()
 
     x = 0
     while True:
         x += 1
-        
+
         # Leer un cuadro del video
-        ret, image = cap.read()
+        try:
+            image = camera.read()
+        except EndOfStreamException:
+            print("End of video.")
+            break
 
         if x % 3 == 0:
             continue
 
-        # Si no se puede leer un cuadro, terminamos
-        if not ret:
-            print("End of video.")
-            break
-
         frame = loop(detector, tracker, image)
 
         # Mostrar el cuadro
@@ -106,8 +103,8 @@ def main() -> None:
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
 
-        time.sleep(0.04)
         # input("Press Enter to continue...")
+    camera.release()
 
 
 if __name__ == '__main__':
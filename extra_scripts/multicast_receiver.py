@@ -0,0 +1,71 @@
+"""
+Receive the pieces sent by the coordinator, as the sorting machines do, and
+report the lost batch datagrams.
+
+Usage:
+    python -m extra_scripts.multicast_receiver --batch
+"""
+
+import argparse
+import socket
+import struct
+
+import src.config_vars as cfv
+from src.protocol import BatchReceiver, ProtocolException, decode_record
+
+
+RAW_PIECE = struct.Struct('ILf')
+
+
+def open_socket(host: str, port: int, iface: str) -> socket.socket:
+    """
+    Open a UDP socket joined to the multicast group.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('', port))
+    membership = struct.pack('4s4s', socket.inet_aton(host), socket.inet_aton(iface))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    return sock
+
+
+def main():
+    """
+    main
+    """
+    parser = argparse.ArgumentParser(description='Multicast receiver of the released pieces.')
+    parser.add_argument('--host', default=cfv.HOST, help='Multicast group')
+    parser.add_argument('--port', type=int, default=cfv.PORT, help='Port')
+    parser.add_argument('--iface', default='127.0.0.1', help='Interface address')
+    parser.add_argument('--batch', action='store_true', help='Batch datagrams (TRANSMITTER_BATCH = True)')
+    parser.add_argument('--format', default=cfv.TRANSMITTER_RECORD_FORMAT, choices=['raw', 'v1', 'v1_extended'],
+                        help='Record format. Default: config TRANSMITTER_RECORD_FORMAT')
+    args = parser.parse_args()
+
+    sock = open_socket(args.host, args.port, args.iface)
+    receiver = BatchReceiver()
+    print(f'Listening on {args.host}:{args.port}')
+    try:
+        while True:
+            datagram, address = sock.recvfrom(65535)
+            try:
+                records = receiver.decode(datagram) if args.batch else [datagram]
+            except ProtocolException as e:
+                print(f'Invalid datagram from {address}: {e}')
+                continue
+            for record in records:
+                if args.format == 'raw':
+                    material, timestamp_ms, speed = RAW_PIECE.unpack(record)
+                    print(f'material {material}, timestamp {timestamp_ms} ms, speed {speed:.2f} mm/s')
+                else:
+                    print(decode_record(record))
+            if args.batch:
+                print(f'datagrams: {receiver.received} received, {receiver.lost} lost')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -11,7 +11,6 @@ from src.factory import SensorFactory
 from src.sensor.rpi_camera import RPiCamera
 from src.detector.color_detector import ColorDetector
 from src.classifier import LabClassifier
-from src.utils import bgr_to_lab
 
 
 def loop(detector: ColorDetector, image: np.ndarray):
@@ -19,11 +18,14 @@ def loop(detector: ColorDetector, image: np.ndarray):
     Main Loop
     """
     threshold_image, pieces = detector.detect(image, merge_pieces=False)
+    if not pieces:
+        return image, threshold_image
 
-    for piece in pieces:
-        piece_mean_color_bgr = piece.calculate_mean_color()
-        piece_mean_color_lab = bgr_to_lab(piece_mean_color_bgr)
-        material, dist = LabClassifier.which_material(piece_mean_color_lab)
+    # All the pieces of the frame in one call
+    mean_colors = np.array([piece.calculate_mean_color() for piece in pieces])
+    indices, distances = LabClassifier.classify_bgr(mean_colors)
+
+    for piece, material, dist in zip(pieces, LabClassifier.get_materials(indices), distances):
         piece.name = f"{material}{dist}"    # piece.id
         piece.draw(image)
 
@@ -109,7 +109,7 @@ def main_video():
                 if material == 'zinc':
                     material_id = 1
 
-                data_raw = RawPiece(material_id, int(piece.positions[-1]['time'])).pack()
+                data_raw = RawPiece(material_id, int(piece.get_last_time())).pack()
                 transmitter.send_multicast(data_raw)
                 print('Sent:', piece.name)
 
@@ -3,14 +3,15 @@ main.py
 """
 
 import src.config_vars as cfv
-from src.coordinator import Coordinator
+from src.coordinator import Coordinator, PipelineCoordinator
 
 
 def main():
     """
     main function
     """
-    coordinator = Coordinator(
+    coordinator_class = PipelineCoordinator if cfv.PIPELINE_MODE else Coordinator
+    coordinator = coordinator_class(
         sensor_name='rpi_camera',
         detector_name='color_detector',
         host=cfv.HOST,
@@ -0,0 +1,306 @@
+"""
+benchmark.py
+
+Headless replay of recorded belt videos through the detector, the tracker and the
+classifier, measuring the latency of every stage.
+"""
+
+import platform
+import subprocess
+import time
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import cv2
+
+from src.detector.color_detector import ColorDetector
+from src.detector.denoise_method import DenoiseMethod
+from src.instrumentation import INSTRUMENTATION
+from src.tracker import Tracker
+from src.motion_gate import MotionGate
+import src.config_vars as cfv
+
+
+SAMPLE_VIDEOS_PATH = Path('data/videos/samples')
+SAMPLE_VIDEOS_PATTERN = 'full_video_tspeed3_*.mp4'
+PERCENTILES = (50, 90, 99)
+
+
+def get_sample_videos(directory: Path = SAMPLE_VIDEOS_PATH, pattern: str = SAMPLE_VIDEOS_PATTERN) -> list[Path]:
+    """
+    Get the recorded belt videos.
+
+    Args:
+        directory (Path): Directory with the videos.
+        pattern (str): Glob pattern of the video filenames.
+
+    Returns:
+        list[Path]: The sorted video file paths.
+    """
+    return sorted(directory.glob(pattern))
+
+
+def iter_video_frames(video_path: Path, max_frames: int | None = None) -> Iterator[np.ndarray]:
+    """
+    Iterate over the frames of a video file.
+
+    Args:
+        video_path (Path): The video file.
+        max_frames (int | None): Maximum number of frames to read. None reads the whole video.
+
+    Yields:
+        np.ndarray: The next BGR frame.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Error opening video file: {video_path}")
+    try:
+        count = 0
+        while max_frames is None or count < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            count += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def get_video_fps(video_path: Path, default: float = 30.0) -> float:
+    """
+    Get the frame rate of a video file.
+
+    Args:
+        video_path (Path): The video file.
+        default (float): Frame rate when the file does not tell it.
+
+    Returns:
+        float: The frames per second.
+    """
+    cap = cv2.VideoCapture(str(video_path))
+    fps = cap.get(cv2.CAP_PROP_FPS) if cap.isOpened() else 0.0
+    cap.release()
+    return fps if fps > 0 else default
+
+
+def latency_summary(samples_ns: list[int]) -> dict[str, float]:
+    """
+    Summarize latency samples.
+
+    Args:
+        samples_ns (list[int]): Latency samples in nanoseconds.
+
+    Returns:
+        dict: count, mean, max and percentiles in milliseconds.
+    """
+    if not samples_ns:
+        return {'count': 0}
+    samples_ms = np.array(samples_ns, dtype=np.float64) / 1e6
+    summary = {'count': int(samples_ms.size),
+               'mean_ms': round(float(samples_ms.mean()), 4),
+               'max_ms': round(float(samples_ms.max()), 4)}
+    for percentile, value in zip(PERCENTILES, np.percentile(samples_ms, PERCENTILES)):
+        summary[f'p{percentile}_ms'] = round(float(value), 4)
+    return summary
+
+
+def get_host_info() -> dict[str, str]:
+    """
+    Get information about the host and the code version, to compare runs.
+
+    Returns:
+        dict: host name, machine, python and opencv versions and git commit.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = 'unknown'
+    return {'node': platform.node(),
+            'machine': platform.machine(),
+            'system': platform.system(),
+            'python': platform.python_version(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+            'commit': commit}
+
+
+def create_detector_and_tracker(thresh: int | None = None,
+                                roi: tuple[int, int, int, int] | None = cfv.BELT_ROI,
+                                denoise_method: str = cfv.DETECTOR_DENOISE_METHOD,
+                                scale: int = cfv.DETECTOR_SCALE) -> tuple[ColorDetector, Tracker]:
+    """
+    Create a detector and a tracker configured as in the coordinator.
+
+    Args:
+        thresh (int | None): Detector threshold. None keeps the detector default.
+        roi (tuple | None): Belt region of interest (x, y, w, h). None is the full frame.
+        denoise_method (str): Noise reduction strategy of the detector (DenoiseMethod value).
+        scale (int): Downscale factor of the segmentation.
+
+    Returns:
+        tuple[ColorDetector, Tracker]: The detector and the tracker.
+    """
+    detector = ColorDetector(min_area=cfv.DETECTOR_MIN_AREA, roi=roi, denoise_method=DenoiseMethod(denoise_method),
+                             reuse_buffers=cfv.DETECTOR_REUSE_BUFFERS, scale=scale)
+    if thresh is not None:
+        detector._thresh = thresh
+    tracker = Tracker(roi=roi, min_similarity=cfv.TRACKER_MIN_SIMILARITY, classify_every=cfv.TRACKER_CLASSIFY_EVERY)
+    tracker._x_addition_limit = cfv.X_ADDITION_LIMIT
+    tracker._x_expulsion_limit = cfv.X_EXPULSION_LIMIT
+    return detector, tracker
+
+
+def create_motion_gate(roi: tuple[int, int, int, int] | None = cfv.BELT_ROI) -> MotionGate:
+    """
+    Create a motion gate configured as in the coordinator.
+
+    Args:
+        roi (tuple | None): Belt region of interest (x, y, w, h). None is the full frame.
+
+    Returns:
+        MotionGate: The motion gate.
+    """
+    return MotionGate(step=cfv.MOTION_GATE_STEP, thresh=cfv.MOTION_GATE_THRESHOLD,
+                      min_pixels=cfv.MOTION_GATE_MIN_PIXELS, max_skip=cfv.MOTION_GATE_MAX_SKIP,
+                      idle_period=cfv.MOTION_GATE_IDLE_PERIOD, entry_limit=cfv.X_ADDITION_LIMIT,
+                      expulsion_limit=cfv.X_EXPULSION_LIMIT, roi=roi)
+
+
+def replay_video(video_path: Path, thresh: int | None = None, merge_pieces: bool = False,
+                 max_frames: int | None = None, roi: tuple[int, int, int, int] | None = cfv.BELT_ROI,
+                 denoise_method: str = cfv.DETECTOR_DENOISE_METHOD, instrument: bool = True,
+                 scale: int = cfv.DETECTOR_SCALE, motion_gate: bool = False) -> dict:
+    """
+    Replay a video through the detector, the tracker and the classifier.
+
+    The frames get the capture time of the video (frame number / fps) as timestamp.
+
+    Stages:
+        read: decode the next frame.
+        detect: ColorDetector.detect, and the motion gate if enabled.
+        track: Tracker.update, the classification of the pieces included.
+
+    With instrument, the substages reported to the instrumentation (detect.denoise,
+    detect.segment, detect.pieces, classify...) are added to the results. classify is the
+    classification run by the tracker, every update or on release (TRACKER_CLASSIFY_EVERY).
+
+    Args:
+        video_path (Path): The video file.
+        thresh (int | None): Detector threshold. None keeps the detector default.
+        merge_pieces (bool): Merge close components in the detector.
+        max_frames (int | None): Maximum number of frames to replay.
+        roi (tuple | None): Belt region of interest (x, y, w, h). None is the full frame.
+        denoise_method (str): Noise reduction strategy of the detector (DenoiseMethod value).
+        instrument (bool): Enable the instrumentation during the replay and add its substages.
+        scale (int): Downscale factor of the segmentation.
+        motion_gate (bool): Skip the detection of the frames rejected by the motion gate.
+
+    Returns:
+        dict: Results of the replay, JSON serializable.
+    """
+    detector, tracker = create_detector_and_tracker(thresh, roi, denoise_method, scale)
+    gate = create_motion_gate(roi) if motion_gate else None
+    frame_interval = 1 / get_video_fps(video_path)
+    detector.initialize()
+    instrumentation_enabled = INSTRUMENTATION.enabled
+    INSTRUMENTATION.enabled = instrument
+    INSTRUMENTATION.reset()
+
+    stages_ns: dict[str, list[int]] = {'read': [], 'detect': [], 'track': [], 'frame': []}
+    released_by_material: dict[str, int] = {}
+    pieces_detected = 0
+    frames = 0
+    frames_detected = 0
+
+    frame_iterator = iter_video_frames(video_path, max_frames)
+    start_time = time.perf_counter_ns()
+    while True:
+        t_0 = time.perf_counter_ns()
+        frame = next(frame_iterator, None)
+        if frame is None:
+            break
+        t_1 = time.perf_counter_ns()
+        timestamp = frames * frame_interval
+        if gate is None or gate.update(frame, *tracker.predict(timestamp), timestamp=timestamp):
+            _, pieces = detector.detect(frame, merge_pieces=merge_pieces, timestamp=timestamp)
+            frames_detected += 1
+        else:
+            pieces = []
+        t_2 = time.perf_counter_ns()
+        released_pieces = tracker.update(pieces)
+        t_3 = time.perf_counter_ns()
+        for piece in released_pieces:
+            released_by_material[piece.name] = released_by_material.get(piece.name, 0) + 1
+
+        frames += 1
+        pieces_detected += len(pieces)
+        stages_ns['read'].append(t_1 - t_0)
+        stages_ns['detect'].append(t_2 - t_1)
+        stages_ns['track'].append(t_3 - t_2)
+        stages_ns['frame'].append(t_3 - t_1)
+    elapsed_s = (time.perf_counter_ns() - start_time) / 1e9
+    detector.release()
+    substages = INSTRUMENTATION.summary()['stages'] if instrument else {}
+    INSTRUMENTATION.enabled = instrumentation_enabled
+
+    processing_s = sum(stages_ns['frame']) / 1e9
+    return {'video': video_path.name,
+            'frames': frames,
+            'frames_detected': frames_detected,
+            'elapsed_s': round(elapsed_s, 4),
+            'fps': round(frames / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+            'processing_fps': round(frames / processing_s, 2) if processing_s > 0 else 0.0,
+            'pieces_detected': pieces_detected,
+            'pieces_released': sum(released_by_material.values()),
+            'released_by_material': released_by_material,
+            'stages': {stage: latency_summary(samples) for stage, samples in stages_ns.items()},
+            'substages': substages}
+
+
+def run_benchmark(video_paths: list[Path], thresh: int | None = None, merge_pieces: bool = False,
+                  max_frames: int | None = None, roi: tuple[int, int, int, int] | None = cfv.BELT_ROI,
+                  denoise_method: str = cfv.DETECTOR_DENOISE_METHOD, verbose: bool = False,
+                  scale: int = cfv.DETECTOR_SCALE, motion_gate: bool = False) -> dict:
+    """
+    Replay several videos and collect the results with the host information.
+
+    Args:
+        video_paths (list[Path]): The video files.
+        thresh (int | None): Detector threshold. None keeps the detector default.
+        merge_pieces (bool): Merge close components in the detector.
+        max_frames (int | None): Maximum number of frames to replay per video.
+        roi (tuple | None): Belt region of interest (x, y, w, h). None is the full frame.
+        denoise_method (str): Noise reduction strategy of the detector (DenoiseMethod value).
+        verbose (bool): Print a line per video.
+        scale (int): Downscale factor of the segmentation.
+        motion_gate (bool): Skip the detection of the frames rejected by the motion gate.
+
+    Returns:
+        dict: Results of the benchmark, JSON serializable.
+    """
+    results = []
+    for video_path in video_paths:
+        result = replay_video(video_path, thresh=thresh, merge_pieces=merge_pieces, max_frames=max_frames, roi=roi,
+                              denoise_method=denoise_method, scale=scale, motion_gate=motion_gate)
+        if verbose:
+            print(f"{result['video']}: {result['frames']} frames ({result['frames_detected']} detected), "
+                  f"{result['fps']} fps, "
+                  f"detect p50 {result['stages']['detect'].get('p50_ms')} ms, "
+                  f"{result['pieces_released']} pieces released")
+        results.append(result)
+
+    frames = sum(result['frames'] for result in results)
+    elapsed_s = sum(result['elapsed_s'] for result in results)
+    return {'host': get_host_info(),
+            'config': {'thresh': thresh, 'merge_pieces': merge_pieces, 'max_frames': max_frames, 'roi': roi,
+                       'denoise_method': denoise_method, 'scale': scale, 'motion_gate': motion_gate,
+                       'min_area': cfv.DETECTOR_MIN_AREA,
+                       'x_addition_limit': cfv.X_ADDITION_LIMIT, 'x_expulsion_limit': cfv.X_EXPULSION_LIMIT},
+            'videos': results,
+            'total': {'frames': frames,
+                      'frames_detected': sum(result['frames_detected'] for result in results),
+                      'elapsed_s': round(elapsed_s, 4),
+                      'fps': round(frames / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+                      'pieces_released': sum(result['pieces_released'] for result in results)}}
@@ -0,0 +1,194 @@
+"""
+buffer_pool.py
+
+Preallocated image buffers, so the steady state processing does not allocate a new
+array for every frame. The OpenCV functions write into them through their dst outputs.
+"""
+
+import threading
+
+import numpy as np
+
+
+class FramePool:
+    """
+    Pool of frame buffers handed out by the sensors.
+
+    A frame can be held by several stages at the same time (pipeline buffers, display,
+    preview...), so the ownership is explicit: a buffer handed out by acquire() is not
+    reused until it is given back with release(), by the last stage that uses it or by
+    the buffer that drops it. A frame never released is only never reused. When every
+    buffer is in use, a new one is added until max_size, then unpooled arrays are returned.
+
+    Attributes:
+        _max_size (int): Maximum number of buffers of the pool.
+        _buffers (list[np.ndarray]): The buffers.
+        _in_use (set[int]): Ids of the buffers handed out and not released yet.
+        _allocations (int): Number of arrays allocated, pooled or not.
+    """
+
+    def __init__(self, max_size: int = 16):
+        """
+        Initialize an empty pool.
+
+        Args:
+            max_size (int): Maximum number of buffers of the pool.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be greater than 0")
+        self._max_size = max_size
+        self._buffers: list[np.ndarray] = []
+        self._in_use: set[int] = set()
+        self._allocations = 0
+        self._lock = threading.Lock()
+
+    @property
+    def allocations(self) -> int:
+        """
+        Get the number of arrays allocated by the pool. It does not grow in the steady state.
+        """
+        return self._allocations
+
+    @property
+    def in_use(self) -> int:
+        """
+        Get the number of buffers handed out and not released yet.
+        """
+        return len(self._in_use)
+
+    def __len__(self) -> int:
+        """
+        Return the number of buffers of the pool.
+        """
+        return len(self._buffers)
+
+    def acquire(self, shape: tuple[int, ...], dtype: np.dtype = np.uint8) -> np.ndarray:
+        """
+        Get a buffer that is not in use. Its content is undefined. Give it back with release().
+
+        Args:
+            shape (tuple): The shape of the buffer.
+            dtype (np.dtype): The type of the buffer.
+
+        Returns:
+            np.ndarray: The buffer.
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        with self._lock:
+            for buffer in self._buffers:
+                if id(buffer) not in self._in_use and buffer.shape == shape and buffer.dtype == dtype:
+                    self._in_use.add(id(buffer))
+                    return buffer
+            self._allocations += 1
+            buffer = np.empty(shape, dtype=dtype)
+            if len(self._buffers) < self._max_size:
+                self._buffers.append(buffer)
+            else:
+                # Full of buffers of another shape, e.g. after a resolution change
+                free = [index for index, old_buffer in enumerate(self._buffers) if id(old_buffer) not in self._in_use]
+                if not free:
+                    return buffer   # Unpooled
+                self._buffers[free[0]] = buffer
+            self._in_use.add(id(buffer))
+            return buffer
+
+    def release(self, frame: np.ndarray | None) -> None:
+        """
+        Give a buffer back to the pool, it can be reused by the next acquire(). The arrays that
+        are not buffers of the pool (unpooled frames, views, copies) are ignored.
+
+        Args:
+            frame (np.ndarray | None): The buffer returned by acquire().
+        """
+        if frame is None:
+            return
+        with self._lock:
+            if any(buffer is frame for buffer in self._buffers):
+                self._in_use.discard(id(frame))
+
+    def clear(self) -> None:
+        """
+        Remove the buffers. The frames already handed out are still valid.
+        """
+        with self._lock:
+            self._buffers = []
+            self._in_use = set()
+
+
+class ScratchBuffers:
+    """
+    Named intermediate buffers of a processing step, e.g. the gray and the threshold
+    images of the detector. The same array is returned for a name every call while
+    the shape and the type do not change, so its content is only valid until the
+    next call of the step. Not thread safe, one per processing thread.
+
+    Attributes:
+        _buffers (dict[str, np.ndarray]): The buffers by name.
+        _allocations (int): Number of arrays allocated.
+    """
+
+    def __init__(self):
+        """
+        Initialize without buffers.
+        """
+        self._buffers: dict[str, np.ndarray] = {}
+        self._allocations = 0
+
+    @property
+    def allocations(self) -> int:
+        """
+        Get the number of arrays allocated. It does not grow in the steady state.
+        """
+        return self._allocations
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Get the memory of the buffers in bytes.
+        """
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def get(self, name: str, shape: tuple[int, ...], dtype: np.dtype = np.uint8) -> np.ndarray:
+        """
+        Get the buffer of a name, allocated again if the shape or the type changed.
+
+        Args:
+            name (str): The name of the buffer.
+            shape (tuple): The shape of the buffer.
+            dtype (np.dtype): The type of the buffer.
+
+        Returns:
+            np.ndarray: The buffer. Its content is undefined.
+        """
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != tuple(shape) or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[name] = buffer
+            self._allocations += 1
+        return buffer
+
+    def clear(self) -> None:
+        """
+        Remove the buffers.
+        """
+        self._buffers = {}
+
+
+def get_buffer(buffers: ScratchBuffers | None, name: str, shape: tuple[int, ...],
+               dtype: np.dtype = np.uint8) -> np.ndarray | None:
+    """
+    Get a scratch buffer to use as dst of an OpenCV function.
+
+    Args:
+        buffers (ScratchBuffers | None): The buffers. None means no reuse.
+        name (str): The name of the buffer.
+        shape (tuple): The shape of the buffer.
+        dtype (np.dtype): The type of the buffer.
+
+    Returns:
+        np.ndarray | None: The buffer, or None so OpenCV allocates a new output.
+    """
+    if buffers is None:
+        return None
+    return buffers.get(name, shape, dtype)
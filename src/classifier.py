@@ -3,8 +3,10 @@ Classfiers
 """
 
 from enum import Enum, auto
+from functools import lru_cache
 
 import numpy as np
+import cv2
 
 from src import utils as ut
 
@@ -59,18 +61,34 @@ class BgrClassifier:
         MaterialEn.PCB: (101, 123, 117)
     }
 
+    # Reference matrix, one row per material, built once
+    MATERIALS = tuple(MATERIALS_BGR_COLORS)
+    REFERENCE_BGR = np.array(list(MATERIALS_BGR_COLORS.values()), dtype=np.float64)
+
+    @staticmethod
+    def classify(colors_bgr: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Classify a batch of BGR colors in one call.
+
+        Args:
+            colors_bgr (np.ndarray): (N, 3) BGR colors.
+
+        Returns:
+            np.ndarray: (N,) index in MATERIALS of the closest material of each color.
+            np.ndarray: (N,) euclidean distance to that material.
+        """
+        colors = np.asarray(colors_bgr, dtype=np.float64).reshape(-1, 3)
+        distances = np.linalg.norm(colors[:, None, :] - BgrClassifier.REFERENCE_BGR[None, :, :], axis=2)
+        indices = np.argmin(distances, axis=1)
+        return indices, distances[np.arange(len(indices)), indices]
+
     @staticmethod
     def which_material(color_rgb: tuple[int, int, int]) -> tuple[MaterialEn, float]:
         """
         which material it is 
         """
-        euclidean_distances_dict = {material: np.linalg.norm(np.array(color_rgb) - np.array(m_color))
-                                    for material, m_color in BgrClassifier.MATERIALS_BGR_COLORS.items()}
-        # Find the material with the smallest distance
-        closest_material = min(euclidean_distances_dict, key=euclidean_distances_dict.get)
-
-        dist = euclidean_distances_dict[closest_material]
-        return closest_material, dist
+        indices, distances = BgrClassifier.classify(np.asarray(color_rgb))
+        return BgrClassifier.MATERIALS[int(indices[0])], float(distances[0])
 
 
 class LabClassifier:
@@ -96,25 +114,109 @@ class LabClassifier:
         # MaterialEn.PCB: (101, 123, 117)
     }
 
+    # Reference matrix, one row per material, built once
+    MATERIALS = tuple(MATERIALS_LAB_COLORS)
+    REFERENCE_LAB = np.array(list(MATERIALS_LAB_COLORS.values()), dtype=np.float64)
+
+    @staticmethod
+    def get_distances(colors_lab: np.ndarray, use_lightness: bool = False,
+                      lightness_weight: float | None = None) -> np.ndarray:
+        """
+        Distances of a batch of LAB colors to every reference color.
+
+        Args:
+            colors_lab (np.ndarray): (N, 3) LAB colors.
+            use_lightness (bool): Include the L axis in the distance. False uses only a and b.
+            lightness_weight (float | None): Weight of the L axis, overrides use_lightness.
+                1 is the plain euclidean distance (delta E), 0 ignores the lightness.
+
+        Returns:
+            np.ndarray: (N, M) distance of each color to each material of MATERIALS.
+        """
+        if lightness_weight is None:
+            lightness_weight = 1.0 if use_lightness else 0.0
+        weights = np.array([lightness_weight, 1.0, 1.0]) ** 2
+        colors = np.asarray(colors_lab, dtype=np.float64).reshape(-1, 3)
+        differences = colors[:, None, :] - LabClassifier.REFERENCE_LAB[None, :, :]
+        return np.sqrt((differences ** 2) @ weights)
+
+    @staticmethod
+    def classify(colors_lab: np.ndarray, use_lightness: bool = False,
+                 lightness_weight: float | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Classify a batch of LAB colors in one call.
+
+        Args:
+            colors_lab (np.ndarray): (N, 3) LAB colors.
+            use_lightness (bool): Include the L axis in the distance. False uses only a and b.
+            lightness_weight (float | None): Weight of the L axis, overrides use_lightness.
+
+        Returns:
+            np.ndarray: (N,) index in MATERIALS of the closest material of each color.
+            np.ndarray: (N,) distance to that material.
+        """
+        distances = LabClassifier.get_distances(colors_lab, use_lightness, lightness_weight)
+        indices = np.argmin(distances, axis=1)
+        return indices, distances[np.arange(len(indices)), indices]
+
+    @staticmethod
+    def classify_bgr(colors_bgr: np.ndarray, use_lightness: bool = False,
+                     lightness_weight: float | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Classify a batch of BGR colors in one call. The LAB conversion is a single cv2.cvtColor.
+
+        Args:
+            colors_bgr (np.ndarray): (N, 3) BGR colors in [0, 255].
+            use_lightness (bool): Include the L axis in the distance. False uses only a and b.
+            lightness_weight (float | None): Weight of the L axis, overrides use_lightness.
+
+        Returns:
+            np.ndarray: (N,) index in MATERIALS of the closest material of each color.
+            np.ndarray: (N,) distance to that material.
+        """
+        colors = np.asarray(colors_bgr).reshape(-1, 1, 3).astype(np.uint8)
+        colors_lab = cv2.cvtColor(colors, cv2.COLOR_BGR2Lab).reshape(-1, 3)
+        return LabClassifier.classify(colors_lab, use_lightness, lightness_weight)
+
+    @staticmethod
+    def get_materials(indices: np.ndarray) -> list[MaterialEn]:
+        """
+        Convert the indices returned by classify() to materials.
+
+        Args:
+            indices (np.ndarray): (N,) indices in MATERIALS.
+
+        Returns:
+            list[MaterialEn]: The materials.
+        """
+        return [LabClassifier.MATERIALS[index] for index in np.asarray(indices).tolist()]
+
     @staticmethod
     def which_material(color_lab: tuple[int, int, int],
                        use_lightness: bool = False, verbose: bool = False) -> tuple[MaterialEn, float]:
         """
         which material it is, using LAB FORMAT
         """
-        if use_lightness:
-            euclidean_distances_dict = {material_name: ut.delta_e(np.array(color_lab), np.array(m_color)) 
-                                        for material_name, m_color in LabClassifier.MATERIALS_LAB_COLORS.items()}
-        else:
-            euclidean_distances_dict = {material_name: ut.delta_e(np.array(color_lab[1:]), np.array(m_color[1:])) 
-                                        for material_name, m_color in LabClassifier.MATERIALS_LAB_COLORS.items()}
+        distances = LabClassifier.get_distances(np.asarray(color_lab), use_lightness)[0]
 
         if verbose:
-            print('Color:', color_lab, euclidean_distances_dict)
+            print('Color:', color_lab, dict(zip(LabClassifier.MATERIALS, distances.tolist())))
         # Find the material with the smallest distance
-        closest_material = min(euclidean_distances_dict, key=euclidean_distances_dict.get)
-        dist = euclidean_distances_dict[closest_material]
-        return closest_material, dist
+        index = int(np.argmin(distances))
+        return LabClassifier.MATERIALS[index], float(distances[index])
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def which_material_bgr(color_bgr: tuple[int, int, int],
+                           use_lightness: bool = False) -> tuple[MaterialEn, float]:
+        """
+        which material it is, from an integer BGR color.
+
+        The result is cached by color: the mean color of a tracked piece is an integer
+        and repeats from frame to frame, so the LAB conversion and the distances are only
+        computed for new colors.
+        """
+        return LabClassifier.which_material(ut.bgr_to_lab(color_bgr), use_lightness=use_lightness)
 
 
 if __name__ == '__main__':
@@ -1,14 +1,63 @@
 # UDP COMMUNICATIONS
 HOST = '224.0.0.1'
 PORT = 5007
+TRANSMITTER_BATCH = False   # Send the pieces of a frame in one framed datagram (src/protocol.py)
+TRANSMITTER_BATCH_WINDOW = 0.0  # seconds a piece can wait for others in batch mode. 0 = one datagram per frame
+TRANSMITTER_RECORD_FORMAT = 'raw'  # raw (RawPiece, native layout), v1 or v1_extended (src/protocol.py)
+TRANSMITTER_ASYNC = False   # Send from a thread behind a bounded queue. Can drop pieces under load, see the policy
+TRANSMITTER_QUEUE_SIZE = 64
+TRANSMITTER_QUEUE_POLICY = 'drop_oldest'    # When the queue is full: drop_oldest, drop_newest or block
+
+# SENSOR
+SENSOR_RESOLUTION = (640, 480)  # (width, height) asked to the device. Resized in software only if it refuses
+SENSOR_FPS = None   # Frame rate asked to the device. None = device default (30 fps on the RPi camera)
+SENSOR_PIXEL_FORMAT = 'bgr'     # bgr or gray (luma only, no color classification). See src/sensor/pixel_format.py
+SENSOR_THREADED = False  # Live cameras grab frames in their own thread, the detector reads the freshest one
+SENSOR_THREADED_BUFFER = 2  # Frames captured ahead by the capture thread, the oldest is dropped when full
+SENSOR_FRAME_POOL_SIZE = 16  # Frames reused by the sensors (src/buffer_pool.py), above the frames in flight. 0 = off
+BELT_ROI = None     # (x, y, w, h) belt region of the frame processed by the detector and the tracker. None = full frame
 
 #DETECTOR
 RPI_CAM_THRESHOLD = 80
 DETECTOR_MIN_AREA = 300
+DETECTOR_DENOISE_METHOD = 'gray_gaussian'    # gaussian (reference), gray_gaussian, pyramid or box
+DETECTOR_REUSE_BUFFERS = True   # Preallocated intermediate images, no large allocations per frame
+DETECTOR_MERGE_PIECES = False   # Join the components whose bboxes touch, for pieces split by the segmentation
+DETECTOR_SCALE = 1  # Segmentation on the gray image downscaled 1, 2 or 4 times, colors sampled at full resolution
+DETECTOR_BACKGROUND = 'static'  # Flat field (run with flat_field_flag): 'static' first frame or 'adaptive' (opt in)
+DETECTOR_BACKGROUND_RATE = 0.01     # Adaptive: weight of a frame in the belt pixels, ~1/rate frames to follow the light
+DETECTOR_BACKGROUND_FOREGROUND_RATE = 0.001     # Adaptive: weight in the piece pixels, clears ghosts. 0 = never
+DETECTOR_BACKGROUND_MARGIN = 15     # Adaptive: full resolution pixels around the pieces not learnt, ~half the blur
 
 # TRACKER
 X_ADDITION_LIMIT = 100
 X_EXPULSION_LIMIT = 540
+TRACKER_MIN_SIMILARITY = 0.8   # Pairs less similar are never matched
+TRACKER_CLASSIFY_EVERY = 1     # Classify the tracked pieces every N frames. 0 = only when they are released
+
+# MOTION GATE
+MOTION_GATE = False  # Skip the detection of idle frames, the tracker predicts the positions in between
+MOTION_GATE_STEP = 8    # Subsampling of the frame difference, in pixels
+MOTION_GATE_THRESHOLD = 25  # Gray levels of a changed pixel
+MOTION_GATE_MIN_PIXELS = 3  # Changed subsampled pixels that make a motion
+MOTION_GATE_MAX_SKIP = 4    # Maximum frames between detections with motion or tracked pieces. 1 near X_EXPULSION_LIMIT
+MOTION_GATE_IDLE_PERIOD = 30    # Frames between detections of an idle belt
+
+# PIPELINE
+PIPELINE_MODE = False   # Run capture, detection, tracking and transmission in parallel stages
+PIPELINE_BUFFER_SIZE = 2
+PIPELINE_TRANSMISSION_BUFFER_SIZE = 64
+PIPELINE_STATS_PERIOD = 10  # seconds, 0 to disable
+
+# HEADLESS
+HEADLESS = False    # No window and no drawing in the loop, stopped with SIGINT/SIGTERM
+PREVIEW_EVERY = 0   # Headless preview: draw one frame out of N in its own thread. 0 = only on SIGUSR1 (kill -USR1)
+PREVIEW_PATH = None     # File where the preview frame is saved, e.g. 'data/generated/preview.jpg'. None = not saved
+PREVIEW_WINDOW = False  # Show the preview frames in a window (needs a display)
+
+# INSTRUMENTATION
+INSTRUMENTATION_ENABLED = False    # Per stage latency histograms (src/instrumentation.py). Key 'i' toggles it
+INSTRUMENTATION_PERIOD = 10     # seconds between summaries while it is enabled, 0 = only at the end
 
 # EQ
 MM_TO_PIXELS = 2.666667
@@ -2,159 +2,280 @@
 coordinator.py
 """
 
+import signal
 import threading
-import queue
 import time
 import struct
 import numpy as np
 import cv2
 
-from src.sensor.computer_camera import ComputerCamera
-from src.detector.color_detector import ColorDetector
-
 from src.tracker import Tracker
+from src.piece.piece import Piece
 
 # from src.transmitter import Transmitter
-from src.transmitter import MulticastTransmitter
+from src.transmitter import MulticastTransmitter, AsyncTransmitter, QueuePolicy
+from src.protocol import encode_record
+from src.utils import monotonic_to_epoch_ms
 
 from src.factory import SensorFactory, DetectorFactory
 from src.sensor.sensor_type import SensorType
+from src.sensor.pixel_format import PixelFormat
 from src.detector.detector_type import DetectorType
+from src.detector.denoise_method import DenoiseMethod
+from src.detector.background_model import BackgroundModel
+from src.motion_gate import MotionGate
+from src.sensor.file_camera import FileCamera, EndOfStreamException
+from src.sensor.threaded_camera import ThreadedCamera
+from src.pipeline import RingBuffer, PipelineStage, PipelineException, StageFinished, BufferClosed, BufferEmpty
+from src.instrumentation import INSTRUMENTATION
+from src.preview import Preview
+from src.buffer_pool import FramePool
 import src.config_vars as cfv
 
-class PairCoordinator:
+class RawPiece():
+    def __init__(self, material: int, timestamp_ms: int, speed: float):
+        self.material = material
+        self.timestamp_ms = timestamp_ms
+        self.speed = speed  # mm/s
+
+    def pack(self) -> bytes:
+        return struct.pack('ILf', self.material, self.timestamp_ms, self.speed)
+
+
+class Coordinator:
     """
-    Pair Coordinator class
+    Coordinator class
     """
-
-    def __init__(self, sensor_name: str = 'ccamera', detector_name: str = 'cdetector'):
+    def __init__(self, sensor_name: str = 'computer_camera', detector_name: str = 'color_detector',
+                 host: str = '224.0.0.1', port: int = 5007, sensor_kwargs: dict | None = None):
         """
         Coordinator constructor
+
+        Args:
+            sensor_kwargs (dict | None): Arguments of the sensor, e.g. {'source': path} for a video file.
         """
-        self.sensor = ComputerCamera()
-        self.detector = ColorDetector()
+        self.sensor = SensorFactory.create(SensorType(sensor_name), **(sensor_kwargs or {}))
+        if cfv.SENSOR_THREADED and not isinstance(self.sensor, FileCamera):
+            # The file cameras already decode ahead in their own thread
+            self.sensor = ThreadedCamera(self.sensor, buffer_size=cfv.SENSOR_THREADED_BUFFER)
+        self.detector = DetectorFactory.create(DetectorType(detector_name))
+
+        self.tracker = Tracker()
+
+        self.transmitter = MulticastTransmitter(host, port, batch=cfv.TRANSMITTER_BATCH,
+                                                batch_window=cfv.TRANSMITTER_BATCH_WINDOW)
+        if cfv.TRANSMITTER_ASYNC:
+            # Send from its own thread, a slow network never stalls the frames
+            self.transmitter = AsyncTransmitter(self.transmitter, maxsize=cfv.TRANSMITTER_QUEUE_SIZE,
+                                                policy=QueuePolicy(cfv.TRANSMITTER_QUEUE_POLICY))
 
-        self.sensor_queue = queue.Queue(maxsize=100)
-        self.detector_queue = queue.Queue(maxsize=100)
+        self.motion_gate: MotionGate | None = None
+
+        self.window_name = 'CHS - Detector Machine - Video'
+        self._last_report_time = time.monotonic()
 
         self.stop_event = threading.Event()
-        # self.lock = threading.Lock()
+        self.preview: Preview | None = None
+        self._previous_signal_handlers: dict = {}
 
-    def sensor_thread(self):
+    def _configure(self) -> None:
         """
-        Sensor
+        Apply the config parameters to the sensor, the detector and the tracker.
         """
-        self.sensor.initialize()
-        while not self.stop_event.is_set():
-            data = self.sensor.read()
-            self.sensor_queue.put(data)
-            time.sleep(0.01)
-        self.sensor.release()
+        self.sensor.configure(resolution=cfv.SENSOR_RESOLUTION, fps=cfv.SENSOR_FPS,
+                              pixel_format=PixelFormat(cfv.SENSOR_PIXEL_FORMAT))
+        self.sensor.roi = cfv.BELT_ROI
+        self.sensor.frame_pool = FramePool(cfv.SENSOR_FRAME_POOL_SIZE) if cfv.SENSOR_FRAME_POOL_SIZE else None
+        self.detector.roi = self.sensor.roi
+        self.tracker.roi = self.sensor.roi
+        self.detector._thresh = cfv.RPI_CAM_THRESHOLD
+        self.detector.min_area = cfv.DETECTOR_MIN_AREA
+        self.detector.denoise_method = DenoiseMethod(cfv.DETECTOR_DENOISE_METHOD)
+        self.detector.reuse_buffers = cfv.DETECTOR_REUSE_BUFFERS
+        self.detector.scale = cfv.DETECTOR_SCALE
+        # The background model works at the scale of the segmentation
+        self.detector.background_model = BackgroundModel(
+            learning_rate=cfv.DETECTOR_BACKGROUND_RATE, foreground_rate=cfv.DETECTOR_BACKGROUND_FOREGROUND_RATE,
+            margin=cfv.DETECTOR_BACKGROUND_MARGIN // cfv.DETECTOR_SCALE
+        ) if cfv.DETECTOR_BACKGROUND == 'adaptive' else None
+        self.tracker._x_addition_limit = cfv.X_ADDITION_LIMIT
+        self.tracker._x_expulsion_limit = cfv.X_EXPULSION_LIMIT
+        self.tracker._min_similarity = cfv.TRACKER_MIN_SIMILARITY
+        self.tracker._classify_every = cfv.TRACKER_CLASSIFY_EVERY
+        self.motion_gate = MotionGate(step=cfv.MOTION_GATE_STEP, thresh=cfv.MOTION_GATE_THRESHOLD,
+                                      min_pixels=cfv.MOTION_GATE_MIN_PIXELS, max_skip=cfv.MOTION_GATE_MAX_SKIP,
+                                      idle_period=cfv.MOTION_GATE_IDLE_PERIOD, entry_limit=cfv.X_ADDITION_LIMIT,
+                                      expulsion_limit=cfv.X_EXPULSION_LIMIT,
+                                      roi=self.sensor.roi) if cfv.MOTION_GATE else None
+        INSTRUMENTATION.enabled = cfv.INSTRUMENTATION_ENABLED
+        self._add_gauges()
+
+    def _predict_pieces(self, timestamp: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the positions of the tracked pieces for the motion gate. Called in the thread of the detector.
+
+        Args:
+            timestamp (float): Capture time of the frame.
 
-    def detector_thread(self):
+        Returns:
+            np.ndarray: (N, 2) predicted positions of the tracked pieces.
+            np.ndarray: (N, 2) speeds of the tracked pieces in pixels/s.
         """
-        Detector
+        return self.tracker.predict(timestamp)
+
+    def _must_detect(self, frame: np.ndarray, timestamp: float | None) -> bool:
         """
-        self.detector.initialize()
-        while not self.stop_event.is_set():
-            
-            try:
-                time.sleep(0.1)
-                data = self.sensor_queue.get(timeout=1)
-                # print('detector')
-                detection = self.detector.detect(data)
-                self.detector_queue.put(detection, timeout=1)
-                # print(1)
-            except queue.Empty:
-                continue
-        self.detector.release()
+        Ask the motion gate whether the frame has to be detected. The skipped frames are not tracked,
+        the tracker predicts the positions of the pieces until the next detection.
+
+        Args:
+            frame (np.ndarray): The frame.
+            timestamp (float | None): Capture time of the frame.
 
-    def main_thread(self):
+        Returns:
+            bool: True if the frame has to be detected. Always True without motion gate.
         """
-        Displays the live video feed from the computer's webcam until
-        a key is pressed.
+        if self.motion_gate is None:
+            return True
+        if timestamp is None:
+            timestamp = time.monotonic()
+        t = INSTRUMENTATION.start()
+        detect = self.motion_gate.update(frame, *self._predict_pieces(timestamp), timestamp=timestamp)
+        INSTRUMENTATION.stop('gate', t)
+        return detect
+
+    def _add_gauges(self) -> None:
         """
-        while not self.stop_event.is_set():
-            # if self.sensor._name == 'Computer Camera':
-            #     frame = self.sensor_queue.get()
-            #     cv2.imshow('Computer CAM live video feed', frame)
-            #     if cv2.waitKey(1) & 0xFF == ord('q'):
-            #         self.stop_event.set()
-            #         print("Stopping coordinator...")
-            #         return -1
-            if self.detector:
-                pieces = self.detector_queue.get()
-                print('Pieces:', [piece.name for piece in pieces])
-
-        # if self.detector:
-        #     detection = self.detector_queue.get()
-        #     print(detection)
-
-    def run_t(self):
+        Register the queue depths and drop counters in the instrumentation summary.
         """
-        Run the coordinator
+        if self.motion_gate is not None:
+            INSTRUMENTATION.add_gauge('gate.detected', lambda: self.motion_gate.detected)
+            INSTRUMENTATION.add_gauge('gate.skipped', lambda: self.motion_gate.skipped)
+        if isinstance(self.sensor, ThreadedCamera):
+            INSTRUMENTATION.add_gauge('sensor.captured', lambda: self.sensor.captured)
+            INSTRUMENTATION.add_gauge('sensor.dropped', lambda: self.sensor.dropped)
+        if isinstance(self.transmitter, AsyncTransmitter):
+            INSTRUMENTATION.add_gauge('transmitter.queue', lambda: self.transmitter.queue_depth)
+            INSTRUMENTATION.add_gauge('transmitter.dropped', lambda: self.transmitter.dropped)
+
+    def _handle_instrumentation(self, key: int, force: bool = False) -> None:
         """
+        Toggle the instrumentation with the key 'i' and print its summary periodically while it is enabled.
 
-        sensor_thread = threading.Thread(target=self.sensor_thread)
-        detector_thread = threading.Thread(target=self.detector_thread)
-
-        sensor_thread.start()
-        detector_thread.start()
-
-        self.main_thread()
-
-        print('Stop', self.stop_event)
-        detector_thread.join()
-        sensor_thread.join()
+        Args:
+            key (int): The key pressed in the window, -1 if none.
+            force (bool): Print the summary now if the instrumentation was used.
+        """
+        if key & 0xFF == ord('i'):
+            print('Instrumentation', 'enabled' if INSTRUMENTATION.toggle() else 'disabled')
+            if INSTRUMENTATION.enabled:
+                INSTRUMENTATION.reset()
+                self._last_report_time = time.monotonic()
+        if force:
+            if INSTRUMENTATION.summary()['stages']:
+                print(INSTRUMENTATION.report())
+        elif INSTRUMENTATION.enabled and cfv.INSTRUMENTATION_PERIOD and \
+                time.monotonic() - self._last_report_time > cfv.INSTRUMENTATION_PERIOD:
+            print(INSTRUMENTATION.report())
+            self._last_report_time = time.monotonic()
+
+    def _install_signal_handlers(self) -> None:
+        """
+        Headless shutdown and preview control with signals: SIGINT and SIGTERM stop the loop
+        (the resources are released as usual), SIGUSR1 renders the next frame in the preview.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            print('Signal handlers can only be installed from the main thread')
+            return
 
-        cv2.destroyAllWindows()
-        print("Coordinator stopped.")
+        def stop(signum, _):
+            print(f'Signal {signal.Signals(signum).name} received, stopping.')
+            self.stop_event.set()
 
+        def request_preview(*_):
+            if self.preview is not None:
+                self.preview.request()
 
+        handlers = {signal.SIGINT: stop, signal.SIGTERM: stop}
+        if hasattr(signal, 'SIGUSR1'):
+            handlers[signal.SIGUSR1] = request_preview
+        for signum, handler in handlers.items():
+            self._previous_signal_handlers[signum] = signal.signal(signum, handler)
 
-class RawPiece():
-    def __init__(self, material: int, timestamp_ms: int, speed: float):
-        self.material = material
-        self.timestamp_ms = timestamp_ms
-        self.speed = speed  # mm/s
+    def _restore_signal_handlers(self) -> None:
+        """
+        Restore the signal handlers replaced by _install_signal_handlers.
+        """
+        for signum, handler in self._previous_signal_handlers.items():
+            signal.signal(signum, handler)
+        self._previous_signal_handlers = {}
 
-    def pack(self) -> bytes:
-        return struct.pack('ILf', self.material, self.timestamp_ms, self.speed)
+    def _start_preview(self) -> None:
+        """
+        Start the headless preview thread if it is configured.
+        """
+        if cfv.PREVIEW_PATH or cfv.PREVIEW_WINDOW:
+            self.preview = Preview(self.tracker.draw, every=cfv.PREVIEW_EVERY, path=cfv.PREVIEW_PATH,
+                                   window_name=self.window_name if cfv.PREVIEW_WINDOW else None)
+            self.preview.start()
 
+    def _stop_preview(self) -> None:
+        """
+        Stop the headless preview thread.
+        """
+        if self.preview is not None:
+            self.preview.stop()
+            self.preview = None
 
-class Coordinator:
-    """
-    Coordinator class
-    """
-    def __init__(self, sensor_name: str = 'computer_camera', detector_name: str = 'color_detector',
-                 host: str = '224.0.0.1', port: int = 5007):
+    def _open_window(self) -> None:
         """
-        Coordinator constructor
+        Open the full screen video window.
         """
-        self.sensor = SensorFactory.create(SensorType(sensor_name))
-        self.detector = DetectorFactory.create(DetectorType(detector_name))
+        cv2.namedWindow(self.window_name, cv2.WND_PROP_FULLSCREEN)
+        # Full screen mode
+        cv2.setWindowProperty(self.window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
 
-        self.tracker = Tracker()
+    def _send_released_pieces(self, released_pieces: list[Piece]) -> None:
+        """
+        Send the released pieces to the peers.
 
-        self.transmitter = MulticastTransmitter(host, port)
+        Args:
+            released_pieces (list[Piece]): Pieces released by the tracker.
+        """
+        pixels_to_mm = cfv.PIXELS_TO_MM
 
-    def run(self, flat_field_flag: bool = False) -> None:
+        print('Released pieces:', self.tracker.get_short_description(released_pieces))
+        for piece in released_pieces:
+            speed = piece.calculate_speed(pixels_to_mm=pixels_to_mm)[0]
+            print('Clasification: ', f'{piece.category.name}({piece.category.value})', 'Speed:', speed)
+            if cfv.TRANSMITTER_RECORD_FORMAT == 'raw':
+                data_raw = RawPiece(material=piece.category.value,
+                                    timestamp_ms=monotonic_to_epoch_ms(piece.get_last_time()),
+                                    speed=speed).pack()
+            else:
+                data_raw = encode_record(piece.to_record(pixels_to_mm),
+                                         extended=cfv.TRANSMITTER_RECORD_FORMAT == 'v1_extended')
+            self.transmitter.send_piece(data_raw)
+            print('Sent:', data_raw)
+
+    def run(self, flat_field_flag: bool = False, headless: bool = cfv.HEADLESS) -> None:
         """
         Run the coordinator
+
+        Args:
+            flat_field_flag (bool): Use the first frame as flat field.
+            headless (bool): No window and no drawing in the loop. Stopped with SIGINT/SIGTERM. The frames
+                are only drawn by the optional preview thread (config PREVIEW_*).
         """
         # Config parameters
-
-        self.detector._thresh = cfv.RPI_CAM_THRESHOLD
-        self.detector.min_area = cfv.DETECTOR_MIN_AREA
-        self.tracker._x_addition_limit = cfv.X_ADDITION_LIMIT
-        self.tracker._x_expulsion_limit = cfv.X_EXPULSION_LIMIT
-        pixels_to_mm = cfv.PIXELS_TO_MM
+        self._configure()
 
         # Window
-        window_name = 'CHS - Detector Machine - Video'
-        cv2.namedWindow(window_name, cv2.WND_PROP_FULLSCREEN)
-        # Full screen mode
-        cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+        if headless:
+            self._install_signal_handlers()
+            self._start_preview()
+        else:
+            self._open_window()
 
         print()
         print('----- Init vars -----')
@@ -164,51 +285,375 @@ class Coordinator:
         self.detector.initialize()
 
         self.transmitter.initialize()
-        
+
         print()
         print('----- Start Loop -----')
         print()
-    
-        while True:
-            frame = self.sensor.read()
+
+        while not self.stop_event.is_set():
+            t_frame = INSTRUMENTATION.start()
+            try:
+                frame = self.sensor.read()
+            except EndOfStreamException:
+                print('End of stream.')
+                break
+            INSTRUMENTATION.stop('read', t_frame)
 
             # flat field
             if flat_field_flag:
                 self.detector.flat_field = frame
                 flat_field_flag = False
 
-            threshold_image, pieces = self.detector.detect(frame, merge_pieces=False)
+            # Idle frames are not detected, an empty list does not update the tracker
+            pieces = []
+            if self._must_detect(frame, self.sensor.timestamp):
+                t = INSTRUMENTATION.start()
+                # The pieces get the capture time of the frame, not the processing time
+                _, pieces = self.detector.detect(frame, merge_pieces=cfv.DETECTOR_MERGE_PIECES,
+                                                 timestamp=self.sensor.timestamp)
+                INSTRUMENTATION.stop('detect', t)
+            t = INSTRUMENTATION.start()
             released_pieces = self.tracker.update(pieces)
+            INSTRUMENTATION.stop('track', t)
 
             # Send the released pieces to the peers
+            t = INSTRUMENTATION.start()
             if released_pieces:
-                print('Released pieces:', self.tracker.get_short_description(released_pieces))
-                for piece in released_pieces:
-                    print('Clasification: ', f'{piece.category.name}({piece.category.value})', 'Speed:', piece.calculate_speed(pixels_to_mm=pixels_to_mm)[0])
-                    data_raw = RawPiece(material=piece.category.value, 
-                                        timestamp_ms=int(piece.positions[-1]['time'] * 1000),   # Convert to millis
-                                        speed=piece.calculate_speed(pixels_to_mm=pixels_to_mm)[0]).pack()
-                    self.transmitter.send_multicast(data_raw)
-                    print('Sent:', data_raw)
+                self._send_released_pieces(released_pieces)
+            self.transmitter.poll()
+            INSTRUMENTATION.stop('transmit', t)
+
+            if headless:
+                if self.preview is not None:
+                    self.preview.offer(frame, self.tracker.pieces)
+                # The preview copies the frame, it goes back to the pool
+                self.sensor.release_frame(frame)
+                INSTRUMENTATION.stop('frame', t_frame)
+                self._handle_instrumentation(-1)
+                continue
 
             # Draw the tracker
+            t = INSTRUMENTATION.start()
             self.tracker.draw(frame)
-            t_i = cv2.cvtColor(threshold_image, cv2.COLOR_GRAY2BGR)
-            final_img = cv2.vconcat([t_i, frame])
             final_img = frame
-            cv2.imshow(window_name, final_img)
+            cv2.imshow(self.window_name, final_img)
+            self.sensor.release_frame(frame)
             # cv2.moveWindow('Video', 20, 40)
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            key = cv2.waitKey(1)
+            INSTRUMENTATION.stop('display', t)
+            INSTRUMENTATION.stop('frame', t_frame)
+            if key & 0xFF == ord('q'):
                 break
+            self._handle_instrumentation(key)
+
+        print()
+        print('----- Release resoures -----')
+        print()
+
+        self._handle_instrumentation(-1, force=True)
+        self._stop_preview()
+        self._restore_signal_handlers()
+        self.sensor.release()
+        self.detector.release()
+        self.transmitter.release()
+        if not headless:
+            cv2.destroyAllWindows()
+
+        print("Coordinator stopped.")
+
+
+class PipelineCoordinator(Coordinator):
+    """
+    Pipeline Coordinator class
+
+    Runs capture, detection, tracking/classification and transmission in their own
+    threads, connected by bounded ring buffers. The display runs in the main thread.
+
+    capture -> detect -> track -+-> transmit
+                                +-> display (or headless preview)
+
+    The capture buffer drops the oldest frame when the detector falls behind, so the
+    detector always works on recent frames. The display buffer also drops old frames,
+    so a slow window never stalls the tracker.
+    """
+
+    def __init__(self, sensor_name: str = 'computer_camera', detector_name: str = 'color_detector',
+                 host: str = '224.0.0.1', port: int = 5007, sensor_kwargs: dict | None = None,
+                 buffer_size: int = cfv.PIPELINE_BUFFER_SIZE, stats_period: float = cfv.PIPELINE_STATS_PERIOD):
+        """
+        Pipeline Coordinator constructor
+
+        Args:
+            sensor_kwargs (dict | None): Arguments of the sensor, e.g. {'source': path} for a video file.
+            buffer_size (int): Size of the capture and display ring buffers.
+            stats_period (float): Seconds between stage statistics reports. 0 disables the report.
+        """
+        super().__init__(sensor_name=sensor_name, detector_name=detector_name, host=host, port=port,
+                         sensor_kwargs=sensor_kwargs)
+
+        # The dropped frames go back to the frame pool of the sensor, the displayed ones in _display
+        self.capture_buffer = RingBuffer(maxsize=buffer_size, drop_oldest=True,
+                                         on_drop=lambda capture: self.sensor.release_frame(capture[0]))
+        self.detection_buffer = RingBuffer(maxsize=buffer_size)
+        self.transmission_buffer = RingBuffer(maxsize=cfv.PIPELINE_TRANSMISSION_BUFFER_SIZE)
+        self.display_buffer = RingBuffer(maxsize=buffer_size, drop_oldest=True,
+                                         on_drop=lambda tracking: self.sensor.release_frame(tracking[0]))
+
+        self._stats_period = stats_period
+        self._flat_field_flag = False
+        # (time, positions, speeds) of the tracked pieces, published by the track stage for the motion gate
+        self._tracked_motion: tuple[float, np.ndarray, np.ndarray] | None = None
+        self._stages: list[PipelineStage] = []
+
+    # ----- stages
+
+    def _capture(self, _) -> tuple[np.ndarray, float | None]:
+        """
+        Capture stage. Read a frame from the sensor.
+
+        Returns:
+            tuple: the frame and its capture time.
+        """
+        t = INSTRUMENTATION.start()
+        try:
+            frame = self.sensor.read()
+        except EndOfStreamException as e:
+            print('End of stream.')
+            raise StageFinished() from e
+        INSTRUMENTATION.stop('read', t)
+        return frame, self.sensor.timestamp
+
+    def _detect(self, capture: tuple[np.ndarray, float | None]) -> tuple[np.ndarray, list[Piece], float | None]:
+        """
+        Detection stage. Detect the pieces in a frame.
+
+        Returns:
+            tuple: the frame, the detected pieces and the capture time of the frame.
+        """
+        frame, timestamp = capture
+        if self._flat_field_flag:
+            self.detector.flat_field = frame
+            self._flat_field_flag = False
+        # Idle frames are not detected, an empty list does not update the tracker
+        if not self._must_detect(frame, timestamp):
+            return frame, [], timestamp
+        t = INSTRUMENTATION.start()
+        _, pieces = self.detector.detect(frame, merge_pieces=cfv.DETECTOR_MERGE_PIECES, timestamp=timestamp)
+        INSTRUMENTATION.stop('detect', t)
+        return frame, pieces, timestamp
+
+    def _predict_pieces(self, timestamp: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the positions of the tracked pieces for the motion gate, from the last state published by
+        the track stage. The tracker is only read in its own thread.
+
+        Args:
+            timestamp (float): Capture time of the frame.
+
+        Returns:
+            np.ndarray: (N, 2) predicted positions of the tracked pieces.
+            np.ndarray: (N, 2) speeds of the tracked pieces in pixels/s.
+        """
+        tracked_motion = self._tracked_motion
+        if tracked_motion is None:
+            return np.empty((0, 2)), np.empty((0, 2))
+        tracked_time, positions, speeds = tracked_motion
+        # The frames in the buffers are newer than the state, extrapolated to the time of the frame
+        return positions + speeds * max(timestamp - tracked_time, 0.0), speeds
+
+    def _track(self, detection: tuple[np.ndarray, list[Piece], float | None]
+               ) -> tuple[np.ndarray, list[Piece], list[Piece]]:
+        """
+        Tracking and classification stage. Update the tracker.
+
+        Returns:
+            tuple: the frame, a snapshot of the tracked pieces and the released pieces.
+        """
+        frame, pieces, timestamp = detection
+        t = INSTRUMENTATION.start()
+        released_pieces = self.tracker.update(pieces)
+        INSTRUMENTATION.stop('track', t)
+        if self.motion_gate is not None:
+            # Replaced as a whole, the detect thread reads a consistent state
+            tracked_time = timestamp if timestamp is not None else time.monotonic()
+            self._tracked_motion = (tracked_time, *self.tracker.predict(tracked_time))
+        # Drawn state of the tracked pieces, the tracker keeps updating them in this thread
+        return frame, [piece.copy_for_drawing() for piece in self.tracker.pieces], released_pieces
+
+    def _transmit(self, tracking: tuple[np.ndarray, list[Piece], list[Piece]]) -> None:
+        """
+        Transmission stage. Send the released pieces to the peers.
+        """
+        released_pieces = tracking[2]
+        t = INSTRUMENTATION.start()
+        if released_pieces:
+            self._send_released_pieces(released_pieces)
+        self.transmitter.poll()
+        INSTRUMENTATION.stop('transmit', t)
+
+    def _display(self, timeout: float = 0.5, headless: bool = False) -> bool:
+        """
+        Display stage. Draw the last tracked frame. Runs in the main thread.
+
+        Headless, the frame is only handed over to the preview thread, if it wants it.
+
+        Returns:
+            bool: False when the pipeline has finished and there is nothing left to display.
+        """
+        try:
+            frame, pieces, _ = self.display_buffer.get(timeout=timeout)
+        except BufferEmpty:
+            return True
+        except BufferClosed:
+            return False
+        if headless:
+            if self.preview is not None:
+                self.preview.offer(frame, pieces)
+            self.sensor.release_frame(frame)
+            return True
+        t = INSTRUMENTATION.start()
+        self.tracker.draw(frame, pieces=pieces)
+        cv2.imshow(self.window_name, frame)
+        self.sensor.release_frame(frame)
+        INSTRUMENTATION.stop('display', t)
+        return True
+
+    # ----- control
+
+    def _add_gauges(self) -> None:
+        """
+        Register the ring buffer depths and the dropped frames in the instrumentation summary.
+        """
+        super()._add_gauges()
+        for name, ring_buffer in (('capture', self.capture_buffer), ('detection', self.detection_buffer),
+                                  ('transmission', self.transmission_buffer), ('display', self.display_buffer)):
+            INSTRUMENTATION.add_gauge(f'{name}.queue', ring_buffer.__len__)
+        INSTRUMENTATION.add_gauge('capture.dropped', lambda: self.capture_buffer.dropped)
+        INSTRUMENTATION.add_gauge('display.dropped', lambda: self.display_buffer.dropped)
+
+    def _start(self) -> None:
+        """
+        Create and start the stage threads.
+        """
+        self._stages = [
+            PipelineStage('capture', self._capture, self.stop_event,
+                          output_buffers=[self.capture_buffer]),
+            PipelineStage('detect', self._detect, self.stop_event,
+                          input_buffer=self.capture_buffer, output_buffers=[self.detection_buffer]),
+            PipelineStage('track', self._track, self.stop_event,
+                          input_buffer=self.detection_buffer,
+                          output_buffers=[self.transmission_buffer, self.display_buffer]),
+            PipelineStage('transmit', self._transmit, self.stop_event,
+                          input_buffer=self.transmission_buffer),
+        ]
+        for stage in self._stages:
+            stage.start()
+
+    def _stop(self, drain: bool = False) -> None:
+        """
+        Stop the stage threads and wait for them.
+
+        Args:
+            drain (bool): Let the stages process the pending items before stopping them.
+                Used when the sensor has no more frames.
+        """
+        if drain:
+            for stage in self._stages:
+                stage.join()
+        self.stop_event.set()
+        for ring_buffer in (self.capture_buffer, self.detection_buffer,
+                            self.transmission_buffer, self.display_buffer):
+            ring_buffer.close()
+        for stage in self._stages:
+            stage.join()
+
+    def print_stats(self) -> None:
+        """
+        Print the statistics of every stage.
+        """
+        print('----- Pipeline stats -----')
+        for stage in self._stages:
+            print(stage.stats)
+        print(f'Dropped frames: capture {self.capture_buffer.dropped}, display {self.display_buffer.dropped}')
+        if isinstance(self.sensor, ThreadedCamera):
+            print(f'Sensor: {self.sensor.captured} captured, {self.sensor.dropped} dropped')
+        if isinstance(self.transmitter, AsyncTransmitter):
+            print(f'Transmitter: {self.transmitter.sent} sent, {self.transmitter.dropped} dropped, '
+                  f'{self.transmitter.errors} errors, queue {self.transmitter.queue_depth}')
+
+    def run(self, flat_field_flag: bool = False, headless: bool = cfv.HEADLESS) -> None:
+        """
+        Run the pipeline coordinator
+
+        Args:
+            flat_field_flag (bool): Use the first frame as flat field.
+            headless (bool): No window and no drawing. Stopped with SIGINT/SIGTERM. The frames are only
+                drawn by the optional preview thread (config PREVIEW_*).
+        """
+        # Config parameters
+        self._configure()
+        self._flat_field_flag = flat_field_flag
+        self._tracked_motion = None
+
+        # Window
+        if headless:
+            self._install_signal_handlers()
+            self._start_preview()
+        else:
+            self._open_window()
+
+        print()
+        print('----- Init vars -----')
+        print()
+
+        self.sensor.initialize()
+        self.detector.initialize()
+
+        self.transmitter.initialize()
+
+        print()
+        print('----- Start Pipeline -----')
+        print()
+
+        self._start()
+        last_stats_time = time.monotonic()
+        finished = False
+
+        try:
+            while not self.stop_event.is_set():
+                if not self._display(headless=headless):
+                    finished = True
+                    break
+
+                key = -1 if headless else cv2.waitKey(1)
+                if key & 0xFF == ord('q'):
+                    break
+                self._handle_instrumentation(key)
+
+                if self._stats_period and time.monotonic() - last_stats_time > self._stats_period:
+                    self.print_stats()
+                    last_stats_time = time.monotonic()
+        finally:
+            self._stop(drain=finished)
 
         print()
         print('----- Release resoures -----')
         print()
 
+        self.print_stats()
+        self._handle_instrumentation(-1, force=True)
+        self._stop_preview()
+        self._restore_signal_handlers()
         self.sensor.release()
         self.detector.release()
-        cv2.destroyAllWindows()
+        self.transmitter.release()
+        if not headless:
+            cv2.destroyAllWindows()
+
+        for stage in self._stages:
+            if stage.exception is not None:
+                raise PipelineException(f'Stage {stage.name} failed') from stage.exception
 
         print("Coordinator stopped.")
 
@@ -216,9 +661,9 @@ class Coordinator:
 
 if __name__ == '__main__':
 
-    # ----- pair Coordinator with threads
-    # coordinator = PairCoordinator()
-    # coordinator.run_t()
+    # ----- Pipeline Coordinator with threads
+    # coordinator = PipelineCoordinator('rpi_camera')
+    # coordinator.run()
 
     # ----- Coordinator
     coordinator = Coordinator('rpi_camera')
@@ -0,0 +1,151 @@
+"""
+background_model.py
+"""
+
+import numpy as np
+import cv2
+
+from src.detector.base_detector import DetectorException
+
+
+class BackgroundModelException(DetectorException):
+    """
+    Exception class for background model errors.
+    """
+
+
+class BackgroundModel:
+    """
+    Gray image of the empty belt updated incrementally, a replacement for the static flat field.
+
+    The model is a running average of the denoised gray frames, only on the pixels outside the
+    pieces: the binary image of the segmentation, every component, dilated by a margin so the
+    blurred border of the pieces is not learnt. Slow lighting changes are followed, the pieces
+    are never absorbed.
+
+    Cost per update: a dilation, a masked cv2.accumulateWeighted on a float32 image and its
+    conversion to uint8, all in preallocated buffers.
+
+    Attributes:
+        _learning_rate (float): Weight of a new frame in the background pixels. About 1 / learning_rate
+            frames to follow a change.
+        _foreground_rate (float): Weight of a new frame in the foreground pixels. 0 never updates them.
+        _margin (int): Pixels added around the foreground before masking it.
+        _update_every (int): Update the model every N frames.
+        _accumulator (np.ndarray | None): The running average, float32.
+        _background (np.ndarray | None): The running average as uint8, the flat field of the detector.
+        _updates (int): Number of calls to update().
+    """
+
+    def __init__(self, learning_rate: float = 0.01, foreground_rate: float = 0.0, margin: int = 15,
+                 update_every: int = 1):
+        """
+        Initializes the background model. The image is set by reset() or by the first update().
+
+        Args:
+            learning_rate (float): Weight of a new frame in the background pixels, in (0, 1].
+            foreground_rate (float): Weight of a new frame in the foreground pixels, in [0, 1]. A small value
+                lets the model recover from a change wrongly segmented as a piece (e.g. a light turned on).
+            margin (int): Pixels added around the foreground before masking it. About half the blur kernel.
+            update_every (int): Update the model every N frames.
+        """
+        if not 0 < learning_rate <= 1:
+            raise BackgroundModelException(f"Invalid learning rate: {learning_rate}")
+        if not 0 <= foreground_rate <= 1:
+            raise BackgroundModelException(f"Invalid foreground rate: {foreground_rate}")
+        if margin < 0 or update_every < 1:
+            raise BackgroundModelException("The margin must be positive and update_every at least 1.")
+        self._learning_rate = learning_rate
+        self._foreground_rate = foreground_rate
+        self._margin = margin
+        self._update_every = update_every
+        self._kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * margin + 1, 2 * margin + 1)) if margin else None
+
+        self._accumulator: np.ndarray | None = None
+        self._background: np.ndarray | None = None
+        self._mask: np.ndarray | None = None
+        self._updates = 0
+
+    @property
+    def learning_rate(self) -> float:
+        """
+        Get the weight of a new frame in the background pixels
+        """
+        return self._learning_rate
+
+    @property
+    def background(self) -> np.ndarray | None:
+        """
+        Get the background gray image. None before the first frame. Updated in place.
+        """
+        return self._background
+
+    @property
+    def shape(self) -> tuple[int, int] | None:
+        """
+        Get the shape of the model. None before the first frame.
+        """
+        return self._background.shape if self._background is not None else None
+
+    @property
+    def updates(self) -> int:
+        """
+        Get the number of updates since the last reset
+        """
+        return self._updates
+
+    def is_initialized(self) -> bool:
+        """
+        Check whether the model has a background image.
+        """
+        return self._background is not None
+
+    def reset(self, gray_image: np.ndarray | None = None) -> None:
+        """
+        Restart the model from a gray image of the belt, or empty until the next update().
+
+        Args:
+            gray_image (np.ndarray | None): Denoised gray image, the initial background.
+        """
+        self._updates = 0
+        if gray_image is None:
+            self._accumulator = self._background = self._mask = None
+            return
+        if gray_image.ndim != 2:
+            raise BackgroundModelException("The background model needs a gray image.")
+        self._accumulator = gray_image.astype(np.float32)
+        self._background = gray_image.copy()
+        self._mask = np.empty_like(self._background)
+
+    def update(self, gray_image: np.ndarray, foreground: np.ndarray | None = None) -> np.ndarray:
+        """
+        Add a frame to the running average, only outside the foreground.
+
+        The first frame, or a frame of another shape (e.g. a new ROI), restarts the model.
+
+        Args:
+            gray_image (np.ndarray): Denoised gray image, denoised like the frames of the detector.
+            foreground (np.ndarray | None): Binary image of the pieces (255), same shape. None updates every pixel.
+
+        Returns:
+            np.ndarray: The updated background.
+        """
+        if self._background is None or self._background.shape != gray_image.shape:
+            self.reset(gray_image)
+            return self._background
+        self._updates += 1
+        if self._updates % self._update_every:
+            return self._background
+
+        if foreground is None:
+            cv2.accumulateWeighted(gray_image, self._accumulator, self._learning_rate)
+        else:
+            if self._kernel is not None:
+                foreground = cv2.dilate(foreground, self._kernel, dst=self._mask)
+            if self._foreground_rate:
+                cv2.accumulateWeighted(gray_image, self._accumulator, self._foreground_rate, mask=foreground)
+            background_mask = cv2.bitwise_not(foreground, dst=self._mask)
+            cv2.accumulateWeighted(gray_image, self._accumulator, self._learning_rate, mask=background_mask)
+        # Rounded and saturated to uint8, in place
+        cv2.convertScaleAbs(self._accumulator, dst=self._background)
+        return self._background
@@ -2,15 +2,20 @@
 color_detector.py
 """
 
+import time
 import numpy as np
 import cv2
 
 from src.detector.base_detector import BaseDetector, DetectorException
 from src.detector.detector_type import DetectorType
+from src.detector.denoise_method import DenoiseMethod
+from src.detector.background_model import BackgroundModel
 
 from src.detector import utils as dut
-from src.piece.piece import Piece
-# import src.utils as ut
+from src.piece.piece import Piece, classify_pieces
+from src.instrumentation import INSTRUMENTATION
+from src.buffer_pool import ScratchBuffers
+import src.utils as ut
 
 
 class ColorDetectorException(DetectorException):
@@ -24,13 +29,28 @@ class ColorDetector(BaseDetector):
     A color detector class implementing the DetectorInterface to detect specific colors in an image.
     """
 
-    def __init__(self, name: str = 'detector-image-color', thresh: int = 150, min_area: int = 300):
+    MERGE_GROW_RECTANGLE = 3  # Tolerance in pixels for merging components (merge_pieces)
+    SCALES = (1, 2, 4)  # Downscale factors of the segmentation
+
+    def __init__(self, name: str = 'detector-image-color', thresh: int = 150, min_area: int = 300,
+                 roi: tuple[int, int, int, int] | None = None,
+                 denoise_method: DenoiseMethod = DenoiseMethod.GAUSSIAN, classify: bool = False,
+                 reuse_buffers: bool = False, background_model: BackgroundModel | None = None, scale: int = 1):
         """
         Initializes the color detector.
 
         Args:
             target_color_lower (tuple): The lower bound of the color in HSV format (e.g., (0, 100, 100)).
             target_color_upper (tuple): The upper bound of the color in HSV format (e.g., (10, 255, 255)).
+            roi (tuple | None): Region of interest (x, y, w, h) of the frame to process. None is the full frame.
+            denoise_method (DenoiseMethod): Noise reduction strategy applied before the segmentation.
+            classify (bool): Classify the detected pieces, all of them in one call to the classifier.
+            reuse_buffers (bool): Preallocate the intermediate images and reuse them every frame. The image
+                returned by detect is then only valid until the next call.
+            background_model (BackgroundModel | None): Update the flat field every frame, outside the pieces.
+                Starts from the flat field, only used when it is set. None keeps the flat field static.
+            scale (int): Downscale factor of the segmentation (1, 2 or 4). The pieces are found on the small
+                gray image and their colors are sampled on the full resolution image.
         """
         self._name = name
         self._status = "idle"
@@ -40,7 +60,16 @@ class ColorDetector(BaseDetector):
 
         self._min_area = min_area
         self._thresh = thresh
+        self._denoise_method = denoise_method
+        self._classify = classify
+        self._buffers = ScratchBuffers() if reuse_buffers else None
         self._flat_field = None
+        self._background_model = background_model
+        self._scaled_flat_field = None
+        self._scale = 1
+        self.scale = scale
+        self._roi = None
+        self.roi = roi
 
     @property
     def flat_field(self):
@@ -54,9 +83,121 @@ class ColorDetector(BaseDetector):
         """
         Set flat field
         """
-        noise_free_flat_field = dut.reduce_noise(flat_field, (31, 31))
-        gray_flat_field = cv2.cvtColor(noise_free_flat_field, cv2.COLOR_BGR2GRAY)
+        gray_flat_field = dut.reduce_noise_gray(flat_field, (31, 31), self._denoise_method)
         self._flat_field = gray_flat_field
+        self._scaled_flat_field = None
+        # The background model starts again from the new flat field
+        if self._background_model is not None:
+            self._background_model.reset()
+
+    @property
+    def background_model(self) -> BackgroundModel | None:
+        """
+        Get the background model that updates the flat field. None if the flat field is static.
+        """
+        return self._background_model
+
+    @background_model.setter
+    def background_model(self, background_model: BackgroundModel | None):
+        """
+        Set the background model that updates the flat field. None keeps the flat field static.
+        """
+        if background_model is not None and not isinstance(background_model, BackgroundModel):
+            raise ColorDetectorException(f"Invalid background model: {background_model}")
+        self._background_model = background_model
+
+    @property
+    def denoise_method(self) -> DenoiseMethod:
+        """
+        Get the noise reduction strategy
+        """
+        return self._denoise_method
+
+    @denoise_method.setter
+    def denoise_method(self, denoise_method: DenoiseMethod):
+        """
+        Set the noise reduction strategy. Set it before the flat field, both must be denoised alike.
+        """
+        if not isinstance(denoise_method, DenoiseMethod):
+            raise ColorDetectorException(f"Invalid denoise method: {denoise_method}")
+        self._denoise_method = denoise_method
+
+    @property
+    def scale(self) -> int:
+        """
+        Get the downscale factor of the segmentation
+        """
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale: int):
+        """
+        Set the downscale factor of the segmentation. 1 segments the full resolution image.
+        """
+        if scale not in self.SCALES:
+            raise ColorDetectorException(f"Invalid scale: {scale}. Valid scales: {self.SCALES}")
+        self._scale = scale
+
+    @property
+    def reuse_buffers(self) -> bool:
+        """
+        Get whether the intermediate images are preallocated and reused every frame.
+        """
+        return self._buffers is not None
+
+    @reuse_buffers.setter
+    def reuse_buffers(self, reuse_buffers: bool):
+        """
+        Set whether the intermediate images are preallocated and reused every frame.
+        """
+        if reuse_buffers and self._buffers is None:
+            self._buffers = ScratchBuffers()
+        elif not reuse_buffers:
+            self._buffers = None
+
+    @property
+    def buffers(self) -> ScratchBuffers | None:
+        """
+        Get the reused intermediate images. None if they are allocated every frame.
+        """
+        return self._buffers
+
+    @property
+    def roi(self) -> tuple[int, int, int, int] | None:
+        """
+        Get the region of interest (x, y, w, h). None is the full frame.
+        """
+        return self._roi
+
+    @roi.setter
+    def roi(self, roi: tuple[int, int, int, int] | None):
+        """
+        Set the region of interest (x, y, w, h). None is the full frame.
+        """
+        if roi is not None and not (isinstance(roi, tuple) and len(roi) == 4 and
+                                    all(isinstance(i, int) for i in roi) and
+                                    roi[0] >= 0 and roi[1] >= 0 and roi[2] > 0 and roi[3] > 0):
+            raise ColorDetectorException("ROI must be a tuple of four positive integers (x, y, w, h)")
+        self._roi = roi
+
+    def _get_flat_field(self) -> np.ndarray | None:
+        """
+        Get the flat field of the region of interest at the scale of the segmentation.
+
+        The downscaled flat field is computed once and kept until the flat field, the ROI or the scale change.
+
+        Returns:
+            np.ndarray | None: The gray flat field, None if it is not set.
+        """
+        if self._flat_field is None:
+            return None
+        flat_field = ut.crop_roi(self._flat_field, self._roi)
+        if self._scale == 1:
+            return flat_field
+        key = (self._roi, self._scale)
+        if self._scaled_flat_field is None or self._scaled_flat_field[0] != key:
+            self._scaled_flat_field = (key, dut.downscale_gray(flat_field, self._scale))
+        return self._scaled_flat_field[1]
 
     def reset(self):
         """
@@ -93,38 +234,76 @@ class ColorDetector(BaseDetector):
         print("Color detector initialized.")
         self._status = "active"
 
-    def detect(self, image: np.ndarray,
-               merge_pieces: bool = True, verbose: bool = False) -> tuple[np.ndarray, list[Piece]]:
+    def detect(self, image: np.ndarray, merge_pieces: bool = True, verbose: bool = False,
+               timestamp: float | None = None) -> tuple[np.ndarray, list[Piece]]:
         """
         Detects a specific color in the provided image.
 
+        Only the region of interest is processed. The pieces are returned in frame coordinates.
+
+        With a scale above 1 the gray image is downscaled before the noise reduction, the blur kernel and
+        the minimum area are scaled too. The components are mapped back to full resolution: bounding
+        boxes, areas and centroids are scaled and the mean colors are sampled on the full resolution
+        pixels of each component.
+
         Args:
             image (np.ndarray): an image.
+            timestamp (float | None): Capture time of the image (sensor timestamp property), time.monotonic()
+                clock. Every sample of the pieces gets it. None is the current time.
 
         Returns:
-            np.ndarray: The processed image after noise reduction and segmentation.
+            np.ndarray: The processed region of interest after noise reduction and segmentation, downscaled
+                by the scale. With reuse_buffers, valid until the next call.
             list[Pieces]: A list of pieces.
         """
 
         # Resize image
         # image = cv2.resize(image, (640, 640))
 
-        # Reduce noise
-        noise_free_image = dut.reduce_noise(image, (31, 31))
-
-        # Convert to gray
-        gray_image = cv2.cvtColor(noise_free_image, cv2.COLOR_BGR2GRAY)
+        # Region of interest. Views, no pixels are copied
+        image = ut.crop_roi(image, self._roi)
+        flat_field = self._get_flat_field()
+        offset_x, offset_y = (self._roi[0], self._roi[1]) if self._roi is not None else (0, 0)
+
+        # Reduce noise and convert to gray
+        t = INSTRUMENTATION.start()
+        if self._scale == 1:
+            gray_image = dut.reduce_noise_gray(image, (31, 31), self._denoise_method, buffers=self._buffers)
+        else:
+            # Gray and small first, the blur works on scale^2 times less pixels
+            small_image = dut.downscale_gray(image, self._scale, buffers=self._buffers)
+            gray_image = dut.reduce_noise_gray(small_image, dut.get_scaled_ksize((31, 31), self._scale),
+                                               self._denoise_method, buffers=self._buffers)
+        INSTRUMENTATION.stop('detect.denoise', t)
         # ut.show_image(gray_image)
 
+        # Adaptive flat field: the background model, started from the static one
+        update_background = flat_field is not None and self._background_model is not None
+        if update_background:
+            if self._background_model.shape != gray_image.shape:
+                self._background_model.reset(flat_field)
+            flat_field = self._background_model.background
+
         # # Segment image
         # threshold_image = dut.segment(gray_image, self._min_area, verbose)
 
-        # Segment image 2
-        threshold_image = dut.segment(gray_image, thresh=self._thresh,
-                                      min_area=self._min_area, flat_field=self._flat_field,
-                                      verbose=verbose)
+        # Segment image 2. Fused: threshold, label once and filter the small components by area
+        t = INSTRUMENTATION.start()
+        min_area = -(-self._min_area // self._scale ** 2)   # Rounded up, in small pixels
+        segmentation = dut.segment_labels(gray_image, thresh=self._thresh,
+                                          min_area=min_area, flat_field=flat_field,
+                                          verbose=verbose, buffers=self._buffers)
+        threshold_image = segmentation.threshold_image
+        num_labels = len(segmentation)
+        INSTRUMENTATION.stop('detect.segment', t)
         # ut.show_image(threshold_image)
 
+        # Learn the belt outside every component, the small ones too
+        if update_background:
+            t = INSTRUMENTATION.start()
+            self._background_model.update(gray_image, segmentation.foreground)
+            INSTRUMENTATION.stop('detect.background', t)
+
         # Find connected components
         # num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(threshold_image)
         # threshold_image = dut.delete_small_labels(threshold_image, self._min_area, verbose)
@@ -136,67 +315,53 @@ class ColorDetector(BaseDetector):
 
         # dilated_image = cv2.dilate(threshold_image, kernel, iterations=1)
         # eroded_image = cv2.erode(dilated_image, kernel, iterations=1)
-        eroded_image = threshold_image.copy()
-        # threshold_image = eroded_image.copy()
-
-        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(eroded_image)
-        # ut.show_image(threshold_image)
-        # cv2.waitKey(1)
-
-        # join close components
-        if merge_pieces:    # Recorremos cada par de componentes (ignoramos el fondo: label 0)
-            grow_rectangle = 3  # Tolerance for merging components
-            for i in range(1, num_labels):
-                x1, y1, w1, h1, _ = stats[i]
-                rect1 = (x1 - grow_rectangle, 
-                         y1 - grow_rectangle, 
-                         x1 + w1 + grow_rectangle*2, 
-                         y1 + h1 + grow_rectangle*2)  # (x1_min, y1_min, x1_max, y1_max)
-
-                for j in range(i + 1, num_labels):
-                    x2, y2, w2, h2, _ = stats[j]
-                    rect2 = (x2 - grow_rectangle, 
-                             y2 - grow_rectangle, 
-                             x2 + w2 + grow_rectangle*2, 
-                             y2 + h2 + grow_rectangle*2)  # (x1_min, y1_min, x1_max, y1_max)
-
-                    # Verificar si las bounding boxes se tocan o se solapan
-                    intersectan = not (
-                        rect1[2] < rect2[0] or rect2[2] < rect1[0] or
-                        rect1[3] < rect2[1] or rect2[3] < rect1[1]
-                    )
-
-                    if intersectan:
-                        # Obtener los centros
-                        centro1 = tuple(map(int, centroids[i]))
-                        centro2 = tuple(map(int, centroids[j]))
-
-                        # Dibujar línea blanca que los una
-                        cv2.line(eroded_image, centro1, centro2, 255, thickness=2)
-            num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(eroded_image)
-
-        # Create Pieces
+        eroded_image = threshold_image
+
+        # Statistics of every label in a single pass
+        t = INSTRUMENTATION.start()
+        if self._scale == 1:
+            labels_stats = dut.get_labels_stats(segmentation.labels, segmentation.stats, segmentation.centroids,
+                                                image, keep=segmentation.keep)
+        else:
+            labels_stats = dut.get_scaled_labels_stats(segmentation.labels, segmentation.stats,
+                                                       segmentation.centroids, image, self._scale,
+                                                       keep=segmentation.keep)
+
+        # join close components: the labels whose grown bounding boxes touch are one piece. Merged in the
+        # statistics, the image is not labeled again
+        if merge_pieces:
+            groups = dut.get_label_groups(labels_stats.bboxes, self.MERGE_GROW_RECTANGLE)
+            labels_stats = dut.merge_labels_stats(labels_stats, groups)
+            num_labels = len(labels_stats)
+        mean_colors = labels_stats.mean_colors
+
+        # Create Pieces. One time for every sample of the frame
         pieces: list[Piece] = []
+        if timestamp is None:
+            timestamp = time.monotonic()
 
         for label in range(1, num_labels):
-            x, y, w, h, area = stats[label]
-
-            # Why? TODO - Check
-            # mean_color = dut.get_mean_color_from_image(threshold_image, image)
-            # position = dut.get_gravity_center(threshold_image)
-            mean_color = None
-            position = None
+            x, y, w, h = labels_stats.bboxes[label]
+            area = labels_stats.areas[label]
 
-            piece = Piece(id=label, name='piece', bbox=(int(x), int(y), int(w), int(h)),
-                          mean_color=mean_color, position=position, area=int(area))
+            piece = Piece(id=label, name='piece', bbox=(int(x) + offset_x, int(y) + offset_y, int(w), int(h)),
+                          area=int(area), timestamp=timestamp)
 
             # # Change to LAB format
             # image_lab = cv2.cvtColor(image, cv2.COLOR_BGR2Lab)
             # image = image_lab
-            piece.add_mean_color(dut.get_mean_color_from_label(label, labels, image))
-            piece.add_position(tuple(map(int, centroids[label])))
+            mean_color = mean_colors[label][:3]
+            if len(mean_color) == 1:    # Gray frames (PixelFormat.GRAY), same value in the three channels
+                mean_color = np.repeat(mean_color, 3)
+            piece.add_mean_color(tuple(map(int, mean_color)), timestamp)
+            centroid_x, centroid_y = labels_stats.centroids[label]
+            piece.add_position((int(centroid_x) + offset_x, int(centroid_y) + offset_y), timestamp)
 
             pieces.append(piece)
+        INSTRUMENTATION.stop('detect.pieces', t)
+
+        if self._classify:
+            classify_pieces(pieces)
 
         # Draw images
         if 0: 
@@ -0,0 +1,21 @@
+"""
+DenoiseMethod is an enumeration of the noise reduction strategies of the detector.
+"""
+
+from enum import Enum
+
+
+class DenoiseMethod(Enum):
+    """
+    DenoiseMethod is an enumeration of the strategies used to reduce the noise
+    of a frame before segmenting it. All of them return a gray image.
+
+    GAUSSIAN: Gaussian blur of the BGR image, then gray conversion (reference).
+    GRAY_GAUSSIAN: Gray conversion first, then Gaussian blur of a single channel.
+    PYRAMID: Gray conversion, downscale, Gaussian blur of the small image and upscale.
+    BOX: Gray conversion and three stacked box filters approximating the Gaussian.
+    """
+    GAUSSIAN = "gaussian"
+    GRAY_GAUSSIAN = "gray_gaussian"
+    PYRAMID = "pyramid"
+    BOX = "box"
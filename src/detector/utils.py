@@ -7,6 +7,8 @@ import numpy as np
 import cv2
 
 from src import utils as ut
+from src.detector.denoise_method import DenoiseMethod
+from src.buffer_pool import ScratchBuffers, get_buffer
 
 
 # Reduce noise
@@ -26,53 +28,237 @@ def reduce_noise(image: np.ndarray, ksize: tuple = (31, 31)) -> np.ndarray:
     return denoised_image
 
 
+def get_gaussian_sigma(ksize: int) -> float:
+    """
+    Get the sigma used by cv2.GaussianBlur when it is called with sigma 0.
+
+    Args:
+        ksize (int): Kernel size.
+
+    Returns:
+        float: The standard deviation of the kernel.
+    """
+    return 0.3 * ((ksize - 1) * 0.5 - 1) + 0.8
+
+
+def get_box_sizes(sigma: float, n: int = 3) -> list[int]:
+    """
+    Get the odd widths of n stacked box filters whose result approximates a Gaussian blur.
+
+    Args:
+        sigma (float): Standard deviation of the Gaussian.
+        n (int): Number of box filters.
+
+    Returns:
+        list[int]: The widths of the box filters.
+    """
+    ideal_width = np.sqrt(12 * sigma ** 2 / n + 1)
+    lower_width = int(ideal_width)
+    if lower_width % 2 == 0:
+        lower_width -= 1
+    upper_width = lower_width + 2
+    # Number of filters of the lower width that gives the closest variance
+    m = round((12 * sigma ** 2 - n * lower_width ** 2 - 4 * n * lower_width - 3 * n) / (-4 * lower_width - 4))
+    return [lower_width if i < m else upper_width for i in range(n)]
+
+
+def reduce_noise_gray(image: np.ndarray, ksize: tuple = (31, 31),
+                      method: DenoiseMethod = DenoiseMethod.GRAY_GAUSSIAN, scale: int = 4,
+                      buffers: ScratchBuffers | None = None) -> np.ndarray:
+    """
+    Reduce noise in the image and convert it to gray.
+
+    The blur and the gray conversion are both linear, so blurring the gray image gives the
+    same result as the reference GAUSSIAN method (up to rounding) with a third of the work.
+    PYRAMID and BOX approximate the Gaussian at a fraction of the cost.
+
+    Args:
+        image (np.ndarray): The input BGR or gray image.
+        ksize (tuple): Size of the reference Gaussian kernel.
+        method (DenoiseMethod): Noise reduction strategy.
+        scale (int): Downscale factor of the PYRAMID method.
+        buffers (ScratchBuffers | None): Buffers reused for the intermediate and the output images.
+            None allocates new ones.
+
+    Returns:
+        np.ndarray: The denoised gray image. With buffers, valid until the next call.
+    """
+    height, width = image.shape[:2]
+    if method == DenoiseMethod.GAUSSIAN:
+        image = cv2.GaussianBlur(image, ksize, 0, dst=get_buffer(buffers, 'denoise.blur', image.shape))
+        if image.ndim == 2:
+            return image
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=get_buffer(buffers, 'denoise.gray', (height, width)))
+
+    if image.ndim == 3:
+        gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=get_buffer(buffers, 'denoise.gray', (height, width)))
+    else:
+        gray_image = image
+    sigma = get_gaussian_sigma(ksize[0])
+    denoised_image = get_buffer(buffers, 'denoise.output', (height, width))
+
+    if method == DenoiseMethod.GRAY_GAUSSIAN:
+        return cv2.GaussianBlur(gray_image, ksize, 0, dst=denoised_image)
+
+    if method == DenoiseMethod.PYRAMID:
+        small_size = (max(1, width // scale), max(1, height // scale))
+        small_image = cv2.resize(gray_image, small_size, interpolation=cv2.INTER_AREA,
+                                 dst=get_buffer(buffers, 'denoise.small', small_size[::-1]))
+        small_image = cv2.GaussianBlur(small_image, (0, 0), sigma / scale,
+                                       dst=get_buffer(buffers, 'denoise.small_blur', small_size[::-1]))
+        return cv2.resize(small_image, (width, height), interpolation=cv2.INTER_LINEAR, dst=denoised_image)
+
+    if method == DenoiseMethod.BOX:
+        # Ping-pong between the output and the gray buffer, the last pass writes the output
+        box_sizes = get_box_sizes(sigma)
+        targets = [denoised_image, get_buffer(buffers, 'denoise.box', (height, width))]
+        denoised_image = gray_image
+        for i, box_width in enumerate(box_sizes):
+            target = targets[(len(box_sizes) - 1 - i) % 2]
+            denoised_image = cv2.blur(denoised_image, (box_width, box_width), dst=target)
+        return denoised_image
+
+    raise ValueError(f"Unknown denoise method: {method}")
+
+
+def get_scaled_ksize(ksize: tuple, scale: int) -> tuple[int, int]:
+    """
+    Get the kernel size that blurs a downscaled image as ksize blurs the full resolution one.
+
+    Args:
+        ksize (tuple): Kernel size at full resolution.
+        scale (int): Downscale factor.
+
+    Returns:
+        tuple[int, int]: The odd kernel size, at least 3.
+    """
+    return tuple(max(3, (size // scale) | 1) for size in ksize)
+
+
+def downscale_gray(image: np.ndarray, scale: int, buffers: ScratchBuffers | None = None) -> np.ndarray:
+    """
+    Convert the image to gray and downscale it, every pixel the mean of a scale x scale block.
+
+    The gray conversion is done first, a single channel is resized. The last rows and columns
+    that do not fill a block are dropped, so the small pixel (i, j) is exactly the block
+    (i * scale, j * scale) of the image.
+
+    Args:
+        image (np.ndarray): The BGR or gray image.
+        scale (int): Downscale factor.
+        buffers (ScratchBuffers | None): Buffers reused for the gray and the small images. None allocates.
+
+    Returns:
+        np.ndarray: The small gray image, (height // scale, width // scale).
+    """
+    height, width = image.shape[:2]
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=get_buffer(buffers, 'downscale.gray', (height, width)))
+    small_size = (width // scale, height // scale)
+    if small_size[0] == 0 or small_size[1] == 0:
+        raise ValueError(f"Image of {width}x{height} smaller than the scale {scale}")
+    # View with whole blocks, an integer ratio for INTER_AREA
+    image = image[:small_size[1] * scale, :small_size[0] * scale]
+    return cv2.resize(image, small_size, interpolation=cv2.INTER_AREA,
+                      dst=get_buffer(buffers, 'downscale.small', small_size[::-1]))
+
+
+def get_area_lut(stats: np.ndarray, min_area: int) -> np.ndarray:
+    """
+    Lookup table label -> pixel value. The components of at least min_area pixels are white, the rest black.
+
+    Args:
+        stats (np.ndarray): The stats matrix of cv2.connectedComponentsWithStats.
+        min_area (int): The minimum area.
+
+    Returns:
+        np.ndarray: (N,) uint8 table, 0 for the background.
+    """
+    lut = np.where(stats[:, cv2.CC_STAT_AREA] >= min_area, 255, 0).astype(np.uint8)
+    lut[0] = 0  # Background
+    return lut
+
+
+def apply_labels_lut(labels: np.ndarray, lut: np.ndarray, buffers: ScratchBuffers | None = None) -> np.ndarray:
+    """
+    Map every label of a labeled image to a pixel value in a single pass.
+
+    Args:
+        labels (np.ndarray): The labeled image, int32.
+        lut (np.ndarray): (N,) uint8 value of each label.
+        buffers (ScratchBuffers | None): Buffers reused for the output. None allocates.
+
+    Returns:
+        np.ndarray: The uint8 image.
+    """
+    num_labels = len(lut)
+    filtered_image = get_buffer(buffers, 'segment.filtered', labels.shape)
+    if num_labels <= 256:
+        # The labels fit in 8 bits: cv2.LUT, without the intermediate index arrays of NumPy indexing
+        labels_8u = get_buffer(buffers, 'segment.labels_8u', labels.shape)
+        if labels_8u is None:
+            labels_8u = labels.astype(np.uint8)
+        else:
+            np.copyto(labels_8u, labels, casting='unsafe')
+        lut_256 = np.zeros(256, dtype=np.uint8)
+        lut_256[:num_labels] = lut
+        return cv2.LUT(labels_8u, lut_256, dst=filtered_image)
+    if filtered_image is None:
+        return lut[labels]
+    filtered_image[...] = lut[labels]
+    return filtered_image
+
+
 # Delete small labels
-def delete_small_labels(thresh_image: np.ndarray, min_area: int = 135, verbose: bool = True) -> np.ndarray:
+def delete_small_labels(thresh_image: np.ndarray, min_area: int = 135, verbose: bool = True,
+                        buffers: ScratchBuffers | None = None) -> np.ndarray:
     """
     Delete small labels
 
         Args:
             thresh_image (np.ndarray): The input image.
             min_area (int): The minimum area.
+            buffers (ScratchBuffers | None): Buffers reused for the labels and the output. None allocates.
 
         Returns:
             np.ndarray: The filtered image."""
-    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(thresh_image)
+    num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+        thresh_image, labels=get_buffer(buffers, 'segment.labels', thresh_image.shape, np.int32))
     # Shoe the number of detected objects
     if verbose:
         print(f'Number of detected ogjects: {num_labels - 1}')  # Rest the background
-    # Create a new image for large components
-    filtered_image = np.zeros_like(thresh_image)
-
-    # Filter small components
-    for label in range(1, num_labels):  # Skip the background (label 0)
-        area = stats[label, cv2.CC_STAT_AREA]
-        if area >= min_area:
-            if verbose:
-                print(f'Object {label} Area:', area)
-            # If the area is greater than the threshold, keep the component
-            filtered_image[labels == label] = 255  # Assign the white value to the large components
-    return filtered_image
+        for label in range(1, num_labels):  # Skip the background (label 0)
+            if stats[label, cv2.CC_STAT_AREA] >= min_area:
+                print(f'Object {label} Area:', stats[label, cv2.CC_STAT_AREA])
 
+    # Filter small components in a single pass over the label image
+    return apply_labels_lut(labels, get_area_lut(stats, min_area), buffers=buffers)
 
-# Segment image to binary
-def segment(gray_image: np.ndarray, thresh: int = 150, min_area: int = 135,
-            flat_field: np.ndarray = None, verbose: bool = False) -> np.ndarray:
-    """
-    segment Image
 
-    Mode 1
+def threshold_gray(gray_image: np.ndarray, thresh: int = 150, flat_field: np.ndarray = None,
+                   buffers: ScratchBuffers | None = None) -> np.ndarray:
     """
+    Binary threshold of the gray image, or of its difference with the flat field.
 
+    Args:
+        gray_image (np.ndarray): The gray image.
+        thresh (int): The threshold.
+        flat_field (np.ndarray): Gray image of the empty belt. None thresholds the gray image.
+        buffers (ScratchBuffers | None): Buffers reused for the output. None allocates.
+
+    Returns:
+        np.ndarray: The binary image.
+    """
+    threshold = get_buffer(buffers, 'segment.threshold', gray_image.shape)
     if flat_field is not None:
-        difference = cv2.absdiff(gray_image, flat_field)
+        difference = cv2.absdiff(gray_image, flat_field, dst=threshold)
         # Threshold
         # thresh = 20
-        _, threshold = cv2.threshold(difference, thresh, 255, cv2.THRESH_BINARY)
+        _, threshold = cv2.threshold(difference, thresh, 255, cv2.THRESH_BINARY, dst=threshold)
     else:
         # binary threshold Manual setting the threshold
         # thresh = 90 # 150 # 85
-        _, threshold = cv2.threshold(gray_image, thresh, 255, cv2.THRESH_BINARY)
+        _, threshold = cv2.threshold(gray_image, thresh, 255, cv2.THRESH_BINARY, dst=threshold)
 
         # # Apply binary threshold Automatic
         # thresh = 0
@@ -83,12 +269,104 @@ def segment(gray_image: np.ndarray, thresh: int = 150, min_area: int = 135,
 
     # reverse
     # inverted_thresh = cv2.bitwise_not(thresh)
+    return threshold
+
+
+# Segment image to binary
+def segment(gray_image: np.ndarray, thresh: int = 150, min_area: int = 135,
+            flat_field: np.ndarray = None, verbose: bool = False,
+            buffers: ScratchBuffers | None = None) -> np.ndarray:
+    """
+    segment Image
+
+    Mode 1
+
+    With buffers, the intermediate and the output images are reused, the output is valid until the next call.
+    """
+    threshold = threshold_gray(gray_image, thresh, flat_field, buffers=buffers)
 
     # Delete small labels
-    threshold = delete_small_labels(threshold, min_area, verbose)
+    threshold = delete_small_labels(threshold, min_area, verbose, buffers=buffers)
 
     return threshold
 
+
+class Segmentation:
+    """
+    Result of segment_labels(): the components of the frame, labeled once.
+
+    The labels image and the stats hold every component, the small ones too. keep lists the
+    labels of at least min_area pixels, so the statistics of the pieces are selected from
+    them without labeling the filtered image again.
+
+    Attributes:
+        threshold_image (np.ndarray): Binary image without the small components.
+        labels (np.ndarray): The labeled image, every component.
+        stats (np.ndarray): The stats matrix of cv2.connectedComponentsWithStats.
+        centroids (np.ndarray): The centroids matrix of cv2.connectedComponentsWithStats.
+        keep (np.ndarray): The labels kept, background (0) first, in label order.
+        foreground (np.ndarray | None): Binary image before the filter, every component.
+    """
+
+    def __init__(self, threshold_image: np.ndarray, labels: np.ndarray, stats: np.ndarray,
+                 centroids: np.ndarray, keep: np.ndarray, foreground: np.ndarray | None = None):
+        """
+        Initialize the segmentation.
+
+        Args:
+            threshold_image (np.ndarray): Binary image without the small components.
+            labels (np.ndarray): The labeled image, every component.
+            stats (np.ndarray): The stats matrix of cv2.connectedComponentsWithStats.
+            centroids (np.ndarray): The centroids matrix of cv2.connectedComponentsWithStats.
+            keep (np.ndarray): The labels kept, background (0) first, in label order.
+            foreground (np.ndarray | None): Binary image before the filter, every component.
+        """
+        self.threshold_image = threshold_image
+        self.labels = labels
+        self.stats = stats
+        self.centroids = centroids
+        self.keep = keep
+        self.foreground = foreground
+
+    def __len__(self) -> int:
+        """
+        Return the number of kept labels, background included.
+        """
+        return len(self.keep)
+
+
+def segment_labels(gray_image: np.ndarray, thresh: int = 150, min_area: int = 135,
+                   flat_field: np.ndarray = None, verbose: bool = False,
+                   buffers: ScratchBuffers | None = None) -> Segmentation:
+    """
+    Fused segmentation: threshold, label once and filter the small components by area.
+
+    Same components as segment() followed by cv2.connectedComponentsWithStats on its output,
+    removing a component does not change the others, but the frame is labeled only once: the
+    filtered binary image comes from a lookup table on the labels and the statistics of the
+    kept components are selected from the stats.
+
+    Args:
+        gray_image (np.ndarray): The gray image.
+        thresh (int): The threshold.
+        min_area (int): The minimum area of a component.
+        flat_field (np.ndarray): Gray image of the empty belt. None thresholds the gray image.
+        verbose (bool): Print the components.
+        buffers (ScratchBuffers | None): Buffers reused for the images, valid until the next call. None allocates.
+
+    Returns:
+        Segmentation: The filtered binary image, the labels, the stats and the kept labels.
+    """
+    threshold = threshold_gray(gray_image, thresh, flat_field, buffers=buffers)
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(
+        threshold, labels=get_buffer(buffers, 'segment.labels', threshold.shape, np.int32))
+    lut = get_area_lut(stats, min_area)
+    keep = np.flatnonzero(lut)
+    if verbose:
+        print(f'Number of detected ogjects: {num_labels - 1}, {len(keep)} of at least {min_area} px')
+    threshold_image = apply_labels_lut(labels, lut, buffers=buffers)
+    return Segmentation(threshold_image, labels, stats, centroids, np.concatenate(([0], keep)), foreground=threshold)
+
 # def segment_image_m1(gray_image: np.ndarray) -> np.ndarray:
 #     """
 #     segment Image
@@ -183,6 +461,257 @@ def get_mean_color_from_label(label: int, labels: np.ndarray, image: np.ndarray)
     return mean_color
 
 
+class LabelStats:
+    """
+    Statistics of every label of a labeled image.
+
+    Row i holds the statistics of label i (row 0 is the background).
+
+    Attributes:
+        areas (np.ndarray): (N,) area of each label in pixels.
+        centroids (np.ndarray): (N, 2) centroid (x, y) of each label.
+        bboxes (np.ndarray): (N, 4) bounding box (x, y, w, h) of each label.
+        color_sums (np.ndarray): (N, C) sum of the pixel values of each label, per channel.
+    """
+
+    def __init__(self, areas: np.ndarray, centroids: np.ndarray, bboxes: np.ndarray, color_sums: np.ndarray):
+        """
+        Initialize the label statistics.
+
+        Args:
+            areas (np.ndarray): (N,) area of each label in pixels.
+            centroids (np.ndarray): (N, 2) centroid (x, y) of each label.
+            bboxes (np.ndarray): (N, 4) bounding box (x, y, w, h) of each label.
+            color_sums (np.ndarray): (N, C) sum of the pixel values of each label, per channel.
+        """
+        self.areas = areas
+        self.centroids = centroids
+        self.bboxes = bboxes
+        self.color_sums = color_sums
+
+    def __len__(self) -> int:
+        """
+        Return the number of labels, background included.
+        """
+        return len(self.areas)
+
+    @property
+    def mean_colors(self) -> np.ndarray:
+        """
+        Get the mean color of each label.
+
+        Returns:
+            np.ndarray: (N, C) mean color of each label. Zero for empty labels.
+        """
+        areas = np.maximum(self.areas, 1).astype(np.float64)
+        return self.color_sums / areas[:, np.newaxis]
+
+    def __repr__(self) -> str:
+        """
+        Return a string representation of the LabelStats instance.
+        """
+        return (f"LabelStats(areas={self.areas}, centroids={self.centroids}, bboxes={self.bboxes}, "
+                f"color_sums={self.color_sums})")
+
+
+def get_labels_color_sums(labels: np.ndarray, num_labels: int, image: np.ndarray) -> np.ndarray:
+    """
+    Sum the pixel values of every label of the image in a single pass.
+
+    Only the foreground pixels are visited, the background row (label 0) is left at zero.
+
+    Args:
+        labels (np.ndarray): The labeled image.
+        num_labels (int): The number of labels, background included.
+        image (np.ndarray): The original image, with the same height and width as labels.
+
+    Returns:
+        np.ndarray: (num_labels, C) sum of the pixel values of each label, per channel.
+    """
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    flat_labels = labels.ravel()
+    foreground = np.flatnonzero(flat_labels)
+    foreground_labels = flat_labels[foreground]
+    foreground_pixels = image.reshape(-1, channels)[foreground]
+
+    color_sums = np.empty((num_labels, channels), dtype=np.float64)
+    for channel in range(channels):
+        color_sums[:, channel] = np.bincount(foreground_labels, weights=foreground_pixels[:, channel],
+                                             minlength=num_labels)
+    return color_sums
+
+
+def get_labels_stats(labels: np.ndarray, stats: np.ndarray, centroids: np.ndarray,
+                     image: np.ndarray, keep: np.ndarray | None = None) -> LabelStats:
+    """
+    Get area, centroid, bounding box and color sums of every label.
+
+    Area, bounding box and centroid come from cv2.connectedComponentsWithStats, the color
+    sums are computed for all labels at once instead of one mask per label.
+
+    Args:
+        labels (np.ndarray): The labeled image.
+        stats (np.ndarray): The stats matrix of cv2.connectedComponentsWithStats.
+        centroids (np.ndarray): The centroids matrix of cv2.connectedComponentsWithStats.
+        image (np.ndarray): The original image.
+        keep (np.ndarray | None): Labels to keep, background first, e.g. Segmentation.keep. None keeps all.
+            The background row keeps the values of label 0, without the removed components.
+
+    Returns:
+        LabelStats: The statistics of every label, row i is the label keep[i].
+    """
+    num_labels = len(stats)
+    color_sums = get_labels_color_sums(labels, num_labels, image)
+    if keep is None:
+        return LabelStats(areas=stats[:, cv2.CC_STAT_AREA].copy(),
+                          centroids=centroids,
+                          bboxes=stats[:, :cv2.CC_STAT_AREA].copy(),
+                          color_sums=color_sums)
+    return LabelStats(areas=stats[keep, cv2.CC_STAT_AREA],
+                      centroids=centroids[keep],
+                      bboxes=stats[keep, :cv2.CC_STAT_AREA],
+                      color_sums=color_sums[keep])
+
+
+def get_scaled_labels_stats(labels: np.ndarray, stats: np.ndarray, centroids: np.ndarray, image: np.ndarray,
+                            scale: int, keep: np.ndarray | None = None) -> LabelStats:
+    """
+    Get the statistics of the labels of a downscaled image in the full resolution image.
+
+    The labels come from downscale_gray(image, scale): the small pixel (i, j) is the block
+    (i * scale, j * scale) of the image. Bounding boxes, areas and centroids are scaled from
+    the stats. The colors are sampled at full resolution: the labels in the bounding box of
+    each component are upscaled to a mask of its blocks, so only the pieces are visited.
+
+    Args:
+        labels (np.ndarray): The labeled small image.
+        stats (np.ndarray): The stats matrix of cv2.connectedComponentsWithStats on the small image.
+        centroids (np.ndarray): The centroids matrix of cv2.connectedComponentsWithStats on the small image.
+        image (np.ndarray): The full resolution image.
+        scale (int): Downscale factor.
+        keep (np.ndarray | None): Labels to keep, background first, e.g. Segmentation.keep. None keeps all.
+
+    Returns:
+        LabelStats: The statistics of every label in full resolution pixels, row i is the label keep[i].
+            The color sums of the background row are zero.
+    """
+    if keep is None:
+        keep = np.arange(len(stats))
+    small_bboxes = stats[keep, :cv2.CC_STAT_AREA]
+    channels = 1 if image.ndim == 2 else image.shape[2]
+    color_sums = np.zeros((len(keep), channels), dtype=np.float64)
+    for row in range(1, len(keep)):
+        x, y, w, h = small_bboxes[row].tolist()
+        # Blocks of the component, without the other components of the bounding box
+        small_mask = labels[y:y + h, x:x + w] == keep[row]
+        mask = small_mask.repeat(scale, axis=0).repeat(scale, axis=1)
+        pixels = image[y * scale:(y + h) * scale, x * scale:(x + w) * scale][mask]
+        color_sums[row] = pixels.reshape(-1, channels).sum(axis=0)
+    # Centroid of the block of a small pixel: its center at full resolution
+    return LabelStats(areas=stats[keep, cv2.CC_STAT_AREA] * scale * scale,
+                      centroids=centroids[keep] * scale + (scale - 1) / 2,
+                      bboxes=small_bboxes * scale,
+                      color_sums=color_sums)
+
+
+def get_label_groups(bboxes: np.ndarray, grow_rectangle: int = 3) -> np.ndarray:
+    """
+    Group the labels whose grown bounding boxes touch or overlap, transitively.
+
+    A bounding box (x, y, w, h) is grown to (x - grow, y - grow, x + w + 2 * grow, y + h + 2 * grow).
+    The touching pairs are found with a sort and sweep along x (only the boxes still open at
+    the x of a box are compared) and joined with a union-find, O(n log n) for separated pieces
+    instead of comparing every pair.
+
+    Args:
+        bboxes (np.ndarray): (N, 4) bounding box (x, y, w, h) of each label. Row 0 is the background,
+            alone in group 0.
+        grow_rectangle (int): Tolerance in pixels.
+
+    Returns:
+        np.ndarray: (N,) group of each label. The groups are numbered by their first label, so a group
+            keeps the position of the label that connectedComponents would give to the joined pixels.
+    """
+    num_labels = len(bboxes)
+    if num_labels <= 2:
+        return np.arange(num_labels)
+    x, y, w, h = (bboxes[1:, i].astype(np.int64) for i in range(4))
+    x_min = (x - grow_rectangle).tolist()
+    y_min = (y - grow_rectangle).tolist()
+    x_max = (x + w + grow_rectangle * 2).tolist()
+    y_max = (y + h + grow_rectangle * 2).tolist()
+
+    parent = list(range(num_labels - 1))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]   # Path halving
+            i = parent[i]
+        return i
+
+    active: list[int] = []
+    for i in sorted(range(num_labels - 1), key=x_min.__getitem__):
+        # Boxes that end before this one starts can not touch the next ones either
+        active = [j for j in active if x_max[j] >= x_min[i]]
+        for j in active:
+            if y_max[j] >= y_min[i] and y_max[i] >= y_min[j]:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    # The smallest label is the root
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+        active.append(i)
+
+    roots = np.array([find(i) for i in range(num_labels - 1)])
+    groups = np.zeros(num_labels, dtype=np.intp)
+    groups[1:] = np.unique(roots, return_inverse=True)[1] + 1
+    return groups
+
+
+def merge_labels_stats(labels_stats: LabelStats, groups: np.ndarray) -> LabelStats:
+    """
+    Merge the statistics of the labels of each group, without labeling the image again.
+
+    The areas and the color sums are added, the bounding box is the union of the boxes and
+    the centroid is the mean of the centroids weighted by the areas, the same values as the
+    statistics of the joined pixels.
+
+    Args:
+        labels_stats (LabelStats): The statistics of every label.
+        groups (np.ndarray): (N,) group of each label, see get_label_groups(). Group 0 is the background.
+
+    Returns:
+        LabelStats: The statistics of every group.
+    """
+    num_groups = int(groups.max()) + 1 if len(groups) else 0
+    if num_groups == len(labels_stats):
+        return labels_stats
+    areas = labels_stats.areas.astype(np.float64)
+    merged_areas = np.bincount(groups, weights=areas, minlength=num_groups)
+
+    weights = np.maximum(merged_areas, 1)
+    centroids = np.empty((num_groups, 2), dtype=np.float64)
+    for axis in range(2):
+        centroids[:, axis] = np.bincount(groups, weights=labels_stats.centroids[:, axis] * areas,
+                                         minlength=num_groups) / weights
+
+    x, y, w, h = (labels_stats.bboxes[:, i] for i in range(4))
+    x_min = np.full(num_groups, np.iinfo(np.int64).max)
+    y_min = np.full(num_groups, np.iinfo(np.int64).max)
+    x_max = np.zeros(num_groups, dtype=np.int64)
+    y_max = np.zeros(num_groups, dtype=np.int64)
+    np.minimum.at(x_min, groups, x)
+    np.minimum.at(y_min, groups, y)
+    np.maximum.at(x_max, groups, x + w)
+    np.maximum.at(y_max, groups, y + h)
+    bboxes = np.stack([x_min, y_min, x_max - x_min, y_max - y_min], axis=1).astype(labels_stats.bboxes.dtype)
+
+    color_sums = np.zeros((num_groups, labels_stats.color_sums.shape[1]), dtype=np.float64)
+    np.add.at(color_sums, groups, labels_stats.color_sums)
+
+    return LabelStats(areas=merged_areas.astype(labels_stats.areas.dtype), centroids=centroids,
+                      bboxes=bboxes, color_sums=color_sums)
+
+
 def get_gravity_center(image: np.ndarray) -> tuple:
     """
     Calculate the gravity center (centroid) of the object in the image.
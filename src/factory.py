@@ -11,13 +11,17 @@ from enum import Enum
 from src.sensor.sensor_type import SensorType
 from src.sensor.base_sensor import BaseSensor
 from src.sensor.computer_camera import ComputerCamera
+from src.sensor.file_camera import VideoFileCamera, ImageSequenceCamera
 
 from src.detector.detector_type import DetectorType
 from src.detector.base_detector import BaseDetector
 from src.detector.color_detector import ColorDetector
 
 if platform.system() == "Linux":
-    from src.sensor.rpi_camera import RPiCamera
+    try:
+        from src.sensor.rpi_camera import RPiCamera
+    except ImportError:     # picamera2 not installed, e.g. a desktop Linux box
+        RPiCamera = None
 
 
 class Factory(ABC):
@@ -49,20 +53,26 @@ class SensorFactory(Factory):
         create(object_type: SensorType) -> BaseSensor: Create a new sensor object.
     """
     @staticmethod
-    def create(object_type: SensorType) -> BaseSensor:
+    def create(object_type: SensorType, **kwargs) -> BaseSensor:
         """
         Create a new sensor object.
 
         Args:
             object_type (SensorType): The type of sensor to create
+            **kwargs: Arguments of the sensor constructor. VIDEO_FILE and IMAGE_SEQUENCE
+                need the `source` path.
 
         Returns:
             Any: The created sensor object.
         """
         if object_type == SensorType.COMPUTER_CAMERA:
-            return ComputerCamera()
-        elif object_type == SensorType.RPI_CAMERA and platform.system() == "Linux":
-            return RPiCamera()  # pylint: disable=E0606
+            return ComputerCamera(**kwargs)
+        elif object_type == SensorType.RPI_CAMERA and platform.system() == "Linux" and RPiCamera is not None:
+            return RPiCamera(**kwargs)  # pylint: disable=E0606
+        elif object_type == SensorType.VIDEO_FILE:
+            return VideoFileCamera(**kwargs)
+        elif object_type == SensorType.IMAGE_SEQUENCE:
+            return ImageSequenceCamera(**kwargs)
         else:
             raise ValueError(f"Invalid sensor type: {object_type.name}")
 
@@ -0,0 +1,402 @@
+"""
+instrumentation.py
+
+Lightweight latency instrumentation of the processing stages.
+
+Every stage reports the time it takes into a log-linear (HDR style) histogram, so
+recording is O(1), the memory is fixed and the percentiles keep a bounded relative
+error whatever the number of samples. The periodic summary shows the p50/p99 of
+every stage, the event counters (e.g. dropped frames) and the gauges (e.g. queue
+depths), which are only evaluated when the summary is built.
+
+The instrumentation can be enabled and disabled at runtime. When it is disabled,
+start() returns 0 and stop() returns immediately, no clock is read.
+
+Usage:
+    t = INSTRUMENTATION.start()
+    ...
+    INSTRUMENTATION.stop('detect.segment', t)
+"""
+
+import threading
+import time
+from typing import Callable
+
+
+class InstrumentationException(Exception):
+    """
+    Instrumentation Exception
+    """
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of latencies in nanoseconds.
+
+    Values below 2**sub_bucket_bits are counted exactly. Above, every power of two is
+    divided in 2**(sub_bucket_bits - 1) linear buckets, so the relative error of a
+    bucket is below 2**-(sub_bucket_bits - 1) (3 % with the default 6 bits).
+
+    Attributes:
+        _sub_bucket_bits (int): Number of significant bits kept of every value.
+        _counts (list[int]): Number of values of every bucket.
+        _count (int): Number of values.
+        _total (int): Sum of the values.
+        _min (int): Minimum value.
+        _max (int): Maximum value.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 6, max_value_bits: int = 40):
+        """
+        Initialize an empty histogram.
+
+        Args:
+            sub_bucket_bits (int): Number of significant bits kept of every value.
+            max_value_bits (int): Number of bits of the highest value (2**40 ns, 18 minutes). Higher values
+                are counted in the last bucket.
+        """
+        if not 1 < sub_bucket_bits < max_value_bits:
+            raise InstrumentationException("sub_bucket_bits must be between 2 and max_value_bits - 1")
+        self._sub_bucket_bits = sub_bucket_bits
+        self._half_sub_buckets = 1 << (sub_bucket_bits - 1)
+        self._max_index = self._get_index((1 << max_value_bits) - 1)
+        self._counts = [0] * (self._max_index + 1)
+        self._count = 0
+        self._total = 0
+        self._min = 0
+        self._max = 0
+
+    @property
+    def count(self) -> int:
+        """
+        Get the number of values.
+        """
+        return self._count
+
+    @property
+    def total(self) -> int:
+        """
+        Get the sum of the values.
+        """
+        return self._total
+
+    @property
+    def min(self) -> int:
+        """
+        Get the minimum value, 0 if the histogram is empty.
+        """
+        return self._min
+
+    @property
+    def max(self) -> int:
+        """
+        Get the maximum value, 0 if the histogram is empty.
+        """
+        return self._max
+
+    def _get_index(self, value: int) -> int:
+        """
+        Get the bucket of a value.
+        """
+        shift = value.bit_length() - self._sub_bucket_bits
+        if shift <= 0:
+            return value
+        # (value >> shift) is in [2**(bits - 1), 2**bits), one group of half_sub_buckets per shift
+        return shift * self._half_sub_buckets + (value >> shift)
+
+    def _get_value(self, index: int) -> int:
+        """
+        Get the highest value of a bucket.
+        """
+        if index < 2 * self._half_sub_buckets:
+            return index
+        shift, sub_bucket = divmod(index - self._half_sub_buckets, self._half_sub_buckets)
+        return ((sub_bucket + self._half_sub_buckets + 1) << shift) - 1
+
+    def record(self, value: int) -> None:
+        """
+        Record a value.
+
+        Args:
+            value (int): The value in nanoseconds. Negative values are counted as 0.
+        """
+        # Same as _get_index, inlined: it runs for every measurement
+        if value < 0:
+            value = 0
+        shift = value.bit_length() - self._sub_bucket_bits
+        index = value if shift <= 0 else shift * self._half_sub_buckets + (value >> shift)
+        self._counts[index if index < self._max_index else self._max_index] += 1
+        if value > self._max:
+            self._max = value
+        if value < self._min or self._count == 0:
+            self._min = value
+        self._count += 1
+        self._total += value
+
+    def percentile(self, percentile: float) -> int:
+        """
+        Get a percentile of the values.
+
+        Args:
+            percentile (float): The percentile, from 0 to 100.
+
+        Returns:
+            int: The highest value of the bucket of the percentile, limited to the maximum value. 0 if empty.
+        """
+        if self._count == 0:
+            return 0
+        rank = max(1, round(percentile / 100 * self._count))
+        cumulative = 0
+        for index, count in enumerate(self._counts):
+            cumulative += count
+            if cumulative >= rank:
+                return min(self._get_value(index), self._max)
+        return self._max
+
+    def merge(self, other: 'LatencyHistogram') -> None:
+        """
+        Add the values of another histogram with the same resolution.
+
+        Args:
+            other (LatencyHistogram): The other histogram.
+        """
+        if other._sub_bucket_bits != self._sub_bucket_bits or len(other._counts) != len(self._counts):
+            raise InstrumentationException("Histograms with different resolution")
+        if other._count == 0:
+            return
+        self._counts = [a + b for a, b in zip(self._counts, other._counts)]
+        self._min = other._min if self._count == 0 else min(self._min, other._min)
+        self._max = max(self._max, other._max)
+        self._count += other._count
+        self._total += other._total
+
+    def reset(self) -> None:
+        """
+        Remove all the values.
+        """
+        self._counts = [0] * len(self._counts)
+        self._count = 0
+        self._total = 0
+        self._min = 0
+        self._max = 0
+
+    def summary(self) -> dict[str, float]:
+        """
+        Get a summary of the histogram.
+
+        Returns:
+            dict: count, mean, p50, p99 and max in milliseconds.
+        """
+        if self._count == 0:
+            return {'count': 0}
+        return {'count': self._count,
+                'mean_ms': round(self._total / self._count / 1e6, 4),
+                'p50_ms': round(self.percentile(50) / 1e6, 4),
+                'p99_ms': round(self.percentile(99) / 1e6, 4),
+                'max_ms': round(self._max / 1e6, 4)}
+
+
+class Instrumentation:
+    """
+    Registry of the latency histograms, counters and gauges of the stages.
+
+    The stages are created the first time they report. A stage is written by a single
+    thread most of the time, the lock only protects the registry and the summaries.
+
+    Attributes:
+        _enabled (bool): Whether the stages are measured.
+        _histograms (dict[str, LatencyHistogram]): Latencies of every stage.
+        _counters (dict[str, int]): Event counters, e.g. dropped frames.
+        _gauges (dict[str, Callable]): Functions that return an instantaneous value, e.g. a queue depth.
+        _start_time (float): Monotonic time of the last reset.
+    """
+
+    def __init__(self, enabled: bool = False):
+        """
+        Initialize the instrumentation.
+
+        Args:
+            enabled (bool): Measure the stages from the start.
+        """
+        self._enabled = enabled
+        self._histograms: dict[str, LatencyHistogram] = {}
+        self._counters: dict[str, int] = {}
+        self._gauges: dict[str, Callable[[], int | float]] = {}
+        self._start_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        """
+        Get whether the stages are measured.
+        """
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled: bool) -> None:
+        """
+        Enable or disable the measurements. The values recorded are kept.
+        """
+        self._enabled = bool(enabled)
+
+    def toggle(self) -> bool:
+        """
+        Enable the measurements if they are disabled and the other way around.
+
+        Returns:
+            bool: Whether the measurements are enabled now.
+        """
+        self._enabled = not self._enabled
+        return self._enabled
+
+    def start(self) -> int:
+        """
+        Start measuring a stage.
+
+        Returns:
+            int: Monotonic time in nanoseconds to pass to stop(). 0 if the instrumentation is disabled.
+        """
+        return time.perf_counter_ns() if self._enabled else 0
+
+    def stop(self, stage: str, start_time: int) -> None:
+        """
+        Record the time of a stage since start().
+
+        Args:
+            stage (str): The name of the stage.
+            start_time (int): The value returned by start(). 0 records nothing.
+        """
+        if not start_time or not self._enabled:
+            return
+        elapsed = time.perf_counter_ns() - start_time
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram())
+        histogram.record(elapsed)
+
+    def record(self, stage: str, elapsed_ns: int) -> None:
+        """
+        Record a time measured by the caller.
+
+        Args:
+            stage (str): The name of the stage.
+            elapsed_ns (int): The time in nanoseconds.
+        """
+        if not self._enabled:
+            return
+        histogram = self._histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(stage, LatencyHistogram())
+        histogram.record(elapsed_ns)
+
+    def count(self, counter: str, value: int = 1) -> None:
+        """
+        Increment an event counter.
+
+        Args:
+            counter (str): The name of the counter.
+            value (int): The increment.
+        """
+        if not self._enabled:
+            return
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def add_gauge(self, gauge: str, function: Callable[[], int | float]) -> None:
+        """
+        Register an instantaneous value, evaluated only when the summary is built.
+
+        Args:
+            gauge (str): The name of the gauge.
+            function (Callable): Function that returns the value, e.g. the length of a queue.
+        """
+        with self._lock:
+            self._gauges[gauge] = function
+
+    def remove_gauge(self, gauge: str) -> None:
+        """
+        Unregister a gauge.
+
+        Args:
+            gauge (str): The name of the gauge.
+        """
+        with self._lock:
+            self._gauges.pop(gauge, None)
+
+    def get_histogram(self, stage: str) -> LatencyHistogram | None:
+        """
+        Get the histogram of a stage.
+
+        Args:
+            stage (str): The name of the stage.
+
+        Returns:
+            LatencyHistogram | None: The histogram, None if the stage has not reported.
+        """
+        return self._histograms.get(stage)
+
+    def reset(self) -> None:
+        """
+        Remove the recorded values. The gauges are kept.
+        """
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+            self._start_time = time.monotonic()
+
+    def summary(self) -> dict:
+        """
+        Get a summary of every stage, counter and gauge.
+
+        Returns:
+            dict: elapsed seconds since the last reset, the stages (count, fps, mean, p50, p99, max),
+                the counters and the gauges. JSON serializable.
+        """
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+        elapsed = time.monotonic() - self._start_time
+
+        stages = {}
+        for stage, histogram in sorted(histograms.items()):
+            stages[stage] = histogram.summary()
+            stages[stage]['fps'] = round(histogram.count / elapsed, 2) if elapsed > 0 else 0.0
+
+        gauge_values = {}
+        for gauge, function in sorted(gauges.items()):
+            try:
+                gauge_values[gauge] = function()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                gauge_values[gauge] = f'error: {e}'
+        return {'elapsed_s': round(elapsed, 3),
+                'stages': stages,
+                'counters': dict(sorted(counters.items())),
+                'gauges': gauge_values}
+
+    def report(self) -> str:
+        """
+        Get a user-friendly summary, one line per stage.
+
+        Returns:
+            str: The summary.
+        """
+        summary = self.summary()
+        lines = [f"----- Instrumentation ({summary['elapsed_s']:.1f} s, "
+                 f"{'enabled' if self._enabled else 'disabled'}) -----"]
+        for stage, s in summary['stages'].items():
+            if s['count'] == 0:
+                continue
+            lines.append(f"{stage:<20} {s['count']:>8} {s['fps']:>8.1f}/s  p50 {s['p50_ms']:8.3f} ms  "
+                         f"p99 {s['p99_ms']:8.3f} ms  max {s['max_ms']:8.3f} ms")
+        if summary['counters']:
+            lines.append('Counters: ' + ', '.join(f'{name} {value}' for name, value in summary['counters'].items()))
+        if summary['gauges']:
+            lines.append('Gauges: ' + ', '.join(f'{name} {value}' for name, value in summary['gauges'].items()))
+        return '\n'.join(lines)
+
+
+# Shared by every module of the process. The coordinator enables it from the config
+INSTRUMENTATION = Instrumentation()
@@ -0,0 +1,220 @@
+"""
+motion_gate.py
+
+Cheap change detection that decides which frames go through the full detection.
+"""
+
+import time
+
+import numpy as np
+import cv2
+
+import src.utils as ut
+
+
+class MotionGateException(Exception):
+    """
+    Motion Gate Exception
+    """
+
+
+class MotionGate:
+    """
+    Decide, frame by frame, whether the detector has to run.
+
+    The change detection is a difference of the region of interest subsampled every `step`
+    pixels against the previous frame, a few thousand pixels. The detection runs:
+        - On the first frame.
+        - Every frame while something moves in the entry band (x < entry_limit): the tracker only adds
+          new pieces there.
+        - Every `period` frames while pieces are tracked. The period shrinks as the pieces approach the
+          expulsion limit: it is half the frames a piece needs to reach the limit, at least 1 and at
+          most max_skip, so the release is detected at full rate.
+        - Every max_skip frames while something moves elsewhere.
+        - Every idle_period frames on an idle belt, in case a change is too slow for the difference.
+    In between, the tracker predicts the positions of the pieces (Tracker.predict).
+
+    Attributes:
+        _step (int): Subsampling step in pixels.
+        _thresh (int): Gray level difference of a changed pixel.
+        _min_pixels (int): Changed subsampled pixels that make a motion.
+        _max_skip (int): Maximum frames between detections while there is motion or tracked pieces.
+        _idle_period (int): Frames between detections on an idle belt.
+        _frames_since_detection (int): Frames since the last detection, this one excluded.
+        _frame_interval (float | None): Mean time between frames in seconds, from the timestamps.
+    """
+
+    def __init__(self, step: int = 8, thresh: int = 25, min_pixels: int = 3, max_skip: int = 4,
+                 idle_period: int = 30, entry_limit: float = 100, expulsion_limit: float = 540,
+                 roi: tuple[int, int, int, int] | None = None):
+        """
+        Initializes the motion gate.
+
+        Args:
+            step (int): Subsampling step in pixels of the frame difference.
+            thresh (int): Gray level difference of a changed pixel.
+            min_pixels (int): Changed subsampled pixels that make a motion.
+            max_skip (int): Maximum frames between detections while there is motion or tracked pieces.
+            idle_period (int): Frames between detections on an idle belt.
+            entry_limit (float): x in frame coordinates where the new pieces are added (X_ADDITION_LIMIT).
+            expulsion_limit (float): x in frame coordinates where the pieces are released (X_EXPULSION_LIMIT).
+            roi (tuple | None): Belt region of interest (x, y, w, h). None is the full frame.
+        """
+        if step < 1 or max_skip < 1 or idle_period < 1:
+            raise MotionGateException("step, max_skip and idle_period must be at least 1.")
+        self._step = step
+        self._thresh = thresh
+        self._min_pixels = min_pixels
+        self._max_skip = max_skip
+        self._idle_period = idle_period
+        self._entry_limit = entry_limit
+        self._expulsion_limit = expulsion_limit
+        self._roi = roi
+
+        self._previous: np.ndarray | None = None
+        self._current: np.ndarray | None = None
+        self._small: np.ndarray | None = None
+        self._frames_since_detection = 0
+        self._last_timestamp: float | None = None
+        self._frame_interval: float | None = None
+        self._detected = 0
+        self._skipped = 0
+
+    @property
+    def roi(self) -> tuple[int, int, int, int] | None:
+        """
+        Get the belt region of interest (x, y, w, h). None is the full frame.
+        """
+        return self._roi
+
+    @roi.setter
+    def roi(self, roi: tuple[int, int, int, int] | None) -> None:
+        """
+        Set the belt region of interest (x, y, w, h). The motion starts again from the next frame.
+        """
+        self._roi = roi
+        self.reset()
+
+    @property
+    def detected(self) -> int:
+        """
+        Get the number of frames sent to the detector
+        """
+        return self._detected
+
+    @property
+    def skipped(self) -> int:
+        """
+        Get the number of frames skipped
+        """
+        return self._skipped
+
+    def reset(self) -> None:
+        """
+        Forget the previous frame, the next one is detected.
+        """
+        self._previous = self._current = self._small = None
+        self._frames_since_detection = 0
+        self._last_timestamp = None
+        self._frame_interval = None
+
+    def _get_motion(self, frame: np.ndarray) -> np.ndarray | None:
+        """
+        Get the changed subsampled pixels against the previous frame.
+
+        Args:
+            frame (np.ndarray): The BGR or gray frame.
+
+        Returns:
+            np.ndarray | None: Number of changed pixels per subsampled column, None on the first frame.
+        """
+        view = ut.crop_roi(frame, self._roi)[::self._step, ::self._step]
+        if self._current is None or self._current.shape != view.shape[:2]:
+            self._small = np.empty(view.shape, dtype=np.uint8)
+            self._current = np.empty(view.shape[:2], dtype=np.uint8)
+            self._previous = None
+        # Contiguous copy of the subsampled pixels, then gray
+        np.copyto(self._small, view)
+        if self._small.ndim == 3:
+            cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._current)
+        else:
+            np.copyto(self._current, self._small)
+
+        if self._previous is None:
+            self._previous = self._current.copy()
+            return None
+        changed = cv2.absdiff(self._current, self._previous) > self._thresh
+        self._previous, self._current = self._current, self._previous
+        return np.count_nonzero(changed, axis=0)
+
+    def get_period(self, positions: np.ndarray, speeds: np.ndarray) -> int:
+        """
+        Get the frames between detections given the tracked pieces.
+
+        Args:
+            positions (np.ndarray): (N, 2) predicted positions of the tracked pieces, frame coordinates.
+            speeds (np.ndarray): (N, 2) speeds of the tracked pieces in pixels/s.
+
+        Returns:
+            int: Half the frames the nearest piece needs to reach the expulsion limit, from 1 to max_skip.
+                max_skip without pieces.
+        """
+        if len(positions) == 0:
+            return self._max_skip
+        distances = self._expulsion_limit - positions[:, 0]
+        # Pixels per frame, at least one: a piece without speed yet is assumed slow
+        steps = np.maximum(speeds[:, 0] * (self._frame_interval or 0.0), 1.0)
+        frames_to_limit = float(np.min(distances / steps))
+        return int(min(self._max_skip, max(1, frames_to_limit // 2)))
+
+    def update(self, frame: np.ndarray, positions: np.ndarray | None = None, speeds: np.ndarray | None = None,
+               timestamp: float | None = None) -> bool:
+        """
+        Check whether a frame has to be detected. Call it for every frame, detected or not.
+
+        Args:
+            frame (np.ndarray): The frame.
+            positions (np.ndarray | None): (N, 2) predicted positions of the tracked pieces at the time of the
+                frame (Tracker.predict). None if there are no pieces.
+            speeds (np.ndarray | None): (N, 2) speeds of the tracked pieces in pixels/s.
+            timestamp (float | None): Capture time of the frame, time.monotonic() clock. None is the current time.
+
+        Returns:
+            bool: True if the frame has to be detected.
+        """
+        if timestamp is None:
+            timestamp = time.monotonic()
+        if self._last_timestamp is not None and timestamp > self._last_timestamp:
+            interval = timestamp - self._last_timestamp
+            self._frame_interval = interval if self._frame_interval is None else \
+                0.9 * self._frame_interval + 0.1 * interval
+        self._last_timestamp = timestamp
+
+        changed_columns = self._get_motion(frame)
+        self._frames_since_detection += 1
+        if positions is None:
+            positions = speeds = np.empty((0, 2))
+
+        if changed_columns is None:
+            detect = True
+        else:
+            roi_x = self._roi[0] if self._roi is not None else 0
+            entry_columns = max(0, int(np.ceil((self._entry_limit - roi_x) / self._step)))
+            entry_motion = int(changed_columns[:entry_columns].sum()) >= self._min_pixels
+            motion = int(changed_columns.sum()) >= self._min_pixels
+            if entry_motion:
+                period = 1
+            elif len(positions) > 0:
+                period = self.get_period(positions, speeds)
+            elif motion:
+                period = self._max_skip
+            else:
+                period = self._idle_period
+            detect = self._frames_since_detection >= period
+
+        if detect:
+            self._frames_since_detection = 0
+            self._detected += 1
+        else:
+            self._skipped += 1
+        return detect
@@ -10,7 +10,10 @@ import numpy as np
 import cv2
 
 from src.classifier import MaterialEn, LabClassifier
-from src.utils import bgr_to_lab
+from src.piece.piece_history import PieceHistory
+from src.protocol import PieceRecord
+from src.instrumentation import INSTRUMENTATION
+from src.utils import bgr_to_lab, monotonic_to_epoch_ms
 
 
 class Piece:
@@ -21,15 +24,15 @@ class Piece:
         name (str): The name of the piece.
         category (MaterialEn): The category of the piece.
         bbox (tuple): (x, y, w, h)
-        mean_colors (list): A list of dictionaries with mean color and time.
-        positions (list): A list of dictionaries with position and time.
-        areas (list): A list of dictionaries with area and time.
+        mean_colors (list): A list of dictionaries with mean color and time. Stored in a PieceHistory.
+        positions (list): A list of dictionaries with position and time. Stored in a PieceHistory.
+        areas (list): A list of dictionaries with area and time. Stored in a PieceHistory.
         speed (tuple): The speed of the piece as a tuple of two numbers (vx, vy).
 
     Methods:
-        add_mean_color: Add a new mean color with the current time.
+        add_mean_color: Add a new mean color with its capture time.
         calculate_mean_color: Calculate the overall mean color using all mean colors.
-        add_position: Add a new position with the current time.
+        add_position: Add a new position with its capture time.
         calculate_speed: Calculate the speed of the piece using the positions and times.
         get_bbox_points: Get bounding box points.
         draw: Draw the piece information on the image.
@@ -39,7 +42,7 @@ class Piece:
     def __init__(self, id: int, name: str = 'unknown', category: MaterialEn = MaterialEn.UNKNOWN,
                  bbox: tuple | None = None,
                  mean_color: tuple | None = None, position: tuple | None = None, area: int | None = None,
-                 speed: float | None = None):
+                 speed: float | None = None, timestamp: float | None = None):
         """
         Initialize a BasePiece instance.
 
@@ -52,6 +55,8 @@ class Piece:
             position (tuple): (x, y).
             area (int): The area of the piece in pixels.
             speed (tuple): The speed of the piece as a tuple of two numbers (vx, vy).
+            timestamp (float | None): Capture time of the frame of the mean color, position and area,
+                time.monotonic() clock. None is the current time.
         """
 
         self._id = id
@@ -59,17 +64,21 @@ class Piece:
         self._category = category
         self._bbox = bbox
 
-        self._mean_colors = []
+        # Histories. Rows (t, b, g, r), (t, x, y) and (t, area). t is the capture time of the frame
+        if timestamp is None and (mean_color is not None or position is not None or area is not None):
+            timestamp = time.monotonic()
+        self._mean_colors = PieceHistory(3)
         if mean_color is not None:
-            self.add_mean_color(mean_color)
+            self.add_mean_color(mean_color, timestamp)
 
-        self._positions = []
+        self._positions = PieceHistory(2)
+        self._last_position: tuple[float, float] | None = None
         if position is not None:
-            self.add_position(position)
+            self.add_position(position, timestamp)
 
-        self._areas = []
+        self._areas = PieceHistory(1)
         if area is not None:
-            self.add_area(area)
+            self.add_area(area, timestamp)
 
         self._speed = speed
 
@@ -181,7 +190,8 @@ class Piece:
         Returns:
             list: A list of dictionaries with mean color and time.
         """
-        return self._mean_colors
+        return [{'mean_color': tuple(int(value) for value in row[1:]), 'time': float(row[0])}
+                for row in self._mean_colors.data]
 
     @mean_colors.setter
     def mean_colors(self, value: list[dict[str, tuple[int, int, int]]]) -> None:
@@ -197,7 +207,9 @@ class Piece:
         if not (isinstance(value, list) and
                 all(isinstance(i, dict) and 'mean_color' in i and 'time' in i for i in value)):
             raise ValueError("Mean colors must be a list of dictionaries with mean color and time")
-        self._mean_colors = value
+        self._mean_colors.clear()
+        for entry in value:
+            self._mean_colors.append(entry['time'], entry['mean_color'])
 
     @property
     def positions(self) -> list[dict[str, tuple[float, float]]]:
@@ -207,7 +219,7 @@ class Piece:
         Returns:
             list: A list of dictionaries with position and time.
         """
-        return self._positions
+        return [{'position': (float(row[1]), float(row[2])), 'time': float(row[0])} for row in self._positions.data]
 
     @positions.setter
     def positions(self, value: list[dict[str, tuple[float, float]]]) -> None:
@@ -223,7 +235,10 @@ class Piece:
         if not (isinstance(value, list) and
                 all(isinstance(i, dict) and 'position' in i and 'time' in i for i in value)):
             raise ValueError("Positions must be a list of dictionaries with position and time")
-        self._positions = value
+        self._positions.clear()
+        for entry in value:
+            self._positions.append(entry['time'], entry['position'])
+        self._last_position = value[-1]['position'] if value else None
 
     @property
     def areas(self) -> list[dict[str, int]]:
@@ -233,7 +248,7 @@ class Piece:
         Returns:
             list: A list of dictionaries with area and time.
         """
-        return self._areas
+        return [{'area': int(row[1]), 'time': float(row[0])} for row in self._areas.data]
 
     @areas.setter
     def areas(self, value: list[dict[str, int]]) -> None:
@@ -249,7 +264,9 @@ class Piece:
         if not (isinstance(value, list) and
                 all(isinstance(i, dict) and 'area' in i and 'time' in i for i in value)):
             raise ValueError("Areas must be a list of dictionaries with position and time")
-        self._areas = value
+        self._areas.clear()
+        for entry in value:
+            self._areas.append(entry['time'], (entry['area'],))
 
     @property
     def speed(self):
@@ -286,7 +303,7 @@ class Piece:
             str: A string representation of the BasePiece instance.
         """
         return (f"BasePiece(name={self._name}, category={self._category}, bbox={self._bbox}, mean_colors="
-                f"{self._mean_colors}, positions={self._positions}), areas={self._areas}, speed={self._speed})")
+                f"{self.mean_colors}, positions={self.positions}), areas={self.areas}, speed={self._speed})")
 
     def __str__(self):
         """
@@ -296,7 +313,7 @@ class Piece:
             str: A user-friendly string representation of the BasePiece instance.
         """
         return (f"Piece: {self._name}, Category: {self._category}, bbox: {self._bbox}, Mean Colors: "
-                f"{self._mean_colors}, Positions: {self._positions}, Areas: {self._areas}, Speed: {self._speed}")
+                f"{self.mean_colors}, Positions: {self.positions}, Areas: {self.areas}, Speed: {self._speed}")
 
     # ----- Bounding box functions
 
@@ -314,20 +331,21 @@ class Piece:
 
     # ----- Mean color functions
 
-    def add_mean_color(self, mean_color: tuple[int, int, int]) -> None:
+    def add_mean_color(self, mean_color: tuple[int, int, int], timestamp: float | None = None) -> None:
         """
-        Add a new mean color with the current time.
+        Add a new mean color with the capture time of its frame.
 
         Args:
             mean_color (tuple): The mean color of the piece as a tuple of three integers (B, G, R).
+            timestamp (float | None): Capture time of the frame, time.monotonic() clock. None is the current time.
         """
         if not (isinstance(mean_color, tuple) and len(mean_color) == 3 and all(isinstance(i, int) for i in mean_color)):
             raise ValueError("Mean color must be a tuple of three integers")
-        self._mean_colors.append({'mean_color': mean_color, 'time': time.time()})
+        self._mean_colors.append(time.monotonic() if timestamp is None else timestamp, mean_color)
 
     def calculate_mean_color(self) -> tuple[int, int, int]:
         """
-        Calculate the overall mean color using all mean colors.
+        Calculate the overall mean color using all mean colors. O(1), from the running sums.
 
         Returns:
             tuple: The overall mean color as a tuple of three integers (B, G, R).
@@ -335,16 +353,11 @@ class Piece:
         Raises:
             ValueError: If there are no mean colors available.
         """
-        if self._mean_colors == []:
+        if len(self._mean_colors) == 0:
             raise ValueError("No mean colors available")
 
-        total_b, total_g, total_r = 0, 0, 0
-        for entry in self._mean_colors:
-            b, g, r = entry['mean_color']
-            total_b += b
-            total_g += g
-            total_r += r
-
+        # The colors are integers, their sums are exact
+        total_b, total_g, total_r = (int(total) for total in self._mean_colors.sums)
         count = len(self._mean_colors)
         return (total_b // count, total_g // count, total_r // count)
 
@@ -365,10 +378,13 @@ class Piece:
         """
         Get the category of the piece.
 
+        The mean color comes from the running sums and the classification of each integer
+        color is cached, so the cost does not grow with the length of the track.
+
         Returns:
             str: The category of the piece.
         """
-        material, dist = LabClassifier.which_material(self.calculate_mean_color_lab(), verbose=False)
+        material, dist = LabClassifier.which_material_bgr(self.calculate_mean_color())
         self._category = material
         self._name = material.name.lower()
 
@@ -376,12 +392,13 @@ class Piece:
     
     # ----- Position functions
 
-    def add_position(self, position: tuple[float, float]) -> None:
+    def add_position(self, position: tuple[float, float], timestamp: float | None = None) -> None:
         """
-        Add a new position with the current time.
+        Add a new position with the capture time of its frame.
 
         Args:
             position (tuple): The position of the piece as a tuple of two numbers (x, y).
+            timestamp (float | None): Capture time of the frame, time.monotonic() clock. None is the current time.
 
         Raises:
             ValueError: If the position is not a tuple of two numbers (int or float).
@@ -389,7 +406,8 @@ class Piece:
         if not (isinstance(position, tuple) and len(position) == 2 and
                 all(isinstance(i, (int, float)) for i in position)):
             raise ValueError("Position must be a tuple of two numbers (int or float)")
-        self._positions.append({'position': position, 'time': time.time()})
+        self._positions.append(time.monotonic() if timestamp is None else timestamp, position)
+        self._last_position = position
 
     def get_last_positon(self) -> tuple[float, float]:
         """
@@ -401,29 +419,53 @@ class Piece:
         Raises:
             ValueError: If there are no positions available.
         """
-        if len(self.positions) == 0:
+        if self._last_position is None:
             raise ValueError("No positions available")
-        return self.positions[-1]['position']
+        return self._last_position
+
+    def get_last_time(self) -> float:
+        """
+        Get the capture time of the last position of the piece.
+
+        Returns:
+            float: The time of the last position, time.monotonic() clock. See monotonic_to_epoch_ms().
+
+        Raises:
+            ValueError: If there are no positions available.
+        """
+        if len(self._positions) == 0:
+            raise ValueError("No positions available")
+        return self._positions.get_time(-1)
+
+    def get_track_length(self) -> int:
+        """
+        Get the number of positions of the piece.
+
+        Returns:
+            int: The number of positions.
+        """
+        return len(self._positions)
 
     # ----- Area functions
 
-    def add_area(self, area: int) -> None:
+    def add_area(self, area: int, timestamp: float | None = None) -> None:
         """
-        Add a new area with the current time.
+        Add a new area with the capture time of its frame.
 
         Args:
             area (int): The area of the piece in pixels.
+            timestamp (float | None): Capture time of the frame, time.monotonic() clock. None is the current time.
 
         Raises:
             ValueError: If the area is not an integer.
         """
         if not isinstance(area, int):
             raise ValueError("Area must be an integer")
-        self._areas.append({'area': area, 'time': time.time()})
+        self._areas.append(time.monotonic() if timestamp is None else timestamp, (area,))
 
     def calculate_area(self) -> int:
         """
-        Calculate the overall area using all areas.
+        Calculate the overall area using all areas. O(1), from the running sum.
 
         Returns:
             int: The overall area in pixels.
@@ -431,13 +473,10 @@ class Piece:
         Raises:
             ValueError: If there are no areas available.
         """
-        if self._areas == []:
+        if len(self._areas) == 0:
             raise ValueError("No areas available")
 
-        total_area = 0
-        for entry in self._areas:
-            total_area += entry['area']
-
+        total_area = int(self._areas.sums[0])
         count = len(self._areas)
         return total_area // count  # redondea el resultado hacia abajo al mas cercano
 
@@ -462,9 +501,8 @@ class Piece:
             init_cicle_pos = 10
         else:
             init_cicle_pos = 0
-        delta_x = self._positions[-1]['position'][0] - self._positions[init_cicle_pos]['position'][0]
-        delta_y = self._positions[-1]['position'][1] - self._positions[init_cicle_pos]['position'][1]
-        delta_time = self._positions[-1]['time'] - self._positions[init_cicle_pos]['time']
+        data = self._positions.data
+        delta_time, delta_x, delta_y = (float(delta) for delta in data[-1] - data[init_cicle_pos])
 
         if delta_time == 0:
             raise ValueError("The time difference must be greater than zero")
@@ -479,24 +517,26 @@ class Piece:
 
     # ----- Other methods
 
-    def update(self, piece: Piece | None = None) -> None:
+    def update(self, piece: Piece | None = None, classify: bool = True) -> None:
         """
         Update with other piece.
 
         Args:
             piece (Piece): The piece to update with.
+            classify (bool): Update the category. False defers it, e.g. until the piece is released.
         """
         if piece is not None:
             if piece.bbox:
                 self.bbox = piece.bbox
-            self._mean_colors.append(piece.mean_colors[-1])
-            self._positions.append(piece.positions[-1])
-            if len(piece.areas) > 0:
-                self._areas.append(piece.areas[-1])
+            self._mean_colors.append(piece._mean_colors.get_time(-1), piece._mean_colors.get_values(-1))
+            self._positions.append(piece._positions.get_time(-1), piece._positions.get_values(-1))
+            self._last_position = piece.get_last_positon()
+            if len(piece._areas) > 0:
+                self._areas.append(piece._areas.get_time(-1), piece._areas.get_values(-1))
         # Calculate
         if len(self._positions) > 1:
             _ = self.calculate_speed()
-        if len(self._mean_colors) > 0:
+        if classify and len(self._mean_colors) > 0:
             _ = self.calculate_category()
 
     def draw(self, image: np.ndarray, track: bool = False) -> None:
@@ -507,19 +547,17 @@ class Piece:
             image (np.ndarray): The image to draw on.
             track (bool). Draw or not the track
         """
-        color = self.mean_colors[0]['mean_color']
+        color = tuple(int(value) for value in self._mean_colors.get_values(0))
         thickness = 1
 
-        if track:
+        if track and len(self._positions) > 1:
             # Draw the trajectory
-            for i in range(1, len(self._positions)):
-                start_point = (int(self._positions[i-1]['position'][0]), int(self._positions[i-1]['position'][1]))
-                end_point = (int(self._positions[i]['position'][0]), int(self._positions[i]['position'][1]))
-                cv2.line(image, start_point, end_point, color, thickness)
+            points = self._positions.values.astype(np.int32)
+            cv2.polylines(image, [points], isClosed=False, color=color, thickness=thickness)
 
         # Draw the current position
-        if self._positions:
-            current_position = (int(self._positions[-1]['position'][0]), int(self._positions[-1]['position'][1]))
+        if self._last_position is not None:
+            current_position = (int(self._last_position[0]), int(self._last_position[1]))
             cv2.circle(image, current_position, 5, (0, 0, 0), -1)
 
         # Draw bounding box
@@ -534,6 +572,20 @@ class Piece:
             cv2.putText(image, f"{self._name}({self.id})", (self.bbox[0] - 10, self.bbox[1]-10),
                         cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, thickness)
 
+    def copy_for_drawing(self) -> Piece:
+        """
+        Copy the state drawn by draw(): name, category, bbox, color and last position. The copy does not
+        change when the piece is updated, so it can be drawn in another thread.
+
+        Returns:
+            Piece: The copy, without the track.
+        """
+        piece = Piece(self._id, name=self._name, category=self._category, bbox=self._bbox)
+        if len(self._mean_colors) > 0:
+            piece._mean_colors.append(self._mean_colors.get_time(0), self._mean_colors.get_values(0))
+        piece._last_position = self._last_position
+        return piece
+
     def pack(self) -> bytes:
         """
         Pack the piece information into a dictionary.
@@ -555,7 +607,45 @@ class Piece:
                       'position': position,
                       'area': area,
                       'speed': speed,
-                      'timestamp': self.positions[-1]['time']
+                      'timestamp': monotonic_to_epoch_ms(self.get_last_time()) / 1000
                       }
 
         return json.dumps(piece_dict).encode("utf-8")
+
+    def to_record(self, pixels_to_mm: float = 1) -> PieceRecord:
+        """
+        Get the record of the piece for the binary wire format (src/protocol.py).
+
+        Args:
+            pixels_to_mm (float): Conversion of the speed to mm/s.
+
+        Returns:
+            PieceRecord: The piece record. The speed is the x speed, along the belt.
+        """
+        mean_color = self.calculate_mean_color()
+        material, distance = LabClassifier.which_material_bgr(mean_color)
+        return PieceRecord(material=material.value,
+                           timestamp_ms=monotonic_to_epoch_ms(self.get_last_time()),
+                           speed=self.calculate_speed(pixels_to_mm=pixels_to_mm)[0],
+                           piece_id=self._id,
+                           area=self.calculate_area(),
+                           lab=bgr_to_lab(mean_color),
+                           confidence=1 / (1 + distance))
+
+
+def classify_pieces(pieces: list[Piece]) -> None:
+    """
+    Classify several pieces with a single call to the classifier.
+
+    Args:
+        pieces (list[Piece]): The pieces to classify. Their category and name are updated.
+    """
+    if not pieces:
+        return
+    t = INSTRUMENTATION.start()
+    mean_colors = np.array([piece.calculate_mean_color() for piece in pieces])
+    indices, _ = LabClassifier.classify_bgr(mean_colors)
+    for piece, material in zip(pieces, LabClassifier.get_materials(indices)):
+        piece.category = material
+        piece.name = material.name.lower()
+    INSTRUMENTATION.stop('classify', t)
@@ -0,0 +1,167 @@
+"""
+piece_history.py
+"""
+
+import numpy as np
+
+
+class PieceHistory:
+    """
+    Growable NumPy history of timestamped samples of a piece, with running sums.
+
+    Each row is (time, value_1, ..., value_n). The storage is preallocated and doubled
+    when it is full, so appending is amortized O(1) and there is one array per history
+    instead of one dict per sample. The running sums of the values give the mean in O(1).
+
+    Attributes:
+        _data (np.ndarray): (capacity, 1 + n) preallocated rows. Only the first _length are valid.
+        _sums (np.ndarray): (n,) sum of the values of the valid rows.
+        _length (int): Number of samples.
+    """
+
+    def __init__(self, n_values: int, capacity: int = 16):
+        """
+        Initialize an empty history.
+
+        Args:
+            n_values (int): Number of values of each sample, without the time.
+            capacity (int): Initial number of preallocated rows.
+        """
+        self._data = np.empty((max(1, capacity), 1 + n_values), dtype=np.float64)
+        self._sums = np.zeros(n_values, dtype=np.float64)
+        self._length = 0
+
+    def __len__(self) -> int:
+        """
+        Return the number of samples.
+        """
+        return self._length
+
+    @property
+    def n_values(self) -> int:
+        """
+        Get the number of values of each sample.
+
+        Returns:
+            int: The number of values, without the time.
+        """
+        return self._data.shape[1] - 1
+
+    @property
+    def sums(self) -> np.ndarray:
+        """
+        Get the running sums of the values.
+
+        Returns:
+            np.ndarray: (n,) sum of every value over all the samples.
+        """
+        return self._sums
+
+    @property
+    def data(self) -> np.ndarray:
+        """
+        Get the valid samples. A view, valid until the next append.
+
+        Returns:
+            np.ndarray: (length, 1 + n) rows (time, values...).
+        """
+        return self._data[:self._length]
+
+    @property
+    def times(self) -> np.ndarray:
+        """
+        Get the times of the samples. A view, valid until the next append.
+
+        Returns:
+            np.ndarray: (length,) times.
+        """
+        return self._data[:self._length, 0]
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Get the values of the samples. A view, valid until the next append.
+
+        Returns:
+            np.ndarray: (length, n) values.
+        """
+        return self._data[:self._length, 1:]
+
+    def append(self, timestamp: float, values: tuple) -> None:
+        """
+        Append a sample.
+
+        Args:
+            timestamp (float): The time of the sample.
+            values (tuple): The n values of the sample.
+        """
+        if self._length == self._data.shape[0]:
+            data = np.empty((self._data.shape[0] * 2, self._data.shape[1]), dtype=np.float64)
+            data[:self._length] = self._data
+            self._data = data
+        row = self._data[self._length]
+        row[0] = timestamp
+        row[1:] = values
+        self._sums += row[1:]
+        self._length += 1
+
+    def get_time(self, index: int) -> float:
+        """
+        Get the time of a sample.
+
+        Args:
+            index (int): The index of the sample. Negative indexes count from the end.
+
+        Returns:
+            float: The time of the sample.
+        """
+        return float(self._data[self._check_index(index), 0])
+
+    def get_values(self, index: int) -> np.ndarray:
+        """
+        Get the values of a sample.
+
+        Args:
+            index (int): The index of the sample. Negative indexes count from the end.
+
+        Returns:
+            np.ndarray: (n,) values of the sample (a copy).
+        """
+        return self._data[self._check_index(index), 1:].copy()
+
+    def mean(self) -> np.ndarray:
+        """
+        Get the mean of the values over all the samples, from the running sums.
+
+        Returns:
+            np.ndarray: (n,) mean values.
+
+        Raises:
+            ValueError: If the history is empty.
+        """
+        if self._length == 0:
+            raise ValueError("Empty history")
+        return self._sums / self._length
+
+    def clear(self) -> None:
+        """
+        Remove all the samples, keeping the storage.
+        """
+        self._sums[:] = 0
+        self._length = 0
+
+    def _check_index(self, index: int) -> int:
+        """
+        Convert an index to a positive valid row index.
+        """
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("History index out of range")
+        return index
+
+    def __repr__(self) -> str:
+        """
+        Return a string representation of the history.
+        """
+        return f"PieceHistory(length={self._length}, sums={self._sums})"
@@ -0,0 +1,345 @@
+"""
+pipeline.py
+
+Building blocks for running the sensor, detector, tracker and transmitter as
+independent stages connected by bounded buffers.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable
+
+import numpy as np
+
+
+class PipelineException(Exception):
+    """
+    Pipeline Exception
+    """
+
+
+class BufferClosed(PipelineException):
+    """
+    Raised when reading from a closed and empty ring buffer.
+    """
+
+
+class BufferEmpty(PipelineException):
+    """
+    Raised when a read on a ring buffer times out.
+    """
+
+
+class StageFinished(PipelineException):
+    """
+    Raised by the work function of a stage to finish it normally, e.g. at the end of a video.
+    """
+
+
+class RingBuffer:
+    """
+    Bounded FIFO buffer shared between two pipeline stages.
+
+    Readers and writers wait on a condition variable instead of polling, so a
+    stage wakes up as soon as there is data (or space) available.
+
+    Attributes:
+        _maxsize (int): Maximum number of items held in the buffer.
+        _drop_oldest (bool): If True, put() never blocks and evicts the oldest item when full.
+        _dropped (int): Number of items evicted by the drop-oldest policy or skipped by get_latest().
+        _closed (bool): Whether the producer has closed the buffer.
+        _on_drop (Callable | None): Called with every dropped item.
+    """
+
+    def __init__(self, maxsize: int = 2, drop_oldest: bool = False, on_drop: Callable[[Any], None] | None = None):
+        """
+        Initialize the ring buffer.
+
+        Args:
+            maxsize (int): Maximum number of items held in the buffer.
+            drop_oldest (bool): Drop the oldest item instead of blocking when the buffer is full.
+            on_drop (Callable | None): Called with every item dropped by the drop-oldest policy or skipped by
+                get_latest(), e.g. to give a frame back to its pool.
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be greater than 0")
+        self._maxsize = maxsize
+        self._drop_oldest = drop_oldest
+        self._items: deque = deque()
+        self._dropped = 0
+        self._closed = False
+        self._on_drop = on_drop
+        self._condition = threading.Condition()
+
+    @property
+    def dropped(self) -> int:
+        """
+        Get the number of items dropped by the drop-oldest policy or skipped by get_latest().
+
+        Returns:
+            int: The number of dropped items.
+        """
+        return self._dropped
+
+    @property
+    def closed(self) -> bool:
+        """
+        Get whether the buffer is closed.
+
+        Returns:
+            bool: True if the buffer is closed.
+        """
+        return self._closed
+
+    def __len__(self) -> int:
+        """
+        Return the number of items waiting in the buffer.
+        """
+        with self._condition:
+            return len(self._items)
+
+    def _drop(self, item: Any) -> None:
+        """
+        Count a dropped item and hand it over to on_drop. Called with the lock held.
+        """
+        self._dropped += 1
+        if self._on_drop is not None:
+            self._on_drop(item)
+
+    def put(self, item: Any, timeout: float | None = None) -> bool:
+        """
+        Put an item in the buffer.
+
+        Args:
+            item (Any): The item to store.
+            timeout (float | None): Maximum time to wait for space. None waits forever.
+
+        Returns:
+            bool: True if the item was stored, False if it timed out or the buffer is closed.
+        """
+        with self._condition:
+            if self._closed:
+                return False
+            if len(self._items) >= self._maxsize:
+                if self._drop_oldest:
+                    self._drop(self._items.popleft())
+                elif not self._condition.wait_for(lambda: len(self._items) < self._maxsize or self._closed,
+                                                  timeout=timeout):
+                    return False
+                elif self._closed:
+                    return False
+            self._items.append(item)
+            self._condition.notify_all()
+            return True
+
+    def get(self, timeout: float | None = None) -> Any:
+        """
+        Get the oldest item from the buffer.
+
+        Args:
+            timeout (float | None): Maximum time to wait for an item. None waits forever.
+
+        Returns:
+            Any: The oldest item in the buffer.
+
+        Raises:
+            BufferEmpty: If no item arrived before the timeout.
+            BufferClosed: If the buffer is closed and there are no items left.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._items or self._closed, timeout=timeout):
+                raise BufferEmpty("No item available")
+            if not self._items:
+                raise BufferClosed("Buffer is closed")
+            item = self._items.popleft()
+            self._condition.notify_all()
+            return item
+
+    def get_latest(self, timeout: float | None = None) -> Any:
+        """
+        Get the newest item from the buffer and drop the older ones.
+
+        Args:
+            timeout (float | None): Maximum time to wait for an item. None waits forever.
+
+        Returns:
+            Any: The newest item in the buffer.
+
+        Raises:
+            BufferEmpty: If no item arrived before the timeout.
+            BufferClosed: If the buffer is closed and there are no items left.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._items or self._closed, timeout=timeout):
+                raise BufferEmpty("No item available")
+            if not self._items:
+                raise BufferClosed("Buffer is closed")
+            item = self._items.pop()
+            while self._items:
+                self._drop(self._items.popleft())
+            self._condition.notify_all()
+            return item
+
+    def close(self) -> None:
+        """
+        Close the buffer. Pending items can still be read, waiting readers and writers are woken up.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+class StageStats:
+    """
+    Processing time statistics of a pipeline stage.
+
+    Attributes:
+        _name (str): The name of the stage.
+        _count (int): Number of processed items.
+        _total_time (float): Total processing time in seconds.
+        _max_time (float): Maximum processing time in seconds.
+        _samples (deque): Most recent processing times, used for percentiles.
+    """
+
+    def __init__(self, name: str, window: int = 1000):
+        """
+        Initialize the stage statistics.
+
+        Args:
+            name (str): The name of the stage.
+            window (int): Number of recent samples kept to compute percentiles.
+        """
+        self._name = name
+        self._count = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+        self._samples: deque = deque(maxlen=window)
+        self._start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        """
+        Get the name of the stage.
+
+        Returns:
+            str: The name of the stage.
+        """
+        return self._name
+
+    def record(self, elapsed: float) -> None:
+        """
+        Record the processing time of one item.
+
+        Args:
+            elapsed (float): Processing time in seconds.
+        """
+        with self._lock:
+            self._count += 1
+            self._total_time += elapsed
+            self._max_time = max(self._max_time, elapsed)
+            self._samples.append(elapsed)
+
+    def summary(self) -> dict[str, float]:
+        """
+        Get a summary of the stage statistics.
+
+        Returns:
+            dict: count, items per second, mean, p50, p99 and max processing time in milliseconds.
+        """
+        with self._lock:
+            samples = np.array(self._samples, dtype=np.float64)
+            count = self._count
+            total_time = self._total_time
+            max_time = self._max_time
+        elapsed = time.perf_counter() - self._start_time
+        if count == 0:
+            return {'count': 0, 'fps': 0.0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+        p50, p99 = np.percentile(samples, [50, 99])
+        return {'count': count,
+                'fps': count / elapsed if elapsed > 0 else 0.0,
+                'mean_ms': total_time / count * 1000,
+                'p50_ms': float(p50) * 1000,
+                'p99_ms': float(p99) * 1000,
+                'max_ms': max_time * 1000}
+
+    def __str__(self) -> str:
+        """
+        Return a user-friendly string with the stage statistics.
+        """
+        s = self.summary()
+        return (f"{self._name}: {s['count']} items, {s['fps']:.1f}/s, mean {s['mean_ms']:.2f} ms, "
+                f"p50 {s['p50_ms']:.2f} ms, p99 {s['p99_ms']:.2f} ms, max {s['max_ms']:.2f} ms")
+
+
+class PipelineStage(threading.Thread):
+    """
+    Thread that runs one step of the pipeline.
+
+    The stage reads an item from its input buffer (or produces one if it has no input),
+    processes it with `work` and forwards the result to every output buffer. A result of
+    None is not forwarded. The work function raises StageFinished to end the stage. When
+    the stage finishes, its output buffers are closed so the next stages can drain and stop.
+    """
+
+    def __init__(self, name: str, work: Callable[[Any], Any], stop_event: threading.Event,
+                 input_buffer: RingBuffer | None = None, output_buffers: list[RingBuffer] | None = None,
+                 poll_timeout: float = 0.5):
+        """
+        Initialize the stage.
+
+        Args:
+            name (str): The name of the stage.
+            work (Callable): Function that processes one item. Producers receive None.
+            stop_event (threading.Event): Event shared by all the stages to stop the pipeline.
+            input_buffer (RingBuffer | None): Buffer to read items from. None for producer stages.
+            output_buffers (list[RingBuffer] | None): Buffers to forward the results to.
+            poll_timeout (float): Maximum time blocked on a buffer before checking the stop event.
+        """
+        super().__init__(name=name, daemon=True)
+        self._work = work
+        self._stop_event = stop_event
+        self._input_buffer = input_buffer
+        self._output_buffers = output_buffers or []
+        self._poll_timeout = poll_timeout
+
+        self.stats = StageStats(name)
+        self.exception: BaseException | None = None
+
+    def run(self) -> None:
+        """
+        Stage loop.
+        """
+        try:
+            while not self._stop_event.is_set():
+                if self._input_buffer is not None:
+                    try:
+                        item = self._input_buffer.get(timeout=self._poll_timeout)
+                    except BufferEmpty:
+                        continue
+                    except BufferClosed:
+                        break
+                else:
+                    item = None
+
+                start_time = time.perf_counter()
+                try:
+                    result = self._work(item)
+                except StageFinished:
+                    break
+                self.stats.record(time.perf_counter() - start_time)
+
+                if result is None:
+                    continue
+                for output_buffer in self._output_buffers:
+                    while not output_buffer.put(result, timeout=self._poll_timeout):
+                        if self._stop_event.is_set() or output_buffer.closed:
+                            break
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            # Keep the exception to raise it in the coordinator and stop the other stages
+            self.exception = e
+            self._stop_event.set()
+        finally:
+            for output_buffer in self._output_buffers:
+                output_buffer.close()
@@ -0,0 +1,161 @@
+"""
+preview.py
+
+Preview of the tracked frames decoupled from the processing loop, for headless runs.
+"""
+
+import threading
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import cv2
+
+from src.pipeline import RingBuffer, BufferClosed, BufferEmpty
+
+
+class Preview(threading.Thread):
+    """
+    Thread that draws and shows (or saves) some of the tracked frames.
+
+    The processing loop only decides if a frame is wanted and, in that case, copies it
+    and hands it over with the pieces. The drawing, the window and the image encoding
+    run in this thread. The buffer holds one frame and drops the oldest, so a slow
+    preview never stalls the processing loop.
+
+    A frame is wanted every `every` frames, or the next one after request().
+
+    Attributes:
+        _draw (Callable): Function that draws the pieces on a frame, e.g. Tracker.draw.
+        _every (int): Render one frame out of every. 0 renders only on request.
+        _path (Path | None): File where the last rendered frame is saved.
+        _window_name (str | None): Window where the rendered frames are shown.
+        _frame_counter (int): Number of frames offered since the last rendered one.
+        _requested (threading.Event): Set by request(), the next frame is rendered.
+        _rendered (int): Number of rendered frames.
+    """
+
+    def __init__(self, draw: Callable[..., None], every: int = 0, path: Path | str | None = None,
+                 window_name: str | None = None):
+        """
+        Initialize the preview.
+
+        Args:
+            draw (Callable): Function that draws the pieces on a frame, called as draw(frame, pieces=pieces).
+            every (int): Render one frame out of every. 0 renders only on request.
+            path (Path | str | None): File where the last rendered frame is saved, e.g. preview.jpg.
+            window_name (str | None): Window where the rendered frames are shown. Needs a display.
+        """
+        super().__init__(name='preview', daemon=True)
+        if every < 0:
+            raise ValueError("every must be 0 or positive")
+        self._draw = draw
+        self._every = every
+        self._path = Path(path) if path is not None else None
+        self._window_name = window_name
+        self._buffer = RingBuffer(maxsize=1, drop_oldest=True)
+        self._frame_counter = 0
+        self._requested = threading.Event()
+        self._rendered = 0
+        self.exception: BaseException | None = None
+
+    @property
+    def rendered(self) -> int:
+        """
+        Get the number of rendered frames.
+        """
+        return self._rendered
+
+    def request(self) -> None:
+        """
+        Render the next frame. Safe to call from a signal handler.
+        """
+        self._requested.set()
+
+    def wants_frame(self) -> bool:
+        """
+        Count one frame of the processing loop and tell if it has to be submitted.
+
+        Returns:
+            bool: True if the frame must be submitted.
+        """
+        self._frame_counter += 1
+        if self._requested.is_set() or (self._every and self._frame_counter >= self._every):
+            self._requested.clear()
+            self._frame_counter = 0
+            return True
+        return False
+
+    def submit(self, frame: np.ndarray, pieces: list) -> None:
+        """
+        Hand a frame over to the preview thread. The frame and the drawn state of the pieces are
+        copied, the caller can reuse the frame and keep updating the pieces.
+
+        Args:
+            frame (np.ndarray): The frame.
+            pieces (list): The pieces (Piece) to draw.
+        """
+        self._buffer.put((frame.copy(), [piece.copy_for_drawing() for piece in pieces]))
+
+    def offer(self, frame: np.ndarray, pieces: list) -> bool:
+        """
+        Submit the frame only if it is wanted.
+
+        Args:
+            frame (np.ndarray): The frame.
+            pieces (list): The pieces to draw.
+
+        Returns:
+            bool: True if the frame was submitted.
+        """
+        if not self.wants_frame():
+            return False
+        self.submit(frame, pieces)
+        return True
+
+    def run(self) -> None:
+        """
+        Preview loop.
+        """
+        try:
+            while True:
+                try:
+                    frame, pieces = self._buffer.get(timeout=0.5)
+                except BufferEmpty:
+                    continue
+                except BufferClosed:
+                    break
+                self._render(frame, pieces)
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            # The preview is optional, an error must not stop the processing
+            self.exception = e
+            print('Preview stopped:', e)
+        finally:
+            if self._window_name is not None:
+                cv2.destroyWindow(self._window_name)
+
+    def _render(self, frame: np.ndarray, pieces: list) -> None:
+        """
+        Draw a frame and show or save it.
+        """
+        self._draw(frame, pieces=pieces)
+        if self._path is not None:
+            # Write and rename, a reader never sees a half written image
+            tmp_path = self._path.with_name('.tmp_' + self._path.name)
+            cv2.imwrite(str(tmp_path), frame)
+            tmp_path.replace(self._path)
+        if self._window_name is not None:
+            cv2.imshow(self._window_name, frame)
+            cv2.waitKey(1)
+        self._rendered += 1
+
+    def stop(self, timeout: float = 1.0) -> None:
+        """
+        Stop the preview thread after the pending frame.
+
+        Args:
+            timeout (float): Maximum time to wait for the thread.
+        """
+        self._buffer.close()
+        if self.is_alive():
+            self.join(timeout=timeout)
@@ -0,0 +1,341 @@
+"""
+protocol.py
+
+Framing of the pieces sent to the sorting machines.
+
+Batch datagram
+--------------
+Several records are sent in one UDP datagram, preceded by a 12 byte header.
+All the header fields are little-endian:
+
+    offset  size  field        description
+    0       2     magic        b'SD'
+    2       1     version      BATCH_VERSION
+    3       1     flags        reserved, 0
+    4       2     count        number of records in the datagram
+    6       2     record_size  size in bytes of every record
+    8       4     sequence     datagram counter of the sender, wraps at 2**32
+
+    12      count * record_size  records
+
+The records are all of the same size, one after another: RawPiece.pack() or
+piece records. The receiver checks the magic, the version and that the length
+matches count * record_size, then splits the records. A gap in the sequence
+numbers means lost datagrams.
+
+Decoder, without this module:
+
+    magic, version, flags, count, record_size, sequence = struct.unpack_from('<2sBBHHI', datagram)
+    records = [datagram[12 + i * record_size: 12 + (i + 1) * record_size] for i in range(count)]
+
+Piece record
+------------
+Fixed size, little-endian, no padding between fields. Base record, 16 bytes:
+
+    offset  size  type     field
+    0       1     uint8    version       RECORD_VERSION
+    1       1     uint8    flags         bit 0: extended record
+    2       2     uint16   material      MaterialEn value
+    4       8     uint64   timestamp_ms  epoch milliseconds
+    12      4     float32  speed         mm/s
+
+Extended record, 32 bytes: the base record followed by
+
+    16      4     uint32   piece_id
+    20      4     uint32   area          pixels
+    24      1     uint8    l             LAB color (OpenCV 8 bit scale)
+    25      1     uint8    a
+    26      1     uint8    b
+    27      1              padding
+    28      4     float32  confidence    1 / (1 + distance to the reference color)
+
+Decoder, without this module:
+
+    version, flags, material, timestamp_ms, speed = struct.unpack_from('<BBHQf', record)
+    if flags & 1:
+        piece_id, area, l, a, b, confidence = struct.unpack_from('<IIBBBxf', record, 16)
+"""
+
+import struct
+from typing import Iterable, NamedTuple
+
+
+BATCH_MAGIC = b'SD'
+BATCH_VERSION = 1
+BATCH_HEADER = struct.Struct('<2sBBHHI')
+MAX_DATAGRAM_SIZE = 1400    # Below the Ethernet MTU, no IP fragmentation
+SEQUENCE_MODULO = 2 ** 32
+
+
+RECORD_VERSION = 1
+RECORD_FLAG_EXTENDED = 0x01
+RECORD = struct.Struct('<BBHQf')
+RECORD_EXTENDED = struct.Struct('<BBHQfIIBBBxf')
+
+
+class ProtocolException(Exception):
+    """
+    Raised when a datagram cannot be decoded.
+    """
+
+
+class BatchHeader(NamedTuple):
+    """
+    Header of a batch datagram.
+    """
+    version: int
+    count: int
+    record_size: int
+    sequence: int
+
+
+def get_max_records(record_size: int, max_datagram_size: int = MAX_DATAGRAM_SIZE) -> int:
+    """
+    Get the maximum number of records that fit in one datagram.
+
+    Args:
+        record_size (int): Size of each record in bytes.
+        max_datagram_size (int): Maximum size of the datagram in bytes.
+
+    Returns:
+        int: The maximum number of records.
+    """
+    return max(1, (max_datagram_size - BATCH_HEADER.size) // record_size)
+
+
+def encode_batch(records: list[bytes], sequence: int) -> bytes:
+    """
+    Pack several records of the same size in one datagram.
+
+    Args:
+        records (list[bytes]): The records, all of the same size.
+        sequence (int): Sequence number of the datagram.
+
+    Returns:
+        bytes: The datagram.
+
+    Raises:
+        ProtocolException: If the records have different sizes or there are too many.
+    """
+    record_size = len(records[0]) if records else 0
+    if any(len(record) != record_size for record in records):
+        raise ProtocolException("All the records of a batch must have the same size")
+    if len(records) > 0xFFFF:
+        raise ProtocolException("Too many records for one batch")
+    header = BATCH_HEADER.pack(BATCH_MAGIC, BATCH_VERSION, 0, len(records), record_size, sequence % SEQUENCE_MODULO)
+    return header + b''.join(records)
+
+
+def decode_batch(datagram: bytes) -> tuple[BatchHeader, list[bytes]]:
+    """
+    Unpack a batch datagram.
+
+    Args:
+        datagram (bytes): The datagram.
+
+    Returns:
+        BatchHeader: The header.
+        list[bytes]: The records.
+
+    Raises:
+        ProtocolException: If the datagram is not a valid batch.
+    """
+    if len(datagram) < BATCH_HEADER.size:
+        raise ProtocolException(f"Datagram too short: {len(datagram)} bytes")
+    magic, version, _, count, record_size, sequence = BATCH_HEADER.unpack_from(datagram)
+    if magic != BATCH_MAGIC:
+        raise ProtocolException(f"Invalid magic: {magic!r}")
+    if version != BATCH_VERSION:
+        raise ProtocolException(f"Unsupported batch version: {version}")
+    if len(datagram) != BATCH_HEADER.size + count * record_size:
+        raise ProtocolException(f"Invalid length {len(datagram)} for {count} records of {record_size} bytes")
+
+    view = memoryview(datagram)[BATCH_HEADER.size:]
+    records = [bytes(view[i * record_size:(i + 1) * record_size]) for i in range(count)]
+    return BatchHeader(version, count, record_size, sequence), records
+
+
+class BatchReceiver:
+    """
+    Decodes the batch datagrams of one sender and counts the lost ones from the sequence numbers.
+
+    Attributes:
+        _last_sequence (int | None): Sequence number of the last datagram received.
+        _received (int): Number of datagrams received.
+        _lost (int): Number of datagrams lost (gaps in the sequence).
+    """
+
+    def __init__(self):
+        """
+        Initialize the receiver.
+        """
+        self._last_sequence: int | None = None
+        self._received = 0
+        self._lost = 0
+
+    @property
+    def received(self) -> int:
+        """
+        Get the number of datagrams received.
+        """
+        return self._received
+
+    @property
+    def lost(self) -> int:
+        """
+        Get the number of datagrams lost.
+        """
+        return self._lost
+
+    def decode(self, datagram: bytes) -> list[bytes]:
+        """
+        Decode a datagram and update the loss counter.
+
+        Args:
+            datagram (bytes): The datagram.
+
+        Returns:
+            list[bytes]: The records.
+        """
+        header, records = decode_batch(datagram)
+        if self._last_sequence is None:
+            self._last_sequence = header.sequence
+        else:
+            gap = (header.sequence - self._last_sequence) % SEQUENCE_MODULO
+            # A repeated or older sequence is a duplicate or a late datagram, it does not move the counter
+            if 0 < gap < SEQUENCE_MODULO // 2:
+                self._lost += gap - 1
+                self._last_sequence = header.sequence
+        self._received += 1
+        return records
+
+
+class PieceRecord(NamedTuple):
+    """
+    A released piece as sent to the sorting machines.
+    """
+    material: int
+    timestamp_ms: int
+    speed: float
+    piece_id: int = 0
+    area: int = 0
+    lab: tuple[int, int, int] = (0, 0, 0)
+    confidence: float = 0.0
+
+
+def get_record_size(extended: bool = False) -> int:
+    """
+    Get the size of a piece record.
+
+    Args:
+        extended (bool): Extended record.
+
+    Returns:
+        int: The size in bytes.
+    """
+    return RECORD_EXTENDED.size if extended else RECORD.size
+
+
+def encode_record(record: PieceRecord, extended: bool = False) -> bytes:
+    """
+    Encode a piece record.
+
+    Args:
+        record (PieceRecord): The piece.
+        extended (bool): Include the extended fields.
+
+    Returns:
+        bytes: The record, 16 or 32 bytes.
+    """
+    if extended:
+        return RECORD_EXTENDED.pack(RECORD_VERSION, RECORD_FLAG_EXTENDED, record.material, record.timestamp_ms,
+                                    record.speed, record.piece_id, record.area, *record.lab, record.confidence)
+    return RECORD.pack(RECORD_VERSION, 0, record.material, record.timestamp_ms, record.speed)
+
+
+def encode_records(records: Iterable[PieceRecord], extended: bool = False,
+                   buffer: bytearray | None = None, offset: int = 0) -> bytearray:
+    """
+    Encode several piece records one after another into a buffer, without intermediate bytes objects.
+
+    Args:
+        records (Iterable[PieceRecord]): The pieces.
+        extended (bool): Include the extended fields.
+        buffer (bytearray | None): Buffer to write into, grown if needed. None creates one.
+        offset (int): Position of the first record in the buffer, e.g. after a batch header.
+
+    Returns:
+        bytearray: The buffer.
+    """
+    records = list(records)
+    codec = RECORD_EXTENDED if extended else RECORD
+    end = offset + len(records) * codec.size
+    if buffer is None:
+        buffer = bytearray(end)
+    elif len(buffer) < end:
+        buffer.extend(bytes(end - len(buffer)))
+
+    for record in records:
+        if extended:
+            codec.pack_into(buffer, offset, RECORD_VERSION, RECORD_FLAG_EXTENDED, record.material,
+                            record.timestamp_ms, record.speed, record.piece_id, record.area, *record.lab,
+                            record.confidence)
+        else:
+            codec.pack_into(buffer, offset, RECORD_VERSION, 0, record.material, record.timestamp_ms, record.speed)
+        offset += codec.size
+    return buffer
+
+
+def decode_record(buffer: bytes | bytearray | memoryview, offset: int = 0) -> PieceRecord:
+    """
+    Decode a piece record.
+
+    Args:
+        buffer (bytes | bytearray | memoryview): Buffer with the record.
+        offset (int): Position of the record in the buffer.
+
+    Returns:
+        PieceRecord: The piece.
+
+    Raises:
+        ProtocolException: If the record is too short or its version is not supported.
+    """
+    if len(buffer) - offset < RECORD.size:
+        raise ProtocolException("Record too short")
+    version, flags, material, timestamp_ms, speed = RECORD.unpack_from(buffer, offset)
+    if version != RECORD_VERSION:
+        raise ProtocolException(f"Unsupported record version: {version}")
+    if not flags & RECORD_FLAG_EXTENDED:
+        return PieceRecord(material, timestamp_ms, speed)
+    if len(buffer) - offset < RECORD_EXTENDED.size:
+        raise ProtocolException("Extended record too short")
+    *_, piece_id, area, l, a, b, confidence = RECORD_EXTENDED.unpack_from(buffer, offset)
+    return PieceRecord(material, timestamp_ms, speed, piece_id, area, (l, a, b), confidence)
+
+
+def decode_records(buffer: bytes | bytearray | memoryview, record_size: int) -> list[PieceRecord]:
+    """
+    Decode consecutive piece records of the same size.
+
+    Args:
+        buffer (bytes | bytearray | memoryview): The records, e.g. the records of a batch datagram.
+        record_size (int): Size of each record.
+
+    Returns:
+        list[PieceRecord]: The pieces.
+
+    Raises:
+        ProtocolException: If the buffer is not a whole number of records.
+    """
+    if record_size not in (RECORD.size, RECORD_EXTENDED.size) or len(buffer) % record_size:
+        raise ProtocolException(f"Invalid records: {len(buffer)} bytes of {record_size} byte records")
+    codec = RECORD_EXTENDED if record_size == RECORD_EXTENDED.size else RECORD
+    records = []
+    for fields in codec.iter_unpack(buffer):
+        if fields[0] != RECORD_VERSION:
+            raise ProtocolException(f"Unsupported record version: {fields[0]}")
+        if codec is RECORD:
+            records.append(PieceRecord(*fields[2:]))
+        else:
+            records.append(PieceRecord(*fields[2:7], fields[7:10], fields[10]))
+    return records
@@ -9,8 +9,10 @@ import cv2
 
 from src.sensor.base_sensor import BaseSensor, SensorException
 from src.sensor.sensor_type import SensorType
+from src.sensor.pixel_format import PixelFormat
 
-from src.utils import obtain_filenames_last_number
+from src.utils import obtain_filenames_last_number, validate_roi
+from src.buffer_pool import FramePool
 
 
 class CameraException(SensorException):
@@ -84,7 +86,13 @@ class BaseCamera(BaseSensor):
 
         self._camera = None
         self._resolution = (640, 480)  # (1536, 864)
+        self._fps: float | None = None     # Requested frame rate. None is the device default
+        self._pixel_format = PixelFormat.BGR
+        self._capture_resolution: tuple[int, int] | None = None  # Negotiated with the device in initialize()
+        self._roi = None    # Region of interest (x, y, w, h). None is the full frame
         self._camera_config = None
+        self._frame_pool: FramePool | None = None  # Reused frame buffers. None allocates every frame
+        self._timestamp: float | None = None    # Capture time of the last frame read, time.monotonic() clock
 
         self.__output_video = None
         self.__video_recorder_flag = 0
@@ -314,8 +322,136 @@ class BaseCamera(BaseSensor):
             raise CameraException("The video counter must be an integer.")
         self._video_counter = value
 
+    @property
+    def resolution(self) -> tuple[int, int]:
+        """
+        Get the resolution of the frames
+
+        Returns:
+            tuple: (width, height)
+        """
+        return self._resolution
+
+    @property
+    def fps(self) -> float | None:
+        """
+        Get the frame rate requested to the device
+
+        Returns:
+            float | None: The frame rate. None is the device default
+        """
+        return self._fps
+
+    @property
+    def pixel_format(self) -> PixelFormat:
+        """
+        Get the pixel format of the frames
+
+        Returns:
+            PixelFormat: BGR or GRAY
+        """
+        return self._pixel_format
+
+    @property
+    def capture_resolution(self) -> tuple[int, int] | None:
+        """
+        Get the resolution delivered by the device, negotiated in initialize(). If it differs from
+        the resolution, the frames are resized in software
+
+        Returns:
+            tuple | None: (width, height). None before initialize()
+        """
+        return self._capture_resolution
+
+    @property
+    def timestamp(self) -> float | None:
+        """
+        Get the capture time of the last frame read: the sensor timestamp when the device gives one,
+        else the time the frame was grabbed. Pass it to the detector, so the pieces get the exposure
+        time and not the processing time
+
+        Returns:
+            float | None: The time in seconds, time.monotonic() clock. None before the first read
+        """
+        return self._timestamp
+
+    @property
+    def frame_pool(self) -> FramePool | None:
+        """
+        Get the pool of the frame buffers
+
+        Returns:
+            FramePool | None: The pool. None if every frame is a new array
+        """
+        return self._frame_pool
+
+    @frame_pool.setter
+    def frame_pool(self, value: FramePool | None) -> None:
+        """
+        Set the pool of the frame buffers. The sensors that support it read the frames into
+        buffers of the pool, reused once the consumer gives them back with release_frame().
+
+        Args:
+            value (FramePool | None): The pool. None allocates a new array every frame
+        """
+        if value is not None and not isinstance(value, FramePool):
+            raise CameraException("The frame pool must be a FramePool.")
+        self._frame_pool = value
+
+    @property
+    def roi(self) -> tuple[int, int, int, int] | None:
+        """
+        Get the region of interest of the frames
+
+        Returns:
+            tuple | None: (x, y, w, h). None is the full frame
+        """
+        return self._roi
+
+    @roi.setter
+    def roi(self, value: tuple[int, int, int, int] | None) -> None:
+        """
+        Set the region of interest of the frames
+
+        Args:
+            value (tuple | None): (x, y, w, h). None is the full frame
+        """
+        if value is None:
+            self._roi = None
+            return
+        try:
+            self._roi = validate_roi(value, self._resolution)
+        except ValueError as e:
+            raise CameraException(str(e)) from e
+
     # ----- protected methods
 
+    def _check_capture_resolution(self, capture_resolution: tuple[int, int]) -> None:
+        """
+        Keep the resolution negotiated with the device and warn when the frames must be resized in software.
+
+        Args:
+            capture_resolution (tuple): (width, height) delivered by the device.
+        """
+        self._capture_resolution = (int(capture_resolution[0]), int(capture_resolution[1]))
+        if self._capture_resolution != self._resolution:
+            print(f"{self._name}: the device delivers {self._capture_resolution[0]}x{self._capture_resolution[1]}, "
+                  f"frames resized in software to {self._resolution[0]}x{self._resolution[1]}")
+
+    def _acquire_frame(self, shape: tuple[int, ...] | None) -> np.ndarray | None:
+        """
+        Get a buffer of the frame pool to capture, decode or resize into.
+
+        Args:
+            shape (tuple | None): The shape of the frame. None if it is not known yet.
+
+        Returns:
+            np.ndarray | None: The buffer, None without frame pool, so OpenCV allocates the frame.
+        """
+        if self._frame_pool is None or shape is None:
+            return None
+        return self._frame_pool.acquire(shape)
+
     def _is_init(self) -> bool:
         """
         Is camera init.
@@ -390,6 +526,17 @@ class BaseCamera(BaseSensor):
 
     # ----- public methods
 
+    def release_frame(self, frame: np.ndarray | None) -> None:
+        """
+        Give a frame back to the frame pool once it is not used anymore, e.g. after drawing it.
+        The frames that are not from the pool are ignored.
+
+        Args:
+            frame (np.ndarray | None): A frame returned by read().
+        """
+        if self._frame_pool is not None:
+            self._frame_pool.release(frame)
+
     # ----- Not implemented in the base class
 
     def calibrate(self) -> None:
@@ -397,6 +544,41 @@ class BaseCamera(BaseSensor):
         Calibrate the camera
         """
 
+    def configure(self, resolution: tuple[int, int] | None = None, fps: float | None = None,
+                  pixel_format: PixelFormat | None = None) -> None:
+        """
+        Set the capture parameters, negotiated with the device in initialize(). Call it before initialize().
+
+        The cameras ask the device for the resolution, the frame rate and the format, so the frames
+        come out of the hardware ready to use. If the device cannot deliver them, the frames are
+        converted in software.
+
+        Args:
+            resolution (tuple | None): (width, height) of the frames. None keeps the current one.
+            fps (float | None): Frame rate. None keeps the current one.
+            pixel_format (PixelFormat | None): Format of the frames. None keeps the current one.
+
+        Raises:
+            CameraException: If a parameter is not valid or the camera is already initialized.
+        """
+        if self._camera is not None:
+            raise CameraException("Configure the camera before initializing it.")
+        if resolution is not None:
+            if not (isinstance(resolution, (tuple, list)) and len(resolution) == 2 and
+                    all(isinstance(i, int) and i > 0 for i in resolution)):
+                raise CameraException("The resolution must be two positive integers (width, height).")
+            self._resolution = tuple(resolution)
+            # The region of interest must fit in the new resolution
+            self.roi = self._roi
+        if fps is not None:
+            if fps <= 0:
+                raise CameraException("The frame rate must be positive.")
+            self._fps = float(fps)
+        if pixel_format is not None:
+            if not isinstance(pixel_format, PixelFormat):
+                raise CameraException(f"Invalid pixel format: {pixel_format}")
+            self._pixel_format = pixel_format
+
     def initialize(self) -> None:
         """
         Initializes the camera.
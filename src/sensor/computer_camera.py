@@ -2,14 +2,14 @@
 computer_camera.py
 """
 
-# import time
-
+import time
 from pathlib import Path
 import numpy as np
 import cv2
 
 from src.sensor.base_camera import BaseCamera, CameraException
 from src.sensor.sensor_type import SensorType
+from src.sensor.pixel_format import PixelFormat
 
 
 class ComputerCameraException(CameraException):
@@ -50,7 +50,8 @@ class ComputerCamera(BaseCamera):
 
     def __init__(self, name: str = "Computer Camera",
                  photo_path: Path = Path("data/images/samples"), photo_name: str = 'photo',
-                 video_path: Path = Path("data/videos/samples"), video_name: str = 'video'):
+                 video_path: Path = Path("data/videos/samples"), video_name: str = 'video',
+                 camera_id: int = 0, fourcc: str | None = None):
         """
         Initializes the camera object to None.
 
@@ -60,40 +61,118 @@ class ComputerCamera(BaseCamera):
             photo_name (str): The name of the photo.
             video_path (Path): The path to save videos.
             video_name (str): The name of the video.
+            camera_id (int): Index of the webcam, 0 is the default one.
+            fourcc (str | None): Pixel format asked to the webcam, e.g. 'MJPG' for a higher frame rate
+                at high resolutions. None keeps the device default.
         """
-        super().__init__(name, s_type=SensorType.COMPUTER_CAMERA,
+        super().__init__(name, camera_id=camera_id, s_type=SensorType.COMPUTER_CAMERA,
                          photo_path=photo_path, photo_name=photo_name,
                          video_path=video_path, video_name=video_name)
+        self._fourcc = fourcc
+        self._capture_buffer: np.ndarray | None = None   # Decoded frames that need a software conversion
+        self._resize_buffer: np.ndarray | None = None    # Resized BGR frame before the gray conversion
+        self._direct_capture = True
 
     # ----- protected methods
 
+    def _negotiate(self) -> None:
+        """
+        Ask the webcam for the resolution, the frame rate and the pixel format, and read what it accepted.
+        """
+        width, height = self._resolution
+        if self._fourcc is not None:
+            self._camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*self._fourcc))
+        self._camera.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        self._camera.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        if self._fps is not None:
+            self._camera.set(cv2.CAP_PROP_FPS, self._fps)
+
+        self._check_capture_resolution((self._camera.get(cv2.CAP_PROP_FRAME_WIDTH),
+                                        self._camera.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        device_fps = self._camera.get(cv2.CAP_PROP_FPS)
+        if self._fps is not None and device_fps and abs(device_fps - self._fps) > 0.5:
+            print(f"{self._name}: requested {self._fps:.1f} fps, the device delivers {device_fps:.1f} fps")
+        # Straight from the device into the frame, no software conversion
+        self._direct_capture = self._capture_resolution == self._resolution and self._pixel_format == PixelFormat.BGR
+
+    def _convert(self, frame: np.ndarray) -> np.ndarray:
+        """
+        Software fallback: resize the frame and convert it to the pixel format.
+
+        Args:
+            frame (np.ndarray): BGR frame as delivered by the device.
+
+        Returns:
+            np.ndarray: The frame at the resolution and in the pixel format of the camera.
+        """
+        width, height = self._resolution
+        gray = self._pixel_format == PixelFormat.GRAY
+        if (frame.shape[1], frame.shape[0]) != self._resolution:
+            if gray:
+                if self._resize_buffer is None or self._resize_buffer.shape != (height, width, frame.shape[2]):
+                    self._resize_buffer = np.empty((height, width, frame.shape[2]), dtype=frame.dtype)
+                dst = self._resize_buffer
+            else:
+                dst = self._acquire_frame((height, width, frame.shape[2]))
+            frame = cv2.resize(frame, self._resolution, dst=dst)
+        if gray:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._acquire_frame((height, width)))
+        elif frame is self._capture_buffer:
+            # Right size already, but the capture buffer is reused by the next read
+            frame = frame.copy()
+        return frame
+
     # ----- public methods
 
     def initialize(self) -> None:
         """
-        Initializes the computer's webcam using OpenCV.
+        Initializes the computer's webcam using OpenCV and negotiates the capture parameters.
 
         Raises an exception if the camera cannot be opened.
         """
-        self._camera = cv2.VideoCapture(0)  # 0 is the default webcam index
+        self._camera = cv2.VideoCapture(self._camera_id)  # 0 is the default webcam index
         if not self._camera.isOpened():
             raise ComputerCameraException("Error opening computer webcam.")
-        print("Computer webcam initialized.")
+        self._negotiate()
+        print(f"Computer webcam initialized: {self._capture_resolution[0]}x{self._capture_resolution[1]}, "
+              f"{self._camera.get(cv2.CAP_PROP_FPS):.1f} fps, {self._pixel_format.value}.")
 
     def read(self) -> np.ndarray:
         """
         Read a value from the camera.
 
+        The frames are decoded into the frame pool, if any. The software resize and gray
+        conversion only run when the device did not accept the requested parameters.
+
         Returns:
             np.ndarray: The image captured from the camera.
+
+        Raises:
+            ComputerCameraException: If there is an error grabbing the frame.
         """
         # if not self._is_init():
         #     return
-        ret, frame = self._camera.read()
-        frame = cv2.resize(frame, self._resolution)
+        width, height = self._resolution
+        buffer = self._acquire_frame((height, width, 3)) if self._direct_capture else self._capture_buffer
+        ret, frame = self._camera.read(buffer)
         if not ret:
+            if self._direct_capture:
+                self.release_frame(buffer)
             raise ComputerCameraException("Failed to grab frame.")
-        return frame
+        # OpenCV gives no portable sensor timestamp, the grab time is the closest one
+        self._timestamp = time.monotonic()
+        if self._direct_capture and (frame.shape[1], frame.shape[0]) == self._resolution:
+            return frame
+
+        # The device does not deliver the frames as requested
+        if self._direct_capture:
+            self._direct_capture = False
+            self._check_capture_resolution((frame.shape[1], frame.shape[0]))
+            # OpenCV allocated a new array, the pool buffer was not used
+            if frame is not buffer:
+                self.release_frame(buffer)
+        self._capture_buffer = frame
+        return self._convert(frame)
 
     def release(self) -> None:
         """
@@ -0,0 +1,389 @@
+"""
+file_camera.py
+"""
+
+import re
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import cv2
+
+from src.sensor.base_camera import BaseCamera, CameraException
+from src.sensor.sensor_type import SensorType
+from src.sensor.pixel_format import PixelFormat
+from src.pipeline import RingBuffer, BufferClosed
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+class FileCameraException(CameraException):
+    """
+    File Camera Exception
+    """
+
+
+class EndOfStreamException(FileCameraException):
+    """
+    Raised by read() when the source has no more frames and loop playback is disabled.
+    """
+
+
+class FileCamera(BaseCamera):
+    """
+    Camera that replays frames from a file source instead of a device.
+
+    Frames are decoded ahead in a background thread into a bounded buffer. read() can
+    pace the frames at the source frame rate (real-time mode) or return them as fast
+    as they are decoded, and the playback can loop forever.
+
+    Subclasses implement _open(), _decode(), _rewind() and _close().
+
+    Attributes:
+        _source (Path): The video file or image directory.
+        _realtime (bool): Pace read() at the source frame rate.
+        _fps (float | None): Frame rate of the source.
+        _loop (bool): Start again at the end of the source.
+        _buffer_size (int): Maximum number of frames decoded ahead.
+        _frame_counter (int): Number of frames returned by read().
+    """
+
+    def __init__(self, source: Path, name: str = "File Camera", s_type: SensorType = SensorType.VIDEO_FILE,
+                 realtime: bool = True, fps: float | None = None, loop: bool = False, buffer_size: int = 8):
+        """
+        Initializes the camera object.
+
+        Args:
+            source (Path): The video file or image directory.
+            name (str): The name of the camera.
+            s_type (SensorType): The type of the camera.
+            realtime (bool): Pace read() at the source frame rate. False returns frames as fast as possible.
+            fps (float | None): Frame rate of the source. None uses the rate stored in the source.
+            loop (bool): Start again at the end of the source.
+            buffer_size (int): Maximum number of frames decoded ahead.
+        """
+        super().__init__(name, s_type=s_type)
+        self._source = Path(source)
+        self._realtime = realtime
+        self._fps = fps
+        self._loop = loop
+        self._buffer_size = buffer_size
+
+        self._buffer: RingBuffer | None = None
+        self._decode_thread: threading.Thread | None = None
+        self._stop_event = threading.Event()
+        self._decode_exception: BaseException | None = None
+
+        self._frame_counter = 0
+        self._start_time: float | None = None
+
+    # ----- Properties
+
+    @property
+    def source(self) -> Path:
+        """
+        Get the source of the frames
+
+        Returns:
+            Path: The video file or image directory
+        """
+        return self._source
+
+    @property
+    def fps(self) -> float | None:
+        """
+        Get the frame rate of the source
+
+        Returns:
+            float | None: The frame rate, None before initialize()
+        """
+        return self._fps
+
+    @property
+    def frame_counter(self) -> int:
+        """
+        Get the number of frames read
+
+        Returns:
+            int: The number of frames returned by read()
+        """
+        return self._frame_counter
+
+    # ----- protected methods
+
+    def _open(self) -> float | None:
+        """
+        Open the source.
+
+        Returns:
+            float | None: The frame rate stored in the source, if any.
+        """
+        raise NotImplementedError
+
+    def _decode(self) -> np.ndarray | None:
+        """
+        Decode the next frame.
+
+        Returns:
+            np.ndarray | None: The next frame, None at the end of the source.
+        """
+        raise NotImplementedError
+
+    def _rewind(self) -> None:
+        """
+        Go back to the first frame of the source.
+        """
+        raise NotImplementedError
+
+    def _close(self) -> None:
+        """
+        Close the source.
+        """
+
+    def _decode_loop(self) -> None:
+        """
+        Decode frames ahead into the buffer until the end of the source or release().
+        """
+        try:
+            decoded_since_rewind = 0
+            while not self._stop_event.is_set():
+                frame = self._decode()
+                if frame is None:
+                    if self._loop and decoded_since_rewind > 0:
+                        self._rewind()
+                        decoded_since_rewind = 0
+                        continue
+                    break
+                decoded_since_rewind += 1
+
+                # The decoded frame goes back to the pool once converted
+                if (frame.shape[1], frame.shape[0]) != self._resolution:
+                    decoded = frame
+                    frame = cv2.resize(frame, self._resolution, dst=self._acquire_frame(
+                        (self._resolution[1], self._resolution[0]) + frame.shape[2:]))
+                    self.release_frame(decoded)
+                if self._pixel_format == PixelFormat.GRAY and frame.ndim == 3:
+                    decoded = frame
+                    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self._acquire_frame(frame.shape[:2]))
+                    self.release_frame(decoded)
+
+                while not self._buffer.put(frame, timeout=0.5):
+                    if self._stop_event.is_set() or self._buffer.closed:
+                        return
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            self._decode_exception = e
+        finally:
+            self._buffer.close()
+
+    def _wait_frame_time(self) -> None:
+        """
+        Sleep until the time of the current frame in real-time mode.
+        """
+        delay = self._start_time + self._frame_counter / self._fps - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    # ----- public methods
+
+    def initialize(self) -> None:
+        """
+        Opens the source and starts decoding frames ahead.
+
+        Raises:
+            FileCameraException: If the source cannot be opened.
+        """
+        if not self._source.exists():
+            raise FileCameraException(f"Source not found: {self._source}")
+        source_fps = self._open()
+        if self._fps is None:
+            self._fps = source_fps if source_fps else 30.0
+
+        self._stop_event.clear()
+        self._decode_exception = None
+        self._frame_counter = 0
+        self._start_time = None
+        self._buffer = RingBuffer(maxsize=self._buffer_size)
+        self._decode_thread = threading.Thread(target=self._decode_loop, name=f'{self._name} decoder', daemon=True)
+        self._decode_thread.start()
+        print(f"{self._name} initialized: {self._source} ({self._fps:.2f} fps)")
+
+    def read(self) -> np.ndarray:
+        """
+        Read the next frame of the source.
+
+        Returns:
+            np.ndarray: The next frame.
+
+        Raises:
+            FileCameraException: If the camera is not initialized or the source cannot be decoded.
+            EndOfStreamException: If there are no more frames.
+        """
+        if self._buffer is None:
+            raise FileCameraException("Camera not initialized.")
+        try:
+            frame = self._buffer.get()
+        except BufferClosed as e:
+            if self._decode_exception is not None:
+                raise FileCameraException(f"Error decoding {self._source}") from self._decode_exception
+            raise EndOfStreamException(f"End of {self._source}") from e
+
+        if self._start_time is None:
+            self._start_time = time.monotonic()
+        if self._realtime:
+            self._wait_frame_time()
+        # Time of the frame in the source. Also as fast as possible, the speeds are the ones of the recording
+        self._timestamp = self._start_time + self._frame_counter / self._fps
+        self._frame_counter += 1
+        return frame
+
+    def release(self) -> None:
+        """
+        Stops the decoder and releases the source.
+        """
+        self._stop_event.set()
+        if self._buffer is not None:
+            self._buffer.close()
+        if self._decode_thread is not None:
+            self._decode_thread.join()
+            self._decode_thread = None
+        self._buffer = None
+        if self._camera is not None:
+            self._close()
+            self._camera = None
+            print(f"File Camera ({self._name}) released.")
+
+
+class VideoFileCamera(FileCamera):
+    """
+    Camera that replays a video file.
+    """
+
+    def __init__(self, source: Path, name: str = "Video File Camera", realtime: bool = True,
+                 fps: float | None = None, loop: bool = False, buffer_size: int = 8):
+        """
+        Initializes the camera object.
+
+        Args:
+            source (Path): The video file.
+            name (str): The name of the camera.
+            realtime (bool): Pace read() at the video frame rate. False returns frames as fast as possible.
+            fps (float | None): Frame rate. None uses the frame rate of the video.
+            loop (bool): Start again at the end of the video.
+            buffer_size (int): Maximum number of frames decoded ahead.
+        """
+        super().__init__(source, name=name, s_type=SensorType.VIDEO_FILE, realtime=realtime,
+                         fps=fps, loop=loop, buffer_size=buffer_size)
+        self._frame_shape: tuple[int, ...] | None = None
+
+    def _open(self) -> float | None:
+        """
+        Open the video file.
+
+        Returns:
+            float | None: The frame rate of the video, None if it is not stored.
+        """
+        self._camera = cv2.VideoCapture(str(self._source))
+        if not self._camera.isOpened():
+            raise FileCameraException(f"Error opening video file: {self._source}")
+        self._check_capture_resolution((self._camera.get(cv2.CAP_PROP_FRAME_WIDTH),
+                                        self._camera.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        return self._camera.get(cv2.CAP_PROP_FPS) or None
+
+    def _decode(self) -> np.ndarray | None:
+        """
+        Decode the next frame of the video.
+
+        Returns:
+            np.ndarray | None: The next frame, None at the end of the video.
+        """
+        # Decoded in place when the buffer has the size of the video
+        buffer = self._acquire_frame(self._frame_shape)
+        ret, frame = self._camera.read(buffer)
+        if frame is not buffer:
+            self.release_frame(buffer)
+        if not ret:
+            return None
+        self._frame_shape = frame.shape
+        return frame
+
+    def _rewind(self) -> None:
+        """
+        Go back to the first frame of the video.
+        """
+        self._camera.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+    def _close(self) -> None:
+        """
+        Release the video file.
+        """
+        self._camera.release()
+
+
+class ImageSequenceCamera(FileCamera):
+    """
+    Camera that replays the images of a directory, in natural filename order
+    (sample_2.png before sample_10.png).
+    """
+
+    def __init__(self, source: Path, name: str = "Image Sequence Camera", realtime: bool = True,
+                 fps: float | None = None, loop: bool = False, buffer_size: int = 8):
+        """
+        Initializes the camera object.
+
+        Args:
+            source (Path): The image directory.
+            name (str): The name of the camera.
+            realtime (bool): Pace read() at fps. False returns frames as fast as possible.
+            fps (float | None): Frame rate. None uses 30 fps.
+            loop (bool): Start again at the end of the sequence.
+            buffer_size (int): Maximum number of frames decoded ahead.
+        """
+        super().__init__(source, name=name, s_type=SensorType.IMAGE_SEQUENCE, realtime=realtime,
+                         fps=fps, loop=loop, buffer_size=buffer_size)
+        self._index = 0
+
+    @staticmethod
+    def _natural_key(path: Path) -> list:
+        """
+        Sort key that compares the numbers of the filename by value.
+        """
+        return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', path.name)]
+
+    def _open(self) -> float | None:
+        """
+        List the images of the directory.
+
+        Returns:
+            float | None: None, an image sequence has no frame rate.
+        """
+        if not self._source.is_dir():
+            raise FileCameraException(f"Image sequence source must be a directory: {self._source}")
+        self._camera = sorted((path for path in self._source.iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS),
+                              key=self._natural_key)
+        if not self._camera:
+            raise FileCameraException(f"No images found in {self._source}")
+        self._index = 0
+        return None
+
+    def _decode(self) -> np.ndarray | None:
+        """
+        Read the next image, the unreadable ones are skipped.
+
+        Returns:
+            np.ndarray | None: The next image, None after the last one.
+        """
+        while self._index < len(self._camera):
+            path = self._camera[self._index]
+            self._index += 1
+            frame = cv2.imread(str(path))
+            if frame is not None:
+                return frame
+            print(f"Skipping unreadable image: {path}")
+        return None
+
+    def _rewind(self) -> None:
+        """
+        Go back to the first image.
+        """
+        self._index = 0
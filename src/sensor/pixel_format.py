@@ -0,0 +1,17 @@
+"""
+PixelFormat is an enumeration of the pixel formats of the frames returned by the cameras.
+"""
+
+from enum import Enum
+
+
+class PixelFormat(Enum):
+    """
+    PixelFormat is an enumeration of the pixel formats that a camera can deliver.
+
+    BGR: 3 channels, the order used by OpenCV. Needed to classify the pieces by color.
+    GRAY: 1 channel, luminance only. The RPi camera delivers the Y plane of its YUV420
+        stream without any conversion, the other cameras convert in software.
+    """
+    BGR = "bgr"
+    GRAY = "gray"
@@ -6,10 +6,11 @@ import platform
 import time
 from pathlib import Path
 import numpy as np
-# import cv2
+import cv2
 
 from src.sensor.base_camera import BaseCamera, CameraException
 from src.sensor.sensor_type import SensorType
+from src.sensor.pixel_format import PixelFormat
 
 # Check if the operating system is Linux
 if platform.system() != "Linux":
@@ -74,12 +75,28 @@ class RPiCamera(BaseCamera):
 
     # ----- protected methods
 
+    def _get_main_stream(self) -> dict:
+        """
+        Get the main stream asked to the ISP: the frames are scaled and converted in hardware.
+
+        RGB888 is stored in BGR order, as OpenCV expects. For gray frames the YUV420 stream is
+        used and read() returns its Y plane, without any conversion.
+
+        Returns:
+            dict: The picamera2 main stream configuration.
+        """
+        pixel_format = "YUV420" if self._pixel_format == PixelFormat.GRAY else "RGB888"
+        return {"format": pixel_format, "size": self._resolution, "preserve_ar": False}
+
     # ----- public methods
 
     def initialize(self) -> None:
         """
         Initializes the rpi's webcam using OpenCV.
 
+        The resolution, the pixel format and the frame rate are configured in the camera, the
+        frames are only resized in software if the ISP does not deliver the requested size.
+
         Raises:
             RPiCameraException: If there is an error opening the rpi's cam.
         """
@@ -89,10 +106,14 @@ class RPiCamera(BaseCamera):
         #                                                           sensor={"output_size": mode['size'],
         #                                                                 "bit_depth": mode['bit_depth']})
         # camera_config = self._camera.create_preview_configuration(main={"size": (640, 480)})
-        camera_config = self._camera.create_video_configuration(main={"format": "RGB888", "size": self._resolution, "preserve_ar": False},
-                                                                controls = {"NoiseReductionMode": 0, "FrameDurationLimits": (33333, 33333)})
+        frame_duration = int(1e6 / (self._fps or 30))     # us
+        controls = {"NoiseReductionMode": 0, "FrameDurationLimits": (frame_duration, frame_duration)}
+        camera_config = self._camera.create_video_configuration(main=self._get_main_stream(), controls=controls)
+        # The ISP may align the size
+        self._camera.align_configuration(camera_config)
         print(camera_config)
         self._camera.configure(camera_config)
+        self._check_capture_resolution(camera_config["main"]["size"])
 
         # Controls
         self._camera.set_controls({
@@ -117,14 +138,28 @@ class RPiCamera(BaseCamera):
 
     def read(self) -> np.ndarray:
         """
-        Read a value from the rpi's camera.
+        Read a value from the rpi's camera, with the sensor timestamp of the frame (timestamp property).
 
         Returns:
             np.ndarray: The image frame from the camera.
         """
         # if not self._is_init():
         #     return
-        frame = self._camera.capture_array()
+        request = self._camera.capture_request()
+        try:
+            frame = request.make_array("main")
+            # Start of the exposure in ns, kernel monotonic clock (the time.monotonic() clock)
+            sensor_timestamp = request.get_metadata().get("SensorTimestamp")
+        finally:
+            request.release()
+        self._timestamp = sensor_timestamp / 1e9 if sensor_timestamp is not None else time.monotonic()
+        capture_width, capture_height = self._capture_resolution
+        if self._pixel_format == PixelFormat.GRAY:
+            # Y plane of the YUV420 frame, a view
+            frame = frame[:capture_height, :capture_width]
+        if self._capture_resolution != self._resolution:
+            frame = cv2.resize(frame, self._resolution, dst=self._acquire_frame(
+                (self._resolution[1], self._resolution[0]) + frame.shape[2:]))
         return frame
 
     # Deprecated (with opencv is more efficient and compatible with other cameras)
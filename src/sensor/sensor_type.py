@@ -14,6 +14,8 @@ class SensorType(Enum):
     CAMERA = "camera"
     COMPUTER_CAMERA = "computer_camera"
     RPI_CAMERA = "rpi_camera"
+    VIDEO_FILE = "video_file"
+    IMAGE_SEQUENCE = "image_sequence"
     DENSITY_SENSOR = "density_sensor"
 
 
@@ -0,0 +1,374 @@
+"""
+threaded_camera.py
+"""
+
+import threading
+import time
+from typing import NamedTuple
+import numpy as np
+
+from src.sensor.base_camera import BaseCamera, CameraException
+from src.sensor.pixel_format import PixelFormat
+from src.pipeline import RingBuffer, BufferClosed, BufferEmpty
+from src.buffer_pool import FramePool
+
+
+class ThreadedCameraException(CameraException):
+    """
+    Threaded Camera Exception
+    """
+
+
+class FrameTimeoutException(ThreadedCameraException):
+    """
+    Raised when no new frame is captured before the timeout.
+    """
+
+
+class CapturedFrame(NamedTuple):
+    """
+    A frame and its capture metadata.
+
+    Attributes:
+        frame (np.ndarray): The frame.
+        sequence (int): Number of the frame since initialize(), starting at 1. A gap between two
+            consecutive reads is the number of frames dropped.
+        timestamp (float): Capture time of the frame given by the camera (its timestamp property),
+            time.monotonic() clock.
+    """
+    frame: np.ndarray
+    sequence: int
+    timestamp: float
+
+
+class ThreadedCamera(BaseCamera):
+    """
+    Wrapper that captures the frames of any camera in a background thread.
+
+    The capture thread grabs frames as fast as the device delivers them into a small ring
+    buffer that drops the oldest frame when full, so the device never waits for the
+    detector and the detector does not wait for the device. read_latest() returns the
+    freshest frame and skips the older ones, read_next() returns the frames in order.
+
+    The wrapper is configured like the wrapped camera: configure(), roi and frame_pool are
+    forwarded to it. The frame pool must hold the frames of the ring buffer as well, the
+    dropped frames are given back to it.
+
+    Attributes:
+        _camera (BaseCamera): The wrapped camera.
+        _buffer_size (int): Maximum number of frames captured ahead.
+        _latest (bool): read() returns the freshest frame (read_latest) instead of the next one (read_next).
+        _timeout (float | None): Maximum time read() waits for a frame. None waits forever.
+        _captured (int): Number of frames captured.
+        _delivered (int): Number of frames returned to the caller.
+        _last_frame (CapturedFrame | None): The last frame returned to the caller.
+    """
+
+    def __init__(self, camera: BaseCamera, buffer_size: int = 2, latest: bool = True,
+                 timeout: float | None = 5.0):
+        """
+        Initializes the wrapper. The wrapped camera is initialized by initialize().
+
+        Args:
+            camera (BaseCamera): The camera to capture from.
+            buffer_size (int): Maximum number of frames captured ahead. The oldest is dropped when full.
+            latest (bool): read() returns the freshest frame. False returns every frame in order,
+                unless the buffer overflows.
+            timeout (float | None): Maximum time read() waits for a frame. None waits forever.
+        """
+        if not isinstance(camera, BaseCamera):
+            raise ThreadedCameraException("The wrapped sensor must be a camera.")
+        super().__init__(camera.name, camera_id=camera.camera_id, s_type=camera.type,
+                         photo_path=camera.photo_path, photo_name=camera.photo_name,
+                         video_path=camera.video_path, video_name=camera.video_name)
+        self._camera = camera
+        self._buffer_size = buffer_size
+        self._latest = latest
+        self._timeout = timeout
+
+        self._buffer: RingBuffer | None = None
+        self._capture_thread: threading.Thread | None = None
+        self._stop_event = threading.Event()
+        self._capture_exception: BaseException | None = None
+
+        self._captured = 0
+        self._delivered = 0
+        self._last_frame: CapturedFrame | None = None
+
+    # ----- Properties, forwarded to the wrapped camera
+
+    @property
+    def camera(self) -> BaseCamera:
+        """
+        Get the wrapped camera
+
+        Returns:
+            BaseCamera: The wrapped camera
+        """
+        return self._camera
+
+    @property
+    def resolution(self) -> tuple[int, int]:
+        """
+        Get the (width, height) of the frames of the wrapped camera
+        """
+        return self._camera.resolution
+
+    @property
+    def fps(self) -> float | None:
+        """
+        Get the frame rate of the wrapped camera. None is the device default
+        """
+        return self._camera.fps
+
+    @property
+    def pixel_format(self) -> PixelFormat:
+        """
+        Get the pixel format of the frames of the wrapped camera
+        """
+        return self._camera.pixel_format
+
+    @property
+    def capture_resolution(self) -> tuple[int, int] | None:
+        """
+        Get the (width, height) delivered by the device of the wrapped camera. None before initialize()
+        """
+        return self._camera.capture_resolution
+
+    @property
+    def frame_pool(self) -> FramePool | None:
+        """
+        Get the pool of the frame buffers of the wrapped camera
+        """
+        return self._camera.frame_pool
+
+    @frame_pool.setter
+    def frame_pool(self, value: FramePool | None) -> None:
+        """
+        Set the pool of the frame buffers of the wrapped camera
+        """
+        self._camera.frame_pool = value
+
+    @property
+    def roi(self) -> tuple[int, int, int, int] | None:
+        """
+        Get the region of interest (x, y, w, h) of the wrapped camera. None is the full frame
+        """
+        return self._camera.roi
+
+    @roi.setter
+    def roi(self, value: tuple[int, int, int, int] | None) -> None:
+        """
+        Set the region of interest (x, y, w, h) of the wrapped camera. None is the full frame
+        """
+        self._camera.roi = value
+
+    # ----- Capture statistics
+
+    @property
+    def captured(self) -> int:
+        """
+        Get the number of frames captured
+
+        Returns:
+            int: The number of frames captured since initialize()
+        """
+        return self._captured
+
+    @property
+    def delivered(self) -> int:
+        """
+        Get the number of frames returned by the reads
+
+        Returns:
+            int: The number of frames returned since initialize()
+        """
+        return self._delivered
+
+    @property
+    def dropped(self) -> int:
+        """
+        Get the number of frames captured but never returned: overwritten in the ring buffer
+        or skipped by read_latest()
+
+        Returns:
+            int: The number of dropped frames
+        """
+        return self._buffer.dropped if self._buffer is not None else 0
+
+    @property
+    def pending(self) -> int:
+        """
+        Get the number of frames captured and not read yet
+
+        Returns:
+            int: The number of frames waiting in the ring buffer
+        """
+        return len(self._buffer) if self._buffer is not None else 0
+
+    @property
+    def last_frame(self) -> CapturedFrame | None:
+        """
+        Get the last frame returned by a read, with its sequence number and capture timestamp
+
+        Returns:
+            CapturedFrame | None: The last frame, None before the first read
+        """
+        return self._last_frame
+
+    # ----- protected methods
+
+    def _is_init(self) -> bool:
+        """
+        Is the capture thread started
+        """
+        if self._capture_thread is not None:
+            return True
+        print("Camera not initialized.")
+        return False
+
+    def _capture_loop(self) -> None:
+        """
+        Grab frames into the ring buffer until release() or an error of the camera.
+        """
+        try:
+            while not self._stop_event.is_set():
+                frame = self._camera.read()
+                timestamp = self._camera.timestamp
+                if timestamp is None:
+                    timestamp = time.monotonic()
+                if not self._buffer.put(CapturedFrame(frame, self._captured + 1, timestamp)):
+                    break   # Closed by release()
+                self._captured += 1
+        except BaseException as e:  # pylint: disable=broad-exception-caught
+            # Raised to the reader once the captured frames are read, e.g. the end of a video file
+            self._capture_exception = e
+        finally:
+            self._buffer.close()
+
+    def _get(self, latest: bool, timeout: float | None) -> CapturedFrame:
+        """
+        Get a frame from the ring buffer.
+
+        Args:
+            latest (bool): Get the newest frame and drop the older ones.
+            timeout (float | None): Maximum time to wait. None waits forever.
+
+        Returns:
+            CapturedFrame: The frame.
+
+        Raises:
+            ThreadedCameraException: If the camera is not initialized.
+            FrameTimeoutException: If no frame arrived before the timeout.
+            Exception: The error of the wrapped camera that stopped the capture, once the buffer is empty.
+        """
+        if self._buffer is None:
+            raise ThreadedCameraException("Camera not initialized.")
+        try:
+            captured_frame = self._buffer.get_latest(timeout) if latest else self._buffer.get(timeout)
+        except BufferEmpty as e:
+            raise FrameTimeoutException(f"No frame captured in {timeout} s.") from e
+        except BufferClosed as e:
+            if self._capture_exception is not None:
+                raise self._capture_exception
+            raise ThreadedCameraException("Capture stopped.") from e
+        self._delivered += 1
+        self._last_frame = captured_frame
+        self._timestamp = captured_frame.timestamp
+        return captured_frame
+
+    # ----- public methods
+
+    def calibrate(self) -> None:
+        """
+        Calibrate the wrapped camera
+        """
+        self._camera.calibrate()
+
+    def configure(self, resolution: tuple[int, int] | None = None, fps: float | None = None,
+                  pixel_format: PixelFormat | None = None) -> None:
+        """
+        Set the capture parameters of the wrapped camera. See BaseCamera.configure().
+        """
+        self._camera.configure(resolution=resolution, fps=fps, pixel_format=pixel_format)
+
+    def initialize(self) -> None:
+        """
+        Initializes the wrapped camera and starts the capture thread.
+        """
+        self._camera.initialize()
+        self._stop_event.clear()
+        self._capture_exception = None
+        self._captured = 0
+        self._delivered = 0
+        self._last_frame = None
+        self._timestamp = None
+        self._buffer = RingBuffer(maxsize=self._buffer_size, drop_oldest=True,
+                                  on_drop=lambda captured_frame: self.release_frame(captured_frame.frame))
+        self._capture_thread = threading.Thread(target=self._capture_loop, name=f'{self._name} capture',
+                                                daemon=True)
+        self._capture_thread.start()
+        print(f"{self._name} capturing in a background thread ({self._buffer_size} frames ahead).")
+
+    def read_latest(self, timeout: float | None = None) -> CapturedFrame:
+        """
+        Get the freshest frame not read yet. The older frames in the buffer are dropped.
+        Waits for the next capture if every frame has been read.
+
+        Args:
+            timeout (float | None): Maximum time to wait. None waits forever.
+
+        Returns:
+            CapturedFrame: The frame, its sequence number and its capture timestamp.
+
+        Raises:
+            FrameTimeoutException: If no frame arrived before the timeout.
+        """
+        return self._get(True, timeout)
+
+    def read_next(self, timeout: float | None = None) -> CapturedFrame:
+        """
+        Get the oldest frame not read yet. The frames are only dropped when the buffer overflows.
+
+        Args:
+            timeout (float | None): Maximum time to wait. None waits forever.
+
+        Returns:
+            CapturedFrame: The frame, its sequence number and its capture timestamp.
+
+        Raises:
+            FrameTimeoutException: If no frame arrived before the timeout.
+        """
+        return self._get(False, timeout)
+
+    def read(self) -> np.ndarray:
+        """
+        Read a frame, the freshest one or the next one depending on the `latest` option.
+
+        Returns:
+            np.ndarray: The frame. Its metadata is in last_frame.
+        """
+        return self._get(self._latest, self._timeout).frame
+
+    def release_frame(self, frame: np.ndarray | None) -> None:
+        """
+        Give a frame back to the frame pool of the wrapped camera. See BaseCamera.release_frame().
+        """
+        self._camera.release_frame(frame)
+
+    def release(self) -> None:
+        """
+        Stops the capture thread and releases the wrapped camera.
+        """
+        self._stop_event.set()
+        if self._buffer is not None:
+            self._buffer.close()
+        if self._capture_thread is not None:
+            # The thread stops after the frame being captured
+            self._capture_thread.join(timeout=2.0)
+            if self._capture_thread.is_alive():
+                print(f"{self._name}: the capture thread did not stop.")
+            self._capture_thread = None
+        self._camera.release()
+        print(f"Threaded Camera ({self._name}) released: {self._captured} frames captured, "
+              f"{self._delivered} read, {self.dropped} dropped.")
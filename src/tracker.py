@@ -4,11 +4,10 @@ tracker.py
 
 import numpy as np
 import cv2
-from collections import defaultdict
 # from cv2.typing import MatLike
 
-from src.piece.piece import Piece
-# import src.utils as ut
+from src.piece.piece import Piece, classify_pieces
+import src.utils as ut
 
 
 class Tracker:
@@ -27,9 +26,15 @@ class Tracker:
     """
 
     def __init__(self, x_max: float = 640, y_max: float = 480,
-                 min_area: int = 300, tolerance: float = 0.1):
+                 min_area: int = 300, tolerance: float = 0.1, roi: tuple[int, int, int, int] | None = None,
+                 min_similarity: float = 0.8, classify_every: int = 1):
         """
         Initialize the Tracker instance. TODO
+
+        Args:
+            roi (tuple | None): Belt region of interest (x, y, w, h) in frame coordinates. None is the full frame.
+            min_similarity (float): Gate of the matching. Pairs less similar than this are never matched.
+            classify_every (int): Classify the tracked pieces every N updates. 0 classifies them only on release.
         """
         self._pieces: list[Piece] = []
         self._pieces_all_info: list[tuple[Piece, int]] = []
@@ -49,6 +54,37 @@ class Tracker:
         # Tolerance for y position
         self._tolerance = tolerance
 
+        # Matching gate
+        self._min_similarity = min_similarity
+
+        # Classification period in updates of each piece. 0 = only on release
+        self._classify_every = classify_every
+
+        # Region of interest (x, y, w, h)
+        self._roi = None
+        self.roi = roi
+
+    @property
+    def pieces(self) -> list[Piece]:
+        """
+        Get the tracked pieces. A new list, the pieces themselves are updated by the next update().
+        """
+        return list(self._pieces)
+
+    @property
+    def roi(self) -> tuple[int, int, int, int]:
+        """
+        Get the belt region of interest (x, y, w, h) in frame coordinates.
+        """
+        return self._roi
+
+    @roi.setter
+    def roi(self, roi: tuple[int, int, int, int] | None) -> None:
+        """
+        Set the belt region of interest (x, y, w, h). None is the full frame.
+        """
+        self._roi = ut.validate_roi(roi, (self._x_max, self._y_max))
+
     def get_short_description(self, pieces: list[Piece] | None = None) -> str:
         """
         Get a short description of the Tracker instance.
@@ -68,13 +104,19 @@ class Tracker:
             raise Exception('Piece is already in the list')
 
         piece.id = self._counter
-        piece.update()
+        piece.update(classify=self._must_classify(piece))
         self._pieces.append(piece)
         self._pieces_all_info.append((piece, 0))
         if verbose:
             print(f'ADD {piece.name}({piece.id})')
         self._counter += 1
 
+    def _must_classify(self, piece: Piece) -> bool:
+        """
+        Whether the piece has to be classified in this update, following the classification period.
+        """
+        return self._classify_every > 0 and piece.get_track_length() % self._classify_every == 0
+
     def one_strike(self, piece: Piece, max_strikes: int = 3, verbose: bool = False) -> None:
         """
         Put one strike to a piece
@@ -180,11 +222,14 @@ class Tracker:
         w_y = 0.5
         w_area = 0.2
 
+        # Normalized by the size of the region of interest
+        width, height = self._roi[2], self._roi[3]
+
         # Euclidean distance normalized ponderated
 
-        d = ((w_x * (delta_x / self._x_max) ** 2) +
-             (w_y * (delta_y / self._y_max) ** 2) +
-             (w_area * (delta_area / (self._x_max * self._y_max)) ** 2)
+        d = ((w_x * (delta_x / width) ** 2) +
+             (w_y * (delta_y / height) ** 2) +
+             (w_area * (delta_area / (width * height)) ** 2)
              ) ** 0.5
 
         # print('d', d)
@@ -194,6 +239,80 @@ class Tracker:
 
         return s
 
+    def _calculate_similarity_matrix(self, pieces: list[Piece], new_pieces: list[Piece]) -> np.ndarray:
+        """
+        Calculate the similarity of every tracked piece with every new piece at once.
+
+        Same index as _calculate_similarity, vectorized.
+
+        Args:
+            pieces (list[Piece]): The P tracked pieces.
+            new_pieces (list[Piece]): The N new pieces.
+
+        Returns:
+            np.ndarray: (P, N) similarity matrix.
+        """
+        positions = np.array([piece.get_last_positon() for piece in pieces], dtype=np.float64).reshape(-1, 2)
+        new_positions = np.array([piece.get_last_positon() for piece in new_pieces], dtype=np.float64).reshape(-1, 2)
+        areas = np.array([piece.calculate_area() for piece in pieces], dtype=np.float64)
+        new_areas = np.array([piece.calculate_area() for piece in new_pieces], dtype=np.float64)
+
+        # Normalized weights
+        w_x, w_y, w_area = 0.3, 0.5, 0.2
+        width, height = self._roi[2], self._roi[3]
+
+        delta_x = np.abs(positions[:, 0, None] - new_positions[None, :, 0]) / width
+        delta_y = np.abs(positions[:, 1, None] - new_positions[None, :, 1]) / height
+        delta_area = np.abs(areas[:, None] - new_areas[None, :]) / (width * height)
+
+        d = np.sqrt(w_x * delta_x ** 2 + w_y * delta_y ** 2 + w_area * delta_area ** 2)
+        return 1 - d / (w_x + w_y + w_area) ** 0.5
+
+    def _match(self, pieces: list[Piece], new_pieces: list[Piece]) -> list[tuple[int, int, float]]:
+        """
+        Match tracked pieces with new pieces one to one, maximizing the total similarity.
+
+        Pairs below the similarity gate are not matched.
+
+        Args:
+            pieces (list[Piece]): The tracked pieces.
+            new_pieces (list[Piece]): The new pieces.
+
+        Returns:
+            list[tuple[int, int, float]]: (tracked index, new index, similarity) of every match.
+        """
+        similarity = self._calculate_similarity_matrix(pieces, new_pieces)
+        gated = similarity < self._min_similarity
+        # Gated pairs cost more than any set of valid pairs, so they are only used when there is no other option
+        cost = np.where(gated, len(pieces) + len(new_pieces) + 1.0, 1 - similarity)
+        rows, cols = ut.linear_sum_assignment(cost)
+        return [(int(row), int(col), float(similarity[row, col])) for row, col in zip(rows, cols)
+                if not gated[row, col]]
+
+    def predict(self, timestamp: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the positions of the tracked pieces at a time, from their last position and speed.
+
+        Used between detections, e.g. on the frames skipped by the motion gate. The pieces are not
+        modified. A piece without speed (a single position) stays at its last position. Not thread safe,
+        call it in the thread that updates the tracker.
+
+        Args:
+            timestamp (float): Capture time of the frame, time.monotonic() clock.
+
+        Returns:
+            np.ndarray: (N, 2) predicted position (x, y) of each tracked piece, frame coordinates.
+            np.ndarray: (N, 2) speed (vx, vy) of each tracked piece in pixels/s.
+        """
+        pieces = self._pieces
+        positions = np.array([piece.get_last_positon() for piece in pieces], dtype=np.float64).reshape(-1, 2)
+        speeds = np.array([piece.speed if piece.speed is not None else (0.0, 0.0) for piece in pieces],
+                          dtype=np.float64).reshape(-1, 2)
+        if pieces:
+            elapsed = timestamp - np.array([piece.get_last_time() for piece in pieces], dtype=np.float64)
+            positions += speeds * np.maximum(elapsed, 0)[:, np.newaxis]
+        return positions, speeds
+
     def discard_filters(self, piece: Piece, verbose: bool = False) -> bool:
         """
         Discard piece if it does not pass the filters.
@@ -272,38 +391,34 @@ class Tracker:
             if verbose:
                 print()
 
-            matching_pieces: list[tuple[Piece, Piece, float]] = []
-
-            for piece in self._pieces:
-                new_pieces.sort(key=lambda x, piece=piece: self._calculate_similarity(piece, x), reverse=True)
-                best_piece = new_pieces[0]
-                best_similarity = self._calculate_similarity(piece, best_piece)
-                # if verbose:
-                #     print(f'{piece.name} -> Best match with piece {best_piece.id}:', best_piece.get_last_positon(),
-                #           best_similarity, '%')
-                matching_pieces.append((piece, best_piece, best_similarity))
-
-            matching_pieces.sort(key=lambda x: x[2], reverse=True)
-
-            # # Dict pieces with same new_piece
-            # matching_pieces_dict = defaultdict(list)
-            # for piece, best_piece, best_similarity in matching_pieces:
-            #     matching_pieces_dict[best_piece.id].append(piece.name)
-            # if verbose:
-            #     print(matching_pieces_dict)
+            matched_pieces: set[int] = set()
+            matched_new_pieces: set[int] = set()
+            pieces_to_classify: list[Piece] = []
+
+            # Optimal one to one assignment of the similarity matrix
+            for index, new_index, similarity in self._match(self._pieces, new_pieces):
+                piece, best_piece = self._pieces[index], new_pieces[new_index]
+                piece.update(best_piece, classify=False)
+                if self._must_classify(piece):
+                    pieces_to_classify.append(piece)
+                matched_pieces.add(index)
+                matched_new_pieces.add(new_index)
+                if verbose:
+                    print(f'UPDATE {piece.name}({piece.id}) -> Best match with piece {best_piece.id}:',
+                          best_piece.get_last_positon(), round(similarity, 5), '%')
 
-            # Strike or Merge those pieces
+            # Classify the updated pieces in a single batch
+            classify_pieces(pieces_to_classify)
 
-            for piece, best_piece, best_similarity in matching_pieces:
-                try:
-                    unmatched_new_pieces.remove(best_piece)
-                except ValueError:
+            # Strike the pieces without match. Copy, one_strike can delete pieces
+            for index, piece in enumerate(list(self._pieces)):
+                if index not in matched_pieces:
                     self.one_strike(piece, max_strikes=3, verbose=verbose)  # if strike > 3 del piece
-                else:
-                    piece.update(best_piece)
-                    if verbose:
-                        print(f'UPDATE {piece.name}({piece.id}) -> Best match with piece {best_piece.id}:', 
-                              best_piece.get_last_positon(), round(best_similarity, 5), '%')
+
+            # Keep the detection order of the unmatched pieces
+            matched_new_pieces_ids = {id(new_pieces[new_index]) for new_index in matched_new_pieces}
+            unmatched_new_pieces = [new_piece for new_piece in unmatched_new_pieces
+                                    if id(new_piece) not in matched_new_pieces_ids]
 
             # if verbose:
             #     print()
@@ -331,6 +446,10 @@ class Tracker:
         # Update the list of pieces
         self.delete_pieces(out_of_range_pieces)
 
+        # Final classification of the released pieces, if it was deferred
+        if self._classify_every != 1:
+            classify_pieces(out_of_range_pieces)
+
         if verbose:
             print()
             print('My pieces after updating:', self.get_short_description())
@@ -340,23 +459,31 @@ class Tracker:
             print()
         return out_of_range_pieces
 
-    def draw(self, frame: np.ndarray, track: bool = False) -> None:
+    def draw(self, frame: np.ndarray, track: bool = False, pieces: list[Piece] | None = None) -> None:
         """
         Draw the tracks of the pieces on the image.
 
         Args:
             frame: The image to draw the tracks on.
+            track (bool): Draw or not the track of each piece.
+            pieces (list[Piece] | None): Pieces to draw. By default, the tracked pieces.
         """
+        if pieces is None:
+            pieces = self._pieces
+        roi_x, roi_y, roi_w, roi_h = self._roi
+        # Region of interest
+        if (roi_w, roi_h) != (frame.shape[1], frame.shape[0]):
+            cv2.rectangle(frame, (roi_x, roi_y), (roi_x + roi_w, roi_y + roi_h), (255, 0, 0), 1)
         # Green line. Addition limit
-        start_point = (self._x_addition_limit, 0)
-        end_point = (self._x_addition_limit, frame.shape[0])
+        start_point = (self._x_addition_limit, roi_y)
+        end_point = (self._x_addition_limit, roi_y + roi_h)
         cv2.line(frame, start_point, end_point, (0, 255, 0), 2)
         # Red line. Limit
-        start_point = (self._x_expulsion_limit, 0)
-        end_point = (self._x_expulsion_limit, frame.shape[0])
+        start_point = (self._x_expulsion_limit, roi_y)
+        end_point = (self._x_expulsion_limit, roi_y + roi_h)
         cv2.line(frame, start_point, end_point, (0, 0, 255), 2)
         # Pieces
-        for piece in self._pieces:
+        for piece in pieces:
             piece.draw(frame, track=track)
 
     def __repr__(self) -> str:
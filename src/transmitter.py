@@ -2,31 +2,93 @@
 piece_transmitter.py
 """
 
+import select
 import socket
 import struct
+import threading
+import time
+from enum import Enum
 
 from src.piece.piece import Piece
+from src.protocol import encode_batch, get_max_records
+from src.pipeline import RingBuffer, BufferClosed, BufferEmpty
+
+
+class TransmitterException(Exception):
+    """
+    Transmitter Exception
+    """
 
 
 class Transmitter():
     """
     This class is responsible for transmitting the pieces to the peers.
+
+    The acknowledgements of the peer are pipelined: send_piece() does not wait for the
+    answer of each message. The answers are read when they are available and, if the
+    peer ends each one with ack_delimiter, at most max_in_flight messages wait for it.
     """
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, ack_delimiter: bytes | None = None, max_in_flight: int = 32,
+                 timeout: float = 2.0):
         """
         Constructor
+
+        Args:
+            host (str): Host of the peer.
+            port (int): Port of the peer.
+            ack_delimiter (bytes | None): End of each acknowledgement of the peer. None does not count them.
+            max_in_flight (int): Maximum number of messages without acknowledgement, with ack_delimiter.
+            timeout (float): Timeout of the connection, the sends and the wait for acknowledgements.
         """
         self.host = host
         self.port = port
+        self.ack_delimiter = ack_delimiter
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
 
         self.sock = None
+        self._in_flight = 0
+        self._ack_buffer = b''
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Get the number of messages waiting for an acknowledgement.
+        """
+        return self._in_flight
 
     def initialize(self, multicast: bool = False) -> None:
         """
         Initialize the transmitter
+
+        Raises:
+            TransmitterException: If the peer is not reachable.
+        """
+        self.release()
+        try:
+            self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except OSError as e:
+            raise TransmitterException(f"Cannot connect to {self.host}:{self.port}: {e}") from e
+        self._in_flight = 0
+        self._ack_buffer = b''
+
+    def _read_acks(self, timeout: float) -> None:
         """
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.connect((self.host, self.port))
+        Read the acknowledgements available, waiting at most timeout seconds for the first one.
+        """
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        while readable:
+            response = self.sock.recv(1024)
+            if not response:
+                raise ConnectionError("Connection closed by the peer")
+            if self.ack_delimiter is None:
+                print(f"Received: {response.decode('utf-8', errors='replace')}")
+            else:
+                self._ack_buffer += response
+                acks = self._ack_buffer.count(self.ack_delimiter)
+                self._ack_buffer = self._ack_buffer.rsplit(self.ack_delimiter, 1)[-1]
+                self._in_flight = max(0, self._in_flight - acks)
+            readable, _, _ = select.select([self.sock], [], [], 0)
 
     def send_piece(self, message: bytes) -> None:
         """
@@ -34,35 +96,83 @@ class Transmitter():
 
         Args:
             message (bytes): The piece to send.
-        """
 
+        Raises:
+            TransmitterException: If the transmitter is not connected or the connection fails.
+        """
+        if self.sock is None:
+            raise TransmitterException("Transmitter not connected")
         try:
+            # Window of messages without acknowledgement
+            if self.ack_delimiter is not None and self._in_flight >= self.max_in_flight:
+                self._read_acks(self.timeout)
+                if self._in_flight >= self.max_in_flight:
+                    raise TimeoutError("Peer does not acknowledge the messages")
+
             self.sock.sendall(message)
-            print(f"Sent: {message}")
+            self._in_flight += 1
+
+            # Read the answers already received, without waiting
+            self._read_acks(0)
+        except OSError as e:
+            self.release()
+            raise TransmitterException(f"Connection error: {e}") from e
+
+    def poll(self) -> int:
+        """
+        Nothing is queued, each message is sent by send_piece().
 
-            # Optionally, receive a response
-            response = self.sock.recv(1024).decode("utf-8")
-            print(f"Received: {response}")
+        Returns:
+            int: 0
+        """
+        return 0
 
-        except ConnectionError as e:
-            print(f"Connection error: {e}")
+    def release(self) -> None:
+        """
+        Close the connection.
+        """
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
 
 
 class MulticastTransmitter():
     """
     This class is responsible for transmitting the pieces to the peers using multicast.
+
+    In batch mode the records given to send_piece() are queued and sent together in
+    one framed datagram (see src/protocol.py) by poll() or flush(): all the records of
+    a frame, or all the records queued during batch_window seconds.
     """
-    def __init__(self, mc_host: str, mc_port: int, mc_iface: str = '127.0.0.1'):
+    def __init__(self, mc_host: str, mc_port: int, mc_iface: str = '127.0.0.1',
+                 batch: bool = False, batch_window: float = 0.0):
+        """
+        Constructor
+
+        Args:
+            mc_host (str): Multicast group.
+            mc_port (int): Port.
+            mc_iface (str): Interface address.
+            batch (bool): Send the records in batch datagrams. False sends one bare record per datagram.
+            batch_window (float): Seconds a record can wait for others. 0 sends at the next poll().
+        """
         self.mc_host = mc_host  # dirección de multicast.
         self.mc_port = mc_port
         self.mc_iface = mc_iface    # 'localhost' Interfaz de Red 
 
         self.sock = None
 
+        self.batch = batch
+        self.batch_window = batch_window
+        self._pending: list[bytes] = []
+        self._pending_since: float | None = None
+        self._sequence = 0
+
     def initialize(self):
         """
         Initialize the transmitter
         """
+        self.release()
         # Crear el socket UDP
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
 
@@ -80,6 +190,302 @@ class MulticastTransmitter():
         """
         self.sock.sendto(message, (self.mc_host, self.mc_port))
 
+    @property
+    def sequence(self) -> int:
+        """
+        Get the sequence number of the next batch datagram.
+        """
+        return self._sequence
+
+    def send_piece(self, record: bytes) -> None:
+        """
+        Send the record of a piece. In batch mode it is queued until poll() or flush().
+
+        Args:
+            record (bytes): The packed piece.
+        """
+        if not self.batch:
+            self.send_multicast(record)
+            return
+        # A batch only holds records of one size
+        if self._pending and len(record) != len(self._pending[0]):
+            self.flush()
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.append(record)
+        if len(self._pending) >= get_max_records(len(record)):
+            self.flush()
+
+    def poll(self) -> int:
+        """
+        Send the queued records if the batch window has expired. Call it once per frame.
+
+        Returns:
+            int: Number of datagrams sent.
+        """
+        if not self._pending or time.monotonic() - self._pending_since < self.batch_window:
+            return 0
+        return self.flush()
+
+    def flush(self) -> int:
+        """
+        Send all the queued records now.
+
+        Returns:
+            int: Number of datagrams sent.
+        """
+        if not self._pending:
+            return 0
+        max_records = get_max_records(len(self._pending[0]))
+        datagrams = 0
+        for start in range(0, len(self._pending), max_records):
+            self.send_multicast(encode_batch(self._pending[start:start + max_records], self._sequence))
+            self._sequence += 1
+            datagrams += 1
+        self._pending = []
+        self._pending_since = None
+        return datagrams
+
+    def release(self) -> None:
+        """
+        Send the queued records and close the socket.
+        """
+        if self.sock is not None:
+            self.flush()
+            self.sock.close()
+            self.sock = None
+
+
+class QueuePolicy(Enum):
+    """
+    What AsyncTransmitter.send_piece() does when the send queue is full.
+
+    DROP_OLDEST: Drop the oldest queued piece, the new one is queued.
+    DROP_NEWEST: Drop the new piece.
+    BLOCK: Wait up to block_timeout for space (backpressure), then drop the new piece.
+    """
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    BLOCK = "block"
+
+
+class AsyncTransmitter():
+    """
+    Runs a transmitter (Transmitter or MulticastTransmitter) in its own thread behind a
+    bounded queue, so a slow or stalled peer never stalls the frame processing.
+
+    The thread initializes the transmitter, sends the queued pieces, calls its poll() to
+    flush the batches and reconnects with exponential backoff when a send fails. The
+    piece that failed is sent again after the reconnection.
+    """
+
+    def __init__(self, transmitter: Transmitter | MulticastTransmitter, maxsize: int = 64,
+                 policy: QueuePolicy = QueuePolicy.DROP_OLDEST, block_timeout: float = 0.05,
+                 poll_period: float = 0.005, backoff: tuple[float, float] = (0.1, 5.0)):
+        """
+        Constructor
+
+        Args:
+            transmitter (Transmitter | MulticastTransmitter): The transmitter that sends the pieces.
+            maxsize (int): Maximum number of pieces in the queue.
+            policy (QueuePolicy): What to do when the queue is full.
+            block_timeout (float): Maximum wait of send_piece() with the BLOCK policy.
+            poll_period (float): Period of the calls to the poll() of the transmitter when idle.
+            backoff (tuple[float, float]): Initial and maximum delay between reconnection attempts.
+        """
+        self.transmitter = transmitter
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.poll_period = poll_period
+        self.backoff = backoff
+
+        self._maxsize = maxsize
+        self._queue = self._create_queue()
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+        self._sent = 0
+        self._dropped = 0
+        self._errors = 0
+        self._connected = False
+
+    # ----- Properties
+
+    @property
+    def sent(self) -> int:
+        """
+        Get the number of pieces sent.
+        """
+        return self._sent
+
+    @property
+    def dropped(self) -> int:
+        """
+        Get the number of pieces dropped because the queue was full.
+        """
+        return self._dropped + self._queue.dropped
+
+    @property
+    def errors(self) -> int:
+        """
+        Get the number of failed sends and connections.
+        """
+        return self._errors
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Get the number of pieces waiting in the queue.
+        """
+        return len(self._queue)
+
+    @property
+    def connected(self) -> bool:
+        """
+        Get whether the transmitter is connected.
+        """
+        return self._connected
+
+    # ----- Sender thread
+
+    def _create_queue(self) -> RingBuffer:
+        """
+        Create an empty queue of the pieces to send, release() closes it.
+        """
+        return RingBuffer(maxsize=self._maxsize, drop_oldest=self.policy == QueuePolicy.DROP_OLDEST)
+
+    def _wait(self, delay: float) -> bool:
+        """
+        Wait before a reconnection. Returns True if the transmitter is stopped meanwhile.
+        """
+        return self._stop_event.wait(delay)
+
+    def _connect(self) -> bool:
+        """
+        Initialize the transmitter, retrying with exponential backoff until it connects or stops.
+
+        Returns:
+            bool: True if connected.
+        """
+        delay = self.backoff[0]
+        while not self._stop_event.is_set():
+            try:
+                self.transmitter.initialize()
+            except (TransmitterException, OSError) as e:
+                self._errors += 1
+                print(f"Transmitter connection failed, retry in {delay:.2f} s: {e}")
+                if self._wait(delay):
+                    return False
+                delay = min(delay * 2, self.backoff[1])
+            else:
+                self._connected = True
+                return True
+        return False
+
+    def _send(self, record: bytes) -> None:
+        """
+        Send a record, reconnecting until it is sent or the transmitter stops.
+        """
+        while True:
+            if not self._connected and not self._connect():
+                return
+            try:
+                self.transmitter.send_piece(record)
+            except (TransmitterException, OSError) as e:
+                self._errors += 1
+                self._connected = False
+                print(f"Transmitter send failed: {e}")
+                if self._wait(self.backoff[0]):
+                    return
+            else:
+                self._sent += 1
+                return
+
+    def _run(self) -> None:
+        """
+        Sender loop.
+        """
+        self._connect()
+        while True:
+            try:
+                record = self._queue.get(timeout=self.poll_period)
+            except BufferEmpty:
+                record = None
+            except BufferClosed:
+                break
+            if record is not None:
+                self._send(record)
+            if self._connected:
+                try:
+                    self.transmitter.poll()
+                except (TransmitterException, OSError) as e:
+                    self._errors += 1
+                    self._connected = False
+                    print(f"Transmitter send failed: {e}")
+            if self._stop_event.is_set():
+                break
+
+    # ----- Public methods
+
+    def initialize(self) -> None:
+        """
+        Start the sender thread with an empty queue and the counters at 0. The connection is made
+        in the thread. Can be called again after release(), like the wrapped transmitter.
+        """
+        if self._thread is not None:
+            raise TransmitterException("Transmitter already initialized.")
+        self._queue = self._create_queue()
+        self._sent = 0
+        self._dropped = 0
+        self._errors = 0
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='transmitter', daemon=True)
+        self._thread.start()
+
+    def send_piece(self, record: bytes) -> bool:
+        """
+        Queue a piece to be sent. Never blocks longer than block_timeout.
+
+        Args:
+            record (bytes): The packed piece.
+
+        Returns:
+            bool: True if the piece was queued, False if it was dropped.
+        """
+        timeout = self.block_timeout if self.policy == QueuePolicy.BLOCK else 0
+        if self._queue.put(record, timeout=timeout):
+            return True
+        self._dropped += 1
+        return False
+
+    def poll(self) -> int:
+        """
+        The sender thread polls the transmitter.
+
+        Returns:
+            int: 0
+        """
+        return 0
+
+    def release(self, timeout: float = 1.0) -> None:
+        """
+        Send the queued pieces (waiting at most timeout seconds) and release the transmitter.
+
+        Args:
+            timeout (float): Maximum time to drain the queue.
+        """
+        self._queue.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Stalled peer. Stop retrying, pending pieces are lost
+                self._stop_event.set()
+                self._thread.join()
+            self._thread = None
+        self.transmitter.release()
+        self._connected = False
+        print(f"Transmitter released: {self._sent} sent, {self.dropped} dropped, {self._errors} errors.")
+
 
 class RawPiece():
     def __init__(self, material: int, timestamp_ms: int, speed: float):
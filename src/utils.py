@@ -3,6 +3,7 @@ utils.py
 """
 
 import os
+import time
 from pathlib import Path
 import cv2
 import numpy as np
@@ -83,4 +84,132 @@ def get_distance(p1: tuple, p2: tuple) -> float:
     """
     get distance
     """
-    return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
\ No newline at end of file
+    return ((p1[0] - p2[0]) ** 2 + (p1[1] - p2[1]) ** 2) ** 0.5
+
+
+def monotonic_to_epoch_ms(timestamp: float) -> int:
+    """
+    Convert a time of the monotonic clock (time.monotonic()), e.g. a frame capture time,
+    to Unix epoch milliseconds for the peers.
+
+    Args:
+        timestamp (float): The monotonic time in seconds.
+
+    Returns:
+        int: The epoch time in milliseconds.
+    """
+    # Offset taken now, it follows the adjustments of the wall clock (NTP)
+    return int((timestamp + time.time() - time.monotonic()) * 1000)
+
+
+def validate_roi(roi: tuple[int, int, int, int] | None,
+                 resolution: tuple[int, int]) -> tuple[int, int, int, int]:
+    """
+    Validate a region of interest against the frame resolution.
+
+    Args:
+        roi (tuple | None): (x, y, w, h). None means the full frame.
+        resolution (tuple): (width, height) of the frame.
+
+    Returns:
+        tuple: The region of interest (x, y, w, h).
+
+    Raises:
+        ValueError: If the region of interest is not inside the frame.
+    """
+    if roi is None:
+        return (0, 0, int(resolution[0]), int(resolution[1]))
+    if not (isinstance(roi, tuple) and len(roi) == 4 and all(isinstance(i, int) for i in roi)):
+        raise ValueError("ROI must be a tuple of four integers (x, y, w, h)")
+    x, y, w, h = roi
+    if x < 0 or y < 0 or w <= 0 or h <= 0 or x + w > resolution[0] or y + h > resolution[1]:
+        raise ValueError(f"ROI {roi} is outside the frame {resolution}")
+    return roi
+
+
+def crop_roi(image: np.ndarray, roi: tuple[int, int, int, int] | None) -> np.ndarray:
+    """
+    Crop the region of interest of an image, without copying the pixels.
+
+    Args:
+        image (np.ndarray): The image.
+        roi (tuple | None): (x, y, w, h). None returns the full image.
+
+    Returns:
+        np.ndarray: A view of the region of interest.
+    """
+    if roi is None:
+        return image
+    x, y, w, h = roi
+    return image[y:y + h, x:x + w]
+
+
+def linear_sum_assignment(cost: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Solve the linear sum assignment problem (Hungarian algorithm, shortest augmenting paths).
+
+    Every row is assigned to a different column (or every column to a different row if
+    there are more rows than columns) minimizing the total cost. Same result as
+    scipy.optimize.linear_sum_assignment, the inner loop is vectorized over the columns.
+
+    Args:
+        cost (np.ndarray): (R, C) cost matrix of finite values.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Row indices and their assigned column indices, sorted by row.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.ndim != 2:
+        raise ValueError("Cost matrix must be 2D")
+    if cost.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n_rows, n_cols = cost.shape
+    if n_rows == 1:
+        rows, cols = np.zeros(1, dtype=np.intp), np.array([np.argmin(cost[0])], dtype=np.intp)
+        return (cols, rows) if transposed else (rows, cols)
+
+    # Potentials and matching. Column 0 is a virtual column, p[j] is the row (1-based) of column j
+    u = np.zeros(n_rows + 1)
+    v = np.zeros(n_cols + 1)
+    p = np.zeros(n_cols + 1, dtype=np.intp)
+    way = np.zeros(n_cols + 1, dtype=np.intp)
+
+    for row in range(1, n_rows + 1):
+        p[0] = row
+        j0 = 0
+        min_v = np.full(n_cols + 1, np.inf)
+        used = np.zeros(n_cols + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced_cost = cost[i0 - 1] - u[i0] - v[1:]
+            improved = free & (reduced_cost < min_v[1:])
+            min_v[1:][improved] = reduced_cost[improved]
+            way[1:][improved] = j0
+
+            candidates = np.where(free, min_v[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+
+            u[p[used]] += delta
+            v[used] -= delta
+            min_v[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        # Augmenting path
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
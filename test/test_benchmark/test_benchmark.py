@@ -0,0 +1,48 @@
+"""
+test_benchmark.py
+"""
+
+import json
+
+from src.benchmark import latency_summary, get_sample_videos, replay_video
+
+
+def test_latency_summary():
+    """
+    test
+    """
+    summary = latency_summary([i * 1_000_000 for i in range(1, 101)])
+    assert summary['count'] == 100
+    assert summary['max_ms'] == 100
+    assert abs(summary['p50_ms'] - 50.5) < 1e-6
+    assert latency_summary([]) == {'count': 0}
+    print(summary)
+
+
+def test_replay_video():
+    """
+    test
+    """
+    video_paths = get_sample_videos()
+    if not video_paths:
+        print('No sample videos')
+        return
+    result = replay_video(video_paths[0], max_frames=60)
+    assert result['frames'] == 60
+    assert set(result['stages']) == {'read', 'detect', 'track', 'frame'}
+    assert result['substages']['detect.segment']['count'] == 60
+    # Classified by the tracker, inside the track stage
+    assert result['substages']['classify']['count'] > 0
+    print(json.dumps(result, indent=4))
+
+
+def main():
+    """
+    main
+    """
+    test_latency_summary()
+    test_replay_video()
+
+
+if __name__ == '__main__':
+    main()
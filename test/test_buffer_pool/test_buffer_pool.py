@@ -0,0 +1,125 @@
+"""
+test_buffer_pool.py
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from src.buffer_pool import FramePool, ScratchBuffers
+from src.benchmark import iter_video_frames
+from src.detector.color_detector import ColorDetector
+from src.detector.denoise_method import DenoiseMethod
+from src.sensor.file_camera import VideoFileCamera
+
+VIDEO_PATH = Path('data/videos/samples/full_video_tspeed3_1.mp4')
+
+
+def test_frame_pool_reuse():
+    """
+    test
+    """
+    pool = FramePool(max_size=3)
+    frame_1 = pool.acquire((4, 4, 3))
+    frame_2 = pool.acquire((4, 4, 3))
+    assert frame_1 is not frame_2
+    assert pool.allocations == 2 and pool.in_use == 2
+
+    # Not released, not reused even without references
+    buffer_id = id(frame_1)
+    del frame_1
+    frame_3 = pool.acquire((4, 4, 3))
+    assert id(frame_3) != buffer_id
+    assert pool.allocations == 3
+
+    # A released buffer is reused, views and unpooled arrays are ignored
+    pool.release(frame_2[1:3])
+    pool.release(np.empty((4, 4, 3), dtype=np.uint8))
+    assert pool.in_use == 3
+    pool.release(frame_2)
+    frame_4 = pool.acquire((4, 4, 3))
+    assert frame_4 is frame_2
+    assert pool.allocations == 3
+
+    # Full pool, unpooled frame
+    frame_5 = pool.acquire((4, 4, 3))
+    assert len(pool) == 3 and pool.allocations == 4 and pool.in_use == 3
+    pool.release(frame_5)
+    assert pool.in_use == 3
+    print(frame_3.shape, frame_4.shape, frame_5.shape)
+
+
+def test_scratch_buffers():
+    """
+    test
+    """
+    buffers = ScratchBuffers()
+    buffer = buffers.get('gray', (4, 4))
+    assert buffers.get('gray', (4, 4)) is buffer
+    assert buffers.get('gray', (4, 5)) is not buffer
+    assert buffers.get('labels', (4, 5), np.int32).dtype == np.int32
+    assert buffers.allocations == 3
+
+
+def test_detector_reuse_buffers():
+    """
+    test
+    """
+    if not VIDEO_PATH.exists():
+        print('No sample video')
+        return
+    for method in DenoiseMethod:
+        detector = ColorDetector(min_area=300, denoise_method=method)
+        reuse_detector = ColorDetector(min_area=300, denoise_method=method, reuse_buffers=True)
+        allocations = None
+        for i, frame in enumerate(iter_video_frames(VIDEO_PATH, max_frames=60)):
+            threshold_image, pieces = detector.detect(frame, merge_pieces=False)
+            reuse_threshold_image, reuse_pieces = reuse_detector.detect(frame, merge_pieces=False)
+            assert np.array_equal(threshold_image, reuse_threshold_image), method
+            assert [piece.bbox for piece in pieces] == [piece.bbox for piece in reuse_pieces]
+            if i == 0:
+                allocations = reuse_detector.buffers.allocations
+        # No new buffers in the steady state
+        assert reuse_detector.buffers.allocations == allocations, method
+
+
+def test_file_camera_frame_pool():
+    """
+    test
+    """
+    if not VIDEO_PATH.exists():
+        print('No sample video')
+        return
+    camera = VideoFileCamera(VIDEO_PATH, realtime=False, buffer_size=4)
+    camera.frame_pool = FramePool(max_size=8)
+    camera.initialize()
+    reference = iter_video_frames(VIDEO_PATH, max_frames=100)
+    previous_frames = []
+    for expected in reference:
+        frame = camera.read()
+        assert np.array_equal(frame, expected)
+        # Frames held by the caller are not overwritten, the older ones are released
+        previous_frames = previous_frames + [(frame, frame.copy())]
+        if len(previous_frames) > 2:
+            camera.release_frame(previous_frames.pop(0)[0])
+        for held, copy in previous_frames:
+            assert np.array_equal(held, copy)
+    camera.release()
+    assert len(camera.frame_pool) <= 8
+    # The frames are reused: the decoder runs buffer_size frames ahead of the two held ones
+    assert camera.frame_pool.allocations <= 8
+    print('Pool allocations:', camera.frame_pool.allocations)
+
+
+def main():
+    """
+    main
+    """
+    test_frame_pool_reuse()
+    test_scratch_buffers()
+    test_detector_reuse_buffers()
+    test_file_camera_frame_pool()
+
+
+if __name__ == '__main__':
+    main()
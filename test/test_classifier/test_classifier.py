@@ -0,0 +1,74 @@
+"""
+test_classifier.py
+"""
+
+import numpy as np
+
+from src.classifier import MaterialEn, BgrClassifier, LabClassifier
+from src.piece.piece import Piece, classify_pieces
+from src.utils import bgr_to_lab
+
+
+def test_classify_batch():
+    """
+    test
+    """
+    rng = np.random.default_rng(0)
+    colors_bgr = rng.integers(0, 256, size=(200, 3))
+    for use_lightness in (False, True):
+        indices, distances = LabClassifier.classify_bgr(colors_bgr, use_lightness=use_lightness)
+        assert indices.shape == distances.shape == (200,)
+        for color, index, distance in zip(colors_bgr, indices, distances):
+            material, dist = LabClassifier.which_material(bgr_to_lab(tuple(int(i) for i in color)),
+                                                          use_lightness=use_lightness)
+            assert material == LabClassifier.MATERIALS[index]
+            assert np.isclose(dist, distance)
+
+    indices, distances = BgrClassifier.classify(colors_bgr)
+    for color, index, distance in zip(colors_bgr, indices, distances):
+        material, dist = BgrClassifier.which_material(tuple(color))
+        assert material == BgrClassifier.MATERIALS[index] and np.isclose(dist, distance)
+    print('OK')
+
+
+def test_lightness_weight():
+    """
+    test
+    """
+    references = LabClassifier.REFERENCE_LAB
+    # The reference colors are their own material with any weight
+    for weight in (0.0, 0.5, 1.0):
+        indices, distances = LabClassifier.classify(references, lightness_weight=weight)
+        assert LabClassifier.get_materials(indices) == list(LabClassifier.MATERIALS)
+        assert np.allclose(distances, 0)
+
+    # Only the lightness differs: the distance scales with the weight
+    color = references[:1] + np.array([[10, 0, 0]])
+    assert np.isclose(LabClassifier.get_distances(color, lightness_weight=0.5)[0, 0], 5)
+    assert np.isclose(LabClassifier.get_distances(color, use_lightness=False)[0, 0], 0)
+
+
+def test_classify_pieces():
+    """
+    test
+    """
+    pieces = [Piece(id=i, mean_color=color) for i, color in enumerate([(83, 105, 136), (135, 140, 142)])]
+    classify_pieces(pieces)
+    for piece in pieces:
+        assert piece.category != MaterialEn.UNKNOWN
+        assert piece.name == piece.category.name.lower()
+        assert piece.category == LabClassifier.which_material_bgr(piece.calculate_mean_color())[0]
+    print(pieces)
+
+
+def main():
+    """
+    main
+    """
+    test_classify_batch()
+    test_lightness_weight()
+    test_classify_pieces()
+
+
+if __name__ == '__main__':
+    main()
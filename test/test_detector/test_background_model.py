@@ -0,0 +1,84 @@
+"""
+test_background_model.py
+"""
+
+import numpy as np
+import cv2
+
+from src.detector.background_model import BackgroundModel
+from src.detector.color_detector import ColorDetector
+
+
+def create_frame(x: int, brightness: int) -> np.ndarray:
+    """
+    Dark belt with a bright 40x40 piece at x, the whole frame shifted by brightness.
+    """
+    frame = np.full((120, 260, 3), 40, dtype=np.uint8)
+    cv2.rectangle(frame, (x, 40), (x + 39, 79), (200, 200, 200), thickness=-1)
+    return cv2.add(frame, (brightness, brightness, brightness, 0))
+
+
+def test_update_outside_foreground():
+    """
+    test
+    """
+    model = BackgroundModel(learning_rate=0.5, margin=2)
+    model.update(np.full((20, 20), 50, dtype=np.uint8))
+    assert model.is_initialized() and model.updates == 0
+
+    foreground = np.zeros((20, 20), dtype=np.uint8)
+    foreground[8:12, 8:12] = 255
+    background = model.update(np.full((20, 20), 100, dtype=np.uint8), foreground)
+    # The pieces and their margin are not learnt
+    assert np.all(background[6:14, 6:14] == 50)
+    assert np.all(background[:5] == 75) and np.all(background[:, 15:] == 75)
+
+    # Slowly learnt with a foreground rate
+    model = BackgroundModel(learning_rate=0.5, foreground_rate=0.1, margin=0)
+    model.reset(np.full((20, 20), 50, dtype=np.uint8))
+    background = model.update(np.full((20, 20), 100, dtype=np.uint8), foreground)
+    assert background[10, 10] == 55 and background[0, 0] == 75
+
+    # A new shape restarts the model
+    model.update(np.full((10, 10), 30, dtype=np.uint8))
+    assert model.shape == (10, 10) and np.all(model.background == 30)
+
+
+def test_detector_lighting_drift():
+    """
+    test
+    """
+    static_detector = ColorDetector(thresh=40, min_area=300)
+    adaptive_detector = ColorDetector(thresh=40, min_area=300, background_model=BackgroundModel(learning_rate=0.2))
+    empty_belt = np.full((120, 260, 3), 40, dtype=np.uint8)
+    static_detector.flat_field = empty_belt
+    adaptive_detector.flat_field = empty_belt
+
+    # The piece moves along the belt while the light drifts 48 gray levels
+    for i in range(40):
+        frame = create_frame(x=10 + 5 * i, brightness=int(1.25 * i))
+        _, static_pieces = static_detector.detect(frame, merge_pieces=False)
+        _, adaptive_pieces = adaptive_detector.detect(frame, merge_pieces=False)
+        assert len(adaptive_pieces) == 1
+        x, y, w, h = adaptive_pieces[0].bbox
+        assert abs(x - (10 + 5 * i)) < 8 and abs(y - 40) < 8 and abs(w - 40) < 16 and abs(h - 40) < 16, i
+
+    # The static flat field segments the whole belt
+    assert len(static_pieces) == 1 and static_pieces[0].bbox == (0, 0, 260, 120)
+    assert adaptive_detector.background_model.updates == 40
+
+    # A new flat field restarts the model
+    adaptive_detector.flat_field = empty_belt
+    assert not adaptive_detector.background_model.is_initialized()
+
+
+def main():
+    """
+    main
+    """
+    test_update_outside_foreground()
+    test_detector_lighting_drift()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+"""
+test_detector_utils.py
+"""
+
+import numpy as np
+import cv2
+
+from src.detector import utils as dut
+from src.detector.color_detector import ColorDetector
+from src.detector.denoise_method import DenoiseMethod
+from src.buffer_pool import ScratchBuffers
+
+
+def create_image() -> tuple[np.ndarray, np.ndarray]:
+    """
+    Create a BGR image with three rectangles and its binary image.
+    """
+    image = np.zeros((120, 160, 3), dtype=np.uint8)
+    image[10:30, 10:40] = (10, 20, 30)      # 600 px
+    image[50:60, 100:105] = (200, 100, 50)  # 50 px
+    image[70:110, 20:70] = (90, 180, 250)   # 2000 px
+    binary_image = np.where(image.any(axis=2), 255, 0).astype(np.uint8)
+    return image, binary_image
+
+
+def test_delete_small_labels():
+    """
+    test
+    """
+    _, binary_image = create_image()
+    filtered_image = dut.delete_small_labels(binary_image, min_area=100, verbose=False)
+    num_labels, _, stats, _ = cv2.connectedComponentsWithStats(filtered_image)
+    assert num_labels == 3
+    assert sorted(stats[1:, cv2.CC_STAT_AREA]) == [600, 2000]
+    print('OK')
+
+
+def test_segment_labels():
+    """
+    test
+    """
+    image, _ = create_image()
+    gray_image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    for buffers in (None, ScratchBuffers()):
+        segmentation = dut.segment_labels(gray_image, thresh=5, min_area=100, buffers=buffers)
+        # Same as segment() and a second labeling
+        threshold_image = dut.segment(gray_image, thresh=5, min_area=100)
+        assert np.array_equal(segmentation.threshold_image, threshold_image)
+        num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(threshold_image)
+        assert len(segmentation) == num_labels == 3
+        reference_stats = dut.get_labels_stats(labels, stats, centroids, image)
+        labels_stats = dut.get_labels_stats(segmentation.labels, segmentation.stats, segmentation.centroids, image,
+                                            keep=segmentation.keep)
+        # The background row is not used, the small components are not part of it
+        assert np.array_equal(labels_stats.areas[1:], reference_stats.areas[1:])
+        assert np.array_equal(labels_stats.bboxes[1:], reference_stats.bboxes[1:])
+        assert np.allclose(labels_stats.centroids[1:], reference_stats.centroids[1:])
+        assert np.allclose(labels_stats.color_sums, reference_stats.color_sums)
+
+def test_get_labels_stats():
+    """
+    test
+    """
+    image, binary_image = create_image()
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary_image)
+    labels_stats = dut.get_labels_stats(labels, stats, centroids, image)
+    assert len(labels_stats) == num_labels
+    for label in range(1, num_labels):
+        mean_color = tuple(map(int, labels_stats.mean_colors[label]))
+        assert mean_color == dut.get_mean_color_from_label(label, labels, image)
+        assert tuple(labels_stats.bboxes[label]) == tuple(stats[label, :4])
+    print(labels_stats)
+
+
+def test_reduce_noise_gray():
+    """
+    test
+    """
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 60, size=(240, 320, 3), dtype=np.uint8)
+    cv2.rectangle(image, (100, 80), (179, 159), (200, 220, 240), -1)
+
+    reference = cv2.cvtColor(cv2.GaussianBlur(image, (31, 31), 0), cv2.COLOR_BGR2GRAY)
+    for method, tolerance in [(DenoiseMethod.GAUSSIAN, 0), (DenoiseMethod.GRAY_GAUSSIAN, 1),
+                              (DenoiseMethod.BOX, 6), (DenoiseMethod.PYRAMID, 8)]:
+        denoised = dut.reduce_noise_gray(image, (31, 31), method)
+        assert denoised.shape == reference.shape and denoised.dtype == np.uint8
+        difference = np.abs(denoised.astype(np.int16) - reference).max()
+        print(method, difference)
+        assert difference <= tolerance
+    assert all(width % 2 == 1 for width in dut.get_box_sizes(dut.get_gaussian_sigma(31)))
+
+
+def test_color_detector_roi():
+    """
+    test
+    """
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.rectangle(image, (300, 200), (339, 239), (255, 255, 255), -1)
+    cv2.rectangle(image, (300, 10), (339, 49), (255, 255, 255), -1)     # Outside the belt
+
+    _, pieces = ColorDetector(thresh=100).detect(image, merge_pieces=False)
+    assert len(pieces) == 2
+
+    threshold_image, pieces = ColorDetector(thresh=100, roi=(0, 100, 640, 300)).detect(image, merge_pieces=False)
+    assert threshold_image.shape == (300, 640)
+    assert len(pieces) == 1
+    x, y = pieces[0].get_last_positon()
+    assert abs(x - 319) <= 1 and abs(y - 219) <= 1
+    assert pieces[0].bbox[1] < 219 < pieces[0].bbox[1] + pieces[0].bbox[3]
+    print(pieces[0])
+
+
+def test_get_label_groups():
+    """
+    test
+    """
+    rng = np.random.default_rng(0)
+    grow = 3
+    for _ in range(20):
+        n = int(rng.integers(1, 40))
+        bboxes = np.zeros((n + 1, 4), dtype=np.int32)
+        bboxes[1:, :2] = rng.integers(0, 600, (n, 2))
+        bboxes[1:, 2:] = rng.integers(1, 60, (n, 2))
+        groups = dut.get_label_groups(bboxes, grow)
+
+        # Reference: every pair with the grown rectangle criterion, transitive closure
+        rects = [(x - grow, y - grow, x + w + grow * 2, y + h + grow * 2) for x, y, w, h in bboxes[1:].tolist()]
+        reference = list(range(n))
+        for i in range(n):
+            for j in range(i + 1, n):
+                r1, r2 = rects[i], rects[j]
+                if not (r1[2] < r2[0] or r2[2] < r1[0] or r1[3] < r2[1] or r2[3] < r1[1]):
+                    old, new = max(reference[i], reference[j]), min(reference[i], reference[j])
+                    reference = [new if group == old else group for group in reference]
+        assert groups[0] == 0
+        for i in range(n):
+            for j in range(n):
+                assert (groups[i + 1] == groups[j + 1]) == (reference[i] == reference[j])
+        # Numbered by the first label of the group
+        first_labels = [groups.tolist().index(group) for group in range(1, groups.max() + 1)]
+        assert first_labels == sorted(first_labels)
+
+
+def test_merge_labels_stats():
+    """
+    test
+    """
+    image, binary_image = create_image()
+    # Fragment of the first rectangle, 2 pixels apart
+    image[10:30, 42:50] = (30, 20, 10)
+    binary_image[10:30, 42:50] = 255
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary_image)
+    labels_stats = dut.get_labels_stats(labels, stats, centroids, image)
+    merged_stats = dut.merge_labels_stats(labels_stats, dut.get_label_groups(labels_stats.bboxes))
+    assert num_labels == 5 and len(merged_stats) == 4
+
+    # Same statistics as the joined pixels
+    ys, xs = np.nonzero((labels == 1) | (labels == 2))
+    assert merged_stats.areas[1] == len(xs)
+    assert tuple(merged_stats.bboxes[1]) == (xs.min(), ys.min(), xs.max() - xs.min() + 1, ys.max() - ys.min() + 1)
+    assert np.allclose(merged_stats.centroids[1], (xs.mean(), ys.mean()))
+    assert np.allclose(merged_stats.color_sums[1], image[ys, xs].sum(axis=0))
+    # The other labels do not change
+    assert np.array_equal(merged_stats.areas[2:], labels_stats.areas[3:])
+    assert np.array_equal(merged_stats.bboxes[2:], labels_stats.bboxes[3:])
+
+    # The blur of the detector joins the fragments: larger image, fragment 12 pixels apart
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.rectangle(image, (100, 200), (159, 239), (255, 255, 255), -1)
+    cv2.rectangle(image, (172, 200), (199, 239), (255, 255, 255), -1)
+    _, pieces = ColorDetector(thresh=100).detect(image, merge_pieces=False)
+    _, merged_pieces = ColorDetector(thresh=100).detect(image, merge_pieces=True)
+    assert len(pieces) == 2 and len(merged_pieces) == 1
+    assert merged_pieces[0].calculate_area() == sum(piece.calculate_area() for piece in pieces)
+
+def test_get_scaled_labels_stats():
+    """
+    test
+    """
+    image, _ = create_image()
+    small_image = dut.downscale_gray(image, 2, buffers=ScratchBuffers())
+    assert small_image.shape == (60, 80)
+    _, small_binary_image = cv2.threshold(small_image, 5, 255, cv2.THRESH_BINARY)
+    _, labels, stats, centroids = cv2.connectedComponentsWithStats(small_binary_image)
+    labels_stats = dut.get_scaled_labels_stats(labels, stats, centroids, image, 2)
+
+    # Same as the labels upscaled to full resolution
+    full_labels = labels.repeat(2, axis=0).repeat(2, axis=1)
+    full_stats = np.column_stack([stats[:, :4] * 2, stats[:, 4] * 4])
+    full_centroids = np.array([np.argwhere(full_labels == label)[:, ::-1].mean(axis=0)
+                               for label in range(len(stats))])
+    reference_stats = dut.get_labels_stats(full_labels, full_stats, full_centroids, image)
+    assert np.array_equal(labels_stats.areas, reference_stats.areas)
+    assert np.array_equal(labels_stats.bboxes, reference_stats.bboxes)
+    assert np.allclose(labels_stats.centroids, reference_stats.centroids)
+    assert np.allclose(labels_stats.color_sums, reference_stats.color_sums)
+    # Rectangles aligned with the blocks: same colors as at full resolution
+    assert np.allclose(labels_stats.mean_colors[[1, 3]], [(10, 20, 30), (90, 180, 250)])
+
+    # Odd sizes, the last row and column are dropped
+    assert dut.downscale_gray(image[:119, :159], 4).shape == (29, 39)
+
+
+def test_color_detector_scale():
+    """
+    test
+    """
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    cv2.rectangle(image, (300, 200), (339, 239), (60, 120, 250), -1)
+    cv2.rectangle(image, (100, 50), (179, 89), (200, 200, 200), -1)
+    _, reference_pieces = ColorDetector(thresh=50).detect(image, merge_pieces=False)
+    for scale in (2, 4):
+        threshold_image, pieces = ColorDetector(thresh=50, scale=scale, roi=(0, 0, 640, 300),
+                                                reuse_buffers=True).detect(image, merge_pieces=False)
+        assert threshold_image.shape == (300 // scale, 640 // scale)
+        assert len(pieces) == len(reference_pieces) == 2
+        for piece, reference_piece in zip(pieces, reference_pieces):
+            assert all(abs(a - b) <= scale for a, b in zip(piece.bbox, reference_piece.bbox)), scale
+            assert np.allclose(piece.get_last_positon(), reference_piece.get_last_positon(), atol=scale)
+            # The blurred border of the pieces is segmented by blocks
+            assert np.allclose(piece.calculate_mean_color(), reference_piece.calculate_mean_color(), rtol=0.1)
+            reference_area = reference_piece.calculate_area()
+            assert abs(piece.calculate_area() - reference_area) < 0.1 * reference_area
+
+
+def main():
+    """
+    main
+    """
+    test_delete_small_labels()
+    test_segment_labels()
+    test_get_labels_stats()
+    test_reduce_noise_gray()
+    test_color_detector_roi()
+    test_get_label_groups()
+    test_merge_labels_stats()
+    test_get_scaled_labels_stats()
+    test_color_detector_scale()
+
+
+if __name__ == '__main__':
+    main()
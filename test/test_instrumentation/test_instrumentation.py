@@ -0,0 +1,88 @@
+"""
+test_instrumentation.py
+"""
+
+import numpy as np
+
+from src.instrumentation import Instrumentation, LatencyHistogram
+
+
+def test_histogram_percentiles():
+    """
+    test
+    """
+    histogram = LatencyHistogram()
+    values = np.random.default_rng(0).lognormal(13, 1, 10000).astype(np.int64)
+    for value in values:
+        histogram.record(int(value))
+    assert histogram.count == values.size
+    assert histogram.max == values.max()
+    assert histogram.min == values.min()
+    for percentile in (50, 90, 99):
+        expected = np.percentile(values, percentile)
+        # Relative error of a bucket below 2**-5
+        assert abs(histogram.percentile(percentile) - expected) / expected < 0.04, percentile
+
+    # Small values are exact
+    histogram = LatencyHistogram()
+    for value in range(1, 11):
+        histogram.record(value)
+    assert histogram.percentile(50) == 5
+    assert histogram.percentile(100) == 10
+    print(histogram.summary())
+
+
+def test_histogram_merge():
+    """
+    test
+    """
+    histogram_1, histogram_2 = LatencyHistogram(), LatencyHistogram()
+    for value in range(1000):
+        histogram_1.record(value * 1000)
+        histogram_2.record(value * 2000)
+    histogram_1.merge(histogram_2)
+    assert histogram_1.count == 2000
+    assert histogram_1.max == 999 * 2000
+    histogram_1.reset()
+    assert histogram_1.count == 0 and histogram_1.percentile(50) == 0
+
+
+def test_instrumentation_toggle():
+    """
+    test
+    """
+    instrumentation = Instrumentation()
+    t = instrumentation.start()
+    assert t == 0
+    instrumentation.stop('stage', t)
+    instrumentation.count('dropped')
+    assert instrumentation.summary()['stages'] == {}
+
+    instrumentation.enabled = True
+    for _ in range(10):
+        instrumentation.stop('stage', instrumentation.start())
+    instrumentation.count('dropped', 3)
+    queue = [1, 2]
+    instrumentation.add_gauge('queue', queue.__len__)
+    summary = instrumentation.summary()
+    assert summary['stages']['stage']['count'] == 10
+    assert summary['counters'] == {'dropped': 3}
+    assert summary['gauges'] == {'queue': 2}
+    print(instrumentation.report())
+
+    assert not instrumentation.toggle()
+    instrumentation.stop('stage', instrumentation.start())
+    assert instrumentation.get_histogram('stage').count == 10
+
+
+def main():
+    """
+    main
+    """
+    test_histogram_percentiles()
+    test_histogram_merge()
+    test_instrumentation_toggle()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+test_motion_gate.py
+"""
+
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+from src.motion_gate import MotionGate
+from src.coordinator import PipelineCoordinator
+
+VIDEO_PATH = Path('data/videos/samples/full_video_tspeed3_1.mp4')
+
+
+def create_frame(x: int | None = None) -> np.ndarray:
+    """
+    Dark belt with a bright 40x40 piece at x, no piece if x is None.
+    """
+    frame = np.full((120, 640, 3), 40, dtype=np.uint8)
+    if x is not None:
+        cv2.rectangle(frame, (x, 40), (x + 39, 79), (200, 200, 200), thickness=-1)
+    return frame
+
+
+def test_idle_belt():
+    """
+    test
+    """
+    gate = MotionGate(idle_period=5)
+    detections = [gate.update(create_frame(), timestamp=i / 30) for i in range(11)]
+    # The first frame and then every idle_period frames
+    assert detections == [True] + [False] * 4 + [True] + [False] * 4 + [True]
+    assert gate.detected == 3 and gate.skipped == 8
+
+    gate.reset()
+    assert gate.update(create_frame(), timestamp=1.0)
+
+
+def test_entry_motion():
+    """
+    test
+    """
+    gate = MotionGate(idle_period=30, entry_limit=100)
+    gate.update(create_frame(), timestamp=0.0)
+    # A piece entering the belt, 10 pixels per frame, is detected every frame
+    assert all(gate.update(create_frame(x=10 * i), timestamp=(i + 1) / 30) for i in range(8))
+    # The same motion out of the entry band is detected every max_skip frames
+    gate = MotionGate(max_skip=4, idle_period=30, entry_limit=100)
+    gate.update(create_frame(), timestamp=0.0)
+    detections = [gate.update(create_frame(x=200 + 10 * i), timestamp=(i + 1) / 30) for i in range(8)]
+    assert detections == [False, False, False, True] * 2
+
+
+def test_get_period():
+    """
+    test
+    """
+    gate = MotionGate(max_skip=4, expulsion_limit=540)
+    gate.update(create_frame(), timestamp=0.0)
+    gate.update(create_frame(), timestamp=0.1)
+    speeds = np.array([[100.0, 0.0]])
+    # 10 pixels per frame: far from the limit max_skip, then half the frames to reach it
+    assert gate.get_period(np.array([[100.0, 60.0]]), speeds) == 4
+    assert gate.get_period(np.array([[480.0, 60.0]]), speeds) == 3
+    assert gate.get_period(np.array([[530.0, 60.0]]), speeds) == 1
+    # The nearest piece sets the period
+    assert gate.get_period(np.array([[100.0, 60.0], [510.0, 60.0]]), np.repeat(speeds, 2, axis=0)) == 1
+    assert gate.get_period(np.empty((0, 2)), np.empty((0, 2))) == 4
+
+
+def test_pipeline_predict_pieces():
+    """
+    test
+    """
+    if not VIDEO_PATH.exists():
+        print('No sample video')
+        return
+    coordinator = PipelineCoordinator('video_file', sensor_kwargs={'source': VIDEO_PATH, 'realtime': False})
+    positions, speeds = coordinator._predict_pieces(1.0)
+    assert positions.shape == speeds.shape == (0, 2)
+
+    # State published by the track stage at t = 1, extrapolated to the frames in the buffers
+    coordinator._tracked_motion = (1.0, np.array([[100.0, 60.0]]), np.array([[200.0, 0.0]]))
+    positions, speeds = coordinator._predict_pieces(1.1)
+    assert np.allclose(positions, [[120, 60]]) and np.allclose(speeds, [[200, 0]])
+    positions, _ = coordinator._predict_pieces(0.9)
+    assert np.allclose(positions, [[100, 60]])
+
+
+def main():
+    """
+    main
+    """
+    test_idle_belt()
+    test_entry_motion()
+    test_get_period()
+    test_pipeline_predict_pieces()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,7 +2,13 @@
 test_base_piece.py
 """
 
+import time
+
+import numpy as np
+import cv2
+
 from src.piece.piece import Piece
+from src.detector.color_detector import ColorDetector
 
 
 def test_instances():
@@ -45,6 +51,32 @@ def test_add_position():
     print(piece)
 
 
+def test_capture_timestamp():
+    """
+    test
+    """
+    detector = ColorDetector(thresh=100)
+    pieces = []
+    capture_time = time.monotonic() - 1.0
+    for i in range(2):
+        image = np.zeros((480, 640, 3), dtype=np.uint8)
+        cv2.rectangle(image, (300 + 20 * i, 200), (339 + 20 * i, 239), (255, 255, 255), -1)
+        # Detected late, the samples keep the capture time
+        _, frame_pieces = detector.detect(image, merge_pieces=False, timestamp=capture_time + 0.1 * i)
+        pieces.extend(frame_pieces)
+    piece = pieces[0]
+    piece.update(pieces[1])
+    assert piece.get_last_time() == capture_time + 0.1
+    assert np.allclose(piece._mean_colors.times, piece._positions.times)
+    assert np.allclose(piece.calculate_speed(), (200, 0))
+
+    # Epoch time of the capture, taken now: the first classification can be slow
+    expected_ms = (time.time() - (time.monotonic() - (capture_time + 0.1))) * 1000
+    timestamp_ms = piece.to_record().timestamp_ms
+    assert abs(timestamp_ms - expected_ms) < 50
+    print(piece, timestamp_ms)
+
+
 def main():
     """
     main
@@ -52,6 +84,7 @@ def main():
     test_instances()
     test_add_mean_color()
     test_add_position()
+    test_capture_timestamp()
 
 
 if __name__ == '__main__':
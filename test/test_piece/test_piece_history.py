@@ -0,0 +1,57 @@
+"""
+test_piece_history.py
+"""
+
+import numpy as np
+
+from src.piece.piece import Piece
+from src.piece.piece_history import PieceHistory
+
+
+def test_append_and_grow():
+    """
+    test
+    """
+    history = PieceHistory(2, capacity=2)
+    for i in range(50):
+        history.append(float(i), (i, 2 * i))
+    assert len(history) == 50
+    assert np.array_equal(history.sums, [sum(range(50)), 2 * sum(range(50))])
+    assert np.allclose(history.mean(), [24.5, 49])
+    assert history.get_time(-1) == 49.0
+    assert np.array_equal(history.get_values(0), [0, 0])
+    assert history.values.shape == (50, 2)
+    print(history)
+
+
+def test_piece_compatibility():
+    """
+    test
+    """
+    piece = Piece(id=1, bbox=(0, 0, 10, 10), mean_color=(10, 20, 31), position=(5, 6), area=300)
+    other = Piece(id=2, bbox=(10, 0, 10, 10), mean_color=(11, 21, 30), position=(15, 7), area=401)
+    piece.update(other)
+
+    assert piece.calculate_mean_color() == (10, 20, 30)
+    assert piece.calculate_area() == 350
+    assert piece.get_last_positon() == (15, 7)
+    assert piece.get_last_time() == other.get_last_time()
+    assert [entry['position'] for entry in piece.positions] == [(5, 6), (15, 7)]
+    assert [entry['mean_color'] for entry in piece.mean_colors] == [(10, 20, 31), (11, 21, 30)]
+    assert [entry['area'] for entry in piece.areas] == [300, 401]
+
+    piece.areas = [{'area': 100, 'time': 0.0}]
+    assert piece.calculate_area() == 100
+    print(piece)
+
+
+def main():
+    """
+    main
+    """
+    test_append_and_grow()
+    test_piece_compatibility()
+
+
+if __name__ == '__main__':
+    main()
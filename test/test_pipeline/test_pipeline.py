@@ -0,0 +1,136 @@
+"""
+test_pipeline.py
+"""
+
+import threading
+
+from src.pipeline import RingBuffer, PipelineStage, BufferEmpty, BufferClosed, StageStats
+
+
+def test_ring_buffer_fifo():
+    """
+    test
+    """
+    ring_buffer = RingBuffer(maxsize=3)
+    for i in range(3):
+        assert ring_buffer.put(i)
+    assert not ring_buffer.put(3, timeout=0.01)     # Full, blocking policy
+    assert [ring_buffer.get() for _ in range(3)] == [0, 1, 2]
+    print('OK')
+
+
+def test_ring_buffer_drop_oldest():
+    """
+    test
+    """
+    dropped_items = []
+    ring_buffer = RingBuffer(maxsize=2, drop_oldest=True, on_drop=dropped_items.append)
+    for i in range(5):
+        assert ring_buffer.put(i)
+    assert ring_buffer.dropped == 3 and dropped_items == [0, 1, 2]
+    assert [ring_buffer.get(), ring_buffer.get()] == [3, 4]
+    # get_latest() also drops the older items
+    for i in range(5, 7):
+        ring_buffer.put(i)
+    assert ring_buffer.get_latest() == 6
+    assert ring_buffer.dropped == 4 and dropped_items == [0, 1, 2, 5]
+    try:
+        ring_buffer.get(timeout=0.01)
+        assert False, 'BufferEmpty expected'
+    except BufferEmpty:
+        print('OK')
+
+
+def test_ring_buffer_close():
+    """
+    test
+    """
+    ring_buffer = RingBuffer(maxsize=2)
+    ring_buffer.put('a')
+    ring_buffer.close()
+    assert not ring_buffer.put('b')
+    assert ring_buffer.get() == 'a'
+    try:
+        ring_buffer.get()
+        assert False, 'BufferClosed expected'
+    except BufferClosed:
+        print('OK')
+
+
+def test_pipeline_stages():
+    """
+    test
+    """
+    stop_event = threading.Event()
+    source = iter(range(100))
+    results = []
+
+    def produce(_):
+        try:
+            return next(source)
+        except StopIteration:
+            stop_event.set()
+            return None
+
+    first_buffer = RingBuffer(maxsize=4)
+    second_buffer = RingBuffer(maxsize=4)
+    stages = [
+        PipelineStage('produce', produce, stop_event, output_buffers=[first_buffer]),
+        PipelineStage('square', lambda x: x * x, threading.Event(),
+                      input_buffer=first_buffer, output_buffers=[second_buffer]),
+        PipelineStage('collect', results.append, threading.Event(), input_buffer=second_buffer),
+    ]
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join(timeout=5)
+
+    assert results == [i * i for i in range(100)]
+    assert stages[1].stats.summary()['count'] == 100
+    print(stages[1].stats)
+
+
+def test_stage_exception():
+    """
+    test
+    """
+    stop_event = threading.Event()
+
+    def fail(_):
+        raise RuntimeError('sensor error')
+
+    stage = PipelineStage('fail', fail, stop_event)
+    stage.start()
+    stage.join(timeout=5)
+    assert stop_event.is_set()
+    assert isinstance(stage.exception, RuntimeError)
+    print('OK')
+
+
+def test_stage_stats():
+    """
+    test
+    """
+    stats = StageStats('stage')
+    for i in range(1, 101):
+        stats.record(i / 1000)
+    summary = stats.summary()
+    assert summary['count'] == 100
+    assert abs(summary['p50_ms'] - 50.5) < 1e-6
+    print(stats)
+
+
+def main():
+    """
+    main
+    """
+    test_ring_buffer_fifo()
+    test_ring_buffer_drop_oldest()
+    test_ring_buffer_close()
+    test_pipeline_stages()
+    test_stage_exception()
+    test_stage_stats()
+
+
+if __name__ == '__main__':
+    main()
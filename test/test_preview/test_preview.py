@@ -0,0 +1,101 @@
+"""
+test_preview.py
+"""
+
+import os
+import signal
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+from src.preview import Preview
+from src.coordinator import Coordinator
+from src.piece.piece import Piece
+import src.config_vars as cfv
+
+VIDEO_PATH = Path('data/videos/samples/full_video_tspeed3_1.mp4')
+
+
+def draw(frame: np.ndarray, pieces: list[Piece]) -> None:
+    """
+    Draw a white square per piece.
+    """
+    for piece in pieces:
+        x, y = piece.get_last_positon()
+        frame[y:y + 2, x:x + 2] = 255
+
+
+def test_preview_every():
+    """
+    test
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'preview.png'
+        preview = Preview(draw, every=10, path=path)
+        preview.start()
+        frame = np.zeros((20, 20, 3), dtype=np.uint8)
+        submitted = sum(preview.offer(frame, [Piece(0, mean_color=(0, 0, 0), position=(1, 1))])
+                        for _ in range(100))
+        assert submitted == 10
+        # The frame is copied, the caller can reuse it
+        assert not frame.any()
+
+        preview.request()
+        piece = Piece(1, mean_color=(0, 0, 0), position=(5, 5))
+        assert preview.offer(frame, [piece])
+        assert not preview.offer(frame, [piece])
+        # The drawn state is copied, the caller keeps updating the piece
+        piece.add_position((15, 15))
+        preview.stop()
+        assert 1 <= preview.rendered <= submitted + 1
+        image = cv2.imread(str(path))
+        assert image[5, 5, 0] == 255 and image[15, 15, 0] == 0
+        print('Rendered', preview.rendered)
+
+
+def test_headless_coordinator():
+    """
+    test
+    """
+    if not VIDEO_PATH.exists():
+        print('No sample video')
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'preview.jpg'
+        config = {'PREVIEW_EVERY': 10, 'PREVIEW_PATH': path, 'PREVIEW_WINDOW': False}
+        previous_config = {name: getattr(cfv, name) for name in config}
+        for name, value in config.items():
+            setattr(cfv, name, value)
+        previous_handler = signal.getsignal(signal.SIGTERM)
+        try:
+            coordinator = Coordinator('video_file', sensor_kwargs={'source': VIDEO_PATH, 'realtime': True})
+            # SIGTERM stops the loop before the end of the video
+            timer = threading.Timer(1.0, os.kill, (os.getpid(), signal.SIGTERM))
+            timer.start()
+            start_time = time.monotonic()
+            coordinator.run(headless=True)
+            timer.join()
+            assert time.monotonic() - start_time < 5
+            assert coordinator.stop_event.is_set()
+            assert path.exists()
+            # The previous handlers are restored
+            assert signal.getsignal(signal.SIGTERM) == previous_handler
+        finally:
+            for name, value in previous_config.items():
+                setattr(cfv, name, value)
+
+
+def main():
+    """
+    main
+    """
+    test_preview_every()
+    test_headless_coordinator()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,15 @@
 """
 test_computer_camera.py
 """
+from pathlib import Path
 
+import cv2
 
+from src.buffer_pool import FramePool
 from src.sensor.computer_camera import ComputerCamera, ComputerCameraException
+from src.sensor.pixel_format import PixelFormat
+
+VIDEO_PATH = Path('data/videos/samples/full_video_tspeed3_1.mp4')
 
 
 def test_initialize_camera(ccamera: ComputerCamera) -> None:
@@ -61,10 +67,49 @@ def test_video_recording(ccamera: ComputerCamera) -> None:
         print('NO') 
 
 
+def test_negotiation_fallback() -> None:
+    """
+    test. A video file plays the device, it does not accept the requested resolution.
+    """
+    if not VIDEO_PATH.exists():
+        print('No sample video')
+        return
+    for pixel_format, shape in ((PixelFormat.BGR, (240, 320, 3)), (PixelFormat.GRAY, (240, 320))):
+        ccamera = ComputerCamera()
+        ccamera.configure(resolution=(320, 240), pixel_format=pixel_format)
+        ccamera.frame_pool = FramePool(4)
+        ccamera._camera = cv2.VideoCapture(str(VIDEO_PATH))
+        ccamera._negotiate()
+        assert ccamera.capture_resolution == (640, 480)
+        frames = [ccamera.read() for _ in range(3)]
+        assert all(frame.shape == shape for frame in frames)
+        assert frames[0] is not frames[1]
+        ccamera.release()
+
+    # The device accepts the resolution, frames straight from the device
+    ccamera = ComputerCamera()
+    ccamera._camera = cv2.VideoCapture(str(VIDEO_PATH))
+    ccamera._negotiate()
+    assert ccamera._direct_capture
+    assert ccamera.read().shape == (480, 640, 3)
+    ccamera.release()
+
+    # Failed grab
+    ccamera._camera = cv2.VideoCapture(str(VIDEO_PATH))
+    ccamera._camera.set(cv2.CAP_PROP_POS_FRAMES, ccamera._camera.get(cv2.CAP_PROP_FRAME_COUNT))
+    try:
+        ccamera.read()
+        assert False, 'Read after the end'
+    except ComputerCameraException:
+        print('OK')
+    ccamera.release()
+
+
 def main():
     """
     main
     """
+    test_negotiation_fallback()
     ccamera = ComputerCamera()
     test_initialize_camera(ccamera)
     # test_capture_image(ccamera)
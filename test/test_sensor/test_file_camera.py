@@ -0,0 +1,155 @@
+"""
+test_file_camera.py
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import cv2
+
+from src.factory import SensorFactory
+from src.sensor.sensor_type import SensorType
+from src.sensor.file_camera import EndOfStreamException, FileCameraException
+from src.sensor.base_camera import CameraException
+from src.sensor.pixel_format import PixelFormat
+
+VIDEO_PATH = Path('data/videos/samples/full_video_tspeed3_1.mp4')
+
+
+def read_all(camera) -> int:
+    """
+    Read frames until the end of the stream.
+    """
+    count = 0
+    while True:
+        try:
+            camera.read()
+        except EndOfStreamException:
+            return count
+        count += 1
+
+
+def create_image_sequence(directory: Path, n: int = 12) -> None:
+    """
+    Write n images named sample_0.png ... sample_{n-1}.png.
+    """
+    for i in range(n):
+        image = np.full((48, 64, 3), i, dtype=np.uint8)
+        cv2.imwrite(str(directory / f'sample_{i}.png'), image)
+
+
+def test_video_file_as_fast_as_possible():
+    """
+    test
+    """
+    camera = SensorFactory.create(SensorType.VIDEO_FILE, source=VIDEO_PATH, realtime=False)
+    camera.initialize()
+    count = read_all(camera)
+    camera.release()
+    frames = int(cv2.VideoCapture(str(VIDEO_PATH)).get(cv2.CAP_PROP_FRAME_COUNT))
+    print('Frames:', count, frames)
+    assert abs(count - frames) <= 10
+
+
+def test_image_sequence_order_and_loop():
+    """
+    test
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        create_image_sequence(Path(directory))
+        camera = SensorFactory.create(SensorType.IMAGE_SEQUENCE, source=directory, realtime=False, loop=True)
+        camera.initialize()
+        values = [int(camera.read()[0, 0, 0]) for _ in range(30)]
+        camera.release()
+    assert values == [i % 12 for i in range(30)]
+    print('OK')
+
+
+def test_image_sequence_realtime():
+    """
+    test
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        create_image_sequence(Path(directory), n=11)
+        camera = SensorFactory.create(SensorType.IMAGE_SEQUENCE, source=directory, fps=100)
+        camera.initialize()
+        start_time = time.monotonic()
+        count = read_all(camera)
+        elapsed_time = time.monotonic() - start_time
+        camera.release()
+    print('Frames:', count, 'time:', elapsed_time)
+    assert count == 11
+    assert elapsed_time >= 0.09
+
+
+def test_missing_source():
+    """
+    test
+    """
+    camera = SensorFactory.create(SensorType.VIDEO_FILE, source='data/videos/samples/missing.mp4')
+    try:
+        camera.initialize()
+        assert False, 'FileCameraException expected'
+    except FileCameraException:
+        print('OK')
+
+
+def test_configure_resolution_and_gray():
+    """
+    test
+    """
+    camera = SensorFactory.create(SensorType.VIDEO_FILE, source=VIDEO_PATH, realtime=False)
+    camera.configure(resolution=(320, 240), fps=60, pixel_format=PixelFormat.GRAY)
+    assert camera.fps == 60
+    camera.initialize()
+    assert camera.capture_resolution == (640, 480)
+    frame = camera.read()
+    assert frame.shape == (240, 320)
+    try:
+        camera.configure(resolution=(640, 480))
+        assert False, 'Configured after initialize'
+    except CameraException:
+        pass
+    camera.release()
+
+    camera = SensorFactory.create(SensorType.VIDEO_FILE, source=VIDEO_PATH, realtime=False)
+    for resolution in ((0, 480), (640.0, 480), (640,)):
+        try:
+            camera.configure(resolution=resolution)
+            assert False, resolution
+        except CameraException:
+            pass
+    print('OK')
+
+
+def test_video_file_timestamps():
+    """
+    test
+    """
+    camera = SensorFactory.create(SensorType.VIDEO_FILE, source=VIDEO_PATH, realtime=False, fps=25)
+    camera.initialize()
+    assert camera.timestamp is None
+    timestamps = []
+    for _ in range(10):
+        camera.read()
+        timestamps.append(camera.timestamp)
+    camera.release()
+    # Times of the recording, not of the reads
+    assert np.allclose(np.diff(timestamps), 1 / 25)
+
+def main():
+    """
+    main
+    """
+    test_video_file_as_fast_as_possible()
+    test_image_sequence_order_and_loop()
+    test_image_sequence_realtime()
+    test_missing_source()
+    test_configure_resolution_and_gray()
+    test_video_file_timestamps()
+
+
+if __name__ == '__main__':
+    main()
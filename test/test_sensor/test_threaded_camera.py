@@ -0,0 +1,126 @@
+"""
+test_threaded_camera.py
+"""
+
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.sensor.base_camera import BaseCamera
+from src.sensor.file_camera import VideoFileCamera, EndOfStreamException
+from src.sensor.threaded_camera import ThreadedCamera, FrameTimeoutException
+
+VIDEO_PATH = Path('data/videos/samples/full_video_tspeed3_1.mp4')
+
+
+class FakeCamera(BaseCamera):
+    """
+    Camera that delivers a frame every period seconds, with its number in the pixels.
+    """
+
+    def __init__(self, period: float = 0.005):
+        super().__init__('Fake Camera')
+        self._period = period
+        self._counter = 0
+
+    def initialize(self) -> None:
+        self._camera = True
+
+    def read(self) -> np.ndarray:
+        time.sleep(self._period)
+        self._counter += 1
+        self._timestamp = time.monotonic()
+        return np.full((4, 4, 3), self._counter % 256, dtype=np.uint8)
+
+    def release(self) -> None:
+        self._camera = None
+
+
+def test_read_next_in_order():
+    """
+    test
+    """
+    camera = ThreadedCamera(FakeCamera(), buffer_size=8, latest=False)
+    camera.initialize()
+    frames = [camera.read_next(timeout=1.0) for _ in range(20)]
+    camera.release()
+    assert [captured_frame.sequence for captured_frame in frames] == list(range(1, 21))
+    assert all(int(captured_frame.frame[0, 0, 0]) == captured_frame.sequence for captured_frame in frames)
+    timestamps = [captured_frame.timestamp for captured_frame in frames]
+    assert timestamps == sorted(timestamps)
+    assert camera.dropped == 0
+
+
+def test_read_latest_drops():
+    """
+    test
+    """
+    camera = ThreadedCamera(FakeCamera(period=0.002), buffer_size=2)
+    camera.initialize()
+    sequences = []
+    for _ in range(10):
+        # Slow detector, the capture goes on meanwhile
+        time.sleep(0.02)
+        captured_frame = camera.read_latest(timeout=1.0)
+        sequences.append(captured_frame.sequence)
+        # The freshest frame is at most one capture old
+        assert time.monotonic() - captured_frame.timestamp < 0.015
+    camera.release()
+    assert sequences == sorted(set(sequences))
+    assert sequences[-1] - sequences[0] > 20
+    # Every captured frame is read, dropped or still in the buffer
+    assert camera.captured == camera.delivered + camera.dropped + camera.pending
+    # The gaps between the sequence numbers are the drops seen by the reader
+    assert sequences[-1] - len(sequences) <= camera.dropped
+    print('Captured', camera.captured, 'dropped', camera.dropped)
+
+
+def test_timeout():
+    """
+    test
+    """
+    camera = ThreadedCamera(FakeCamera(period=0.5))
+    camera.initialize()
+    start_time = time.monotonic()
+    try:
+        camera.read_next(timeout=0.05)
+        assert False, 'FrameTimeoutException expected'
+    except FrameTimeoutException:
+        pass
+    assert time.monotonic() - start_time < 0.3
+    camera.release()
+
+
+def test_end_of_stream():
+    """
+    test
+    """
+    if not VIDEO_PATH.exists():
+        print('No sample video')
+        return
+    camera = ThreadedCamera(VideoFileCamera(VIDEO_PATH, realtime=False), buffer_size=64, latest=False)
+    camera.initialize()
+    count = 0
+    try:
+        while True:
+            camera.read()
+            count += 1
+    except EndOfStreamException:
+        pass
+    camera.release()
+    assert count == camera.delivered and count + camera.dropped == camera.captured
+
+
+def main():
+    """
+    main
+    """
+    test_read_next_in_order()
+    test_read_latest_drops()
+    test_timeout()
+    test_end_of_stream()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 """
 test_tracker.py
 """
+import numpy as np
 import cv2
 
 from src.utils import show_image
@@ -89,6 +90,76 @@ def test_update():
     print(result)
 
 
+def create_piece(position: tuple[float, float], area: int = 500, timestamp: float | None = None) -> Piece:
+    """
+    Create a detected piece
+    """
+    piece = Piece(id=0, name='piece', bbox=(int(position[0]) - 10, int(position[1]) - 10, 20, 20), area=area)
+    piece.add_mean_color((100, 100, 100))
+    piece.add_position(position, timestamp=timestamp)
+    return piece
+
+
+def test_update_assignment():
+    """
+    test
+    """
+    tracker = Tracker()
+    tracker.update([create_piece((50, 100)), create_piece((50, 120))])
+    piece_a, piece_b = sorted(tracker._pieces, key=lambda piece: piece.get_last_positon()[1])
+
+    # Both tracked pieces are closest to the first new piece. The one to one
+    # assignment gives the second new piece to piece_b instead of adding a new piece
+    tracker.update([create_piece((60, 112)), create_piece((60, 135))])
+    assert len(tracker._pieces) == 2
+    assert piece_a.get_last_positon() == (60, 112)
+    assert piece_b.get_last_positon() == (60, 135)
+
+    # Gate. A piece too far away is not matched, the tracked pieces get a strike
+    tracker.update([create_piece((60, 470))])
+    assert piece_a.get_last_positon() == (60, 112)
+    assert [strikes for _, strikes in tracker._pieces_all_info] == [1, 1, 0]
+    assert len(tracker._pieces) == 3
+    print(tracker)
+
+
+def test_classify_on_release():
+    """
+    test
+    """
+    tracker = Tracker(classify_every=0)
+    tracker.update([create_piece((50, 100))])
+    piece = tracker._pieces[0]
+    for x in range(150, 550, 100):
+        assert tracker.update([create_piece((x, 100))]) == []
+    assert piece.name == 'piece'    # Not classified yet
+
+    released = tracker.update([create_piece((550, 100))])
+    assert released == [piece]
+    assert piece.name == piece.category.name.lower() != 'unknown'
+    print(piece)
+
+
+def test_predict():
+    """
+    test
+    """
+    tracker = Tracker()
+    positions, speeds = tracker.predict(1.0)
+    assert positions.shape == speeds.shape == (0, 2)
+
+    tracker.update([create_piece((50, 100), timestamp=1.0)])
+    # A single position has no speed, it stays
+    positions, speeds = tracker.predict(2.0)
+    assert np.allclose(positions, [[50, 100]]) and np.allclose(speeds, [[0, 0]])
+
+    tracker.update([create_piece((60, 100), timestamp=1.1)])
+    positions, speeds = tracker.predict(1.3)
+    assert np.allclose(speeds, [[100, 0]]) and np.allclose(positions, [[80, 100]])
+    # The pieces are not modified
+    assert tracker._pieces[0].get_last_positon() == (60, 100)
+
+
 def test_draw():
     """
     test
@@ -142,6 +213,9 @@ def main():
     """
     test_instances()
     test_update()
+    test_update_assignment()
+    test_classify_on_release()
+    test_predict()
     test_draw()
 
 
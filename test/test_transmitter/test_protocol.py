@@ -0,0 +1,120 @@
+"""
+test_protocol.py
+"""
+
+import socket
+import struct
+
+from src.protocol import (BATCH_HEADER, MAX_DATAGRAM_SIZE, BatchReceiver, PieceRecord, ProtocolException,
+                          decode_batch, decode_record, decode_records, encode_batch, encode_record, encode_records,
+                          get_max_records, get_record_size)
+from src.transmitter import MulticastTransmitter
+
+
+def test_encode_decode_batch():
+    """
+    test
+    """
+    records = [struct.pack('<IQf', i, 1000 + i, 1.5) for i in range(5)]
+    datagram = encode_batch(records, sequence=7)
+    assert len(datagram) == BATCH_HEADER.size + 5 * len(records[0])
+
+    header, decoded = decode_batch(datagram)
+    assert header.count == 5 and header.sequence == 7 and header.record_size == len(records[0])
+    assert decoded == records
+
+    for invalid in (datagram[:5], b'XX' + datagram[2:], datagram[:-1]):
+        try:
+            decode_batch(invalid)
+        except ProtocolException as e:
+            print('OK', e)
+        else:
+            raise AssertionError('Invalid datagram decoded')
+
+
+def test_batch_receiver_loss():
+    """
+    test
+    """
+    record = b'\x00' * 16
+
+    receiver = BatchReceiver()
+    for sequence in (0, 1, 4, 5, 5, 3, 6):  # 2 and 3 lost, then a duplicate and a late one
+        receiver.decode(encode_batch([record], sequence))
+    assert receiver.received == 7 and receiver.lost == 2
+
+    receiver = BatchReceiver()
+    for sequence in (2**32 - 2, 2**32 - 1, 1):  # Wrap around, 0 lost
+        receiver.decode(encode_batch([record], sequence))
+    assert receiver.lost == 1
+
+
+def test_multicast_transmitter_batch():
+    """
+    test
+    """
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.settimeout(1)
+
+    transmitter = MulticastTransmitter('127.0.0.1', receiver.getsockname()[1], batch=True, batch_window=10)
+    transmitter.initialize()
+    records = [struct.pack('<IQf', i, i, 0.0) for i in range(get_max_records(16) + 3)]
+    for record in records:
+        transmitter.send_piece(record)
+    assert transmitter.poll() == 0     # Window not expired
+    transmitter.release()              # Flush
+
+    batch_receiver = BatchReceiver()
+    received = []
+    while len(received) < len(records):
+        datagram = receiver.recv(MAX_DATAGRAM_SIZE)
+        assert len(datagram) <= MAX_DATAGRAM_SIZE
+        received += batch_receiver.decode(datagram)
+    assert received == records
+    assert batch_receiver.received == 2 and batch_receiver.lost == 0
+    receiver.close()
+
+
+def test_piece_record():
+    """
+    test
+    """
+    record = PieceRecord(material=2, timestamp_ms=1_760_000_000_123, speed=90.5, piece_id=7, area=1234,
+                         lab=(120, 130, 140), confidence=0.25)
+
+    # Fixed layout, independent of the platform
+    base = encode_record(record)
+    assert len(base) == get_record_size() == 16
+    assert base == struct.pack('<BBHQf', 1, 0, 2, 1_760_000_000_123, 90.5)
+    assert decode_record(base) == PieceRecord(2, 1_760_000_000_123, 90.5)
+
+    extended = encode_record(record, extended=True)
+    assert len(extended) == get_record_size(extended=True) == 32
+    assert decode_record(extended) == record
+
+    # Batch encode after a header, decode from a memoryview of the batch
+    buffer = encode_records([record] * 3, extended=True, offset=BATCH_HEADER.size)
+    assert len(buffer) == BATCH_HEADER.size + 3 * 32
+    assert decode_records(memoryview(buffer)[BATCH_HEADER.size:], 32) == [record] * 3
+
+    try:
+        decode_record(b'\x02' + base[1:])
+    except ProtocolException as e:
+        print('OK', e)
+    else:
+        raise AssertionError('Unsupported version decoded')
+
+
+def main():
+    """
+    main
+    """
+    test_encode_decode_batch()
+    test_batch_receiver_loss()
+    test_multicast_transmitter_batch()
+    test_piece_record()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+test_transmitter.py
+"""
+
+import socket
+import threading
+import time
+
+from src.transmitter import AsyncTransmitter, QueuePolicy, Transmitter, TransmitterException
+
+
+class FakeTransmitter:
+    """
+    Transmitter that fails the first connections and can stall the sends.
+    """
+
+    def __init__(self, failed_connections: int = 0, send_delay: float = 0.0):
+        self.failed_connections = failed_connections
+        self.send_delay = send_delay
+        self.connections = 0
+        self.records: list[bytes] = []
+
+    def initialize(self) -> None:
+        self.connections += 1
+        if self.connections <= self.failed_connections:
+            raise TransmitterException('Peer not available')
+
+    def send_piece(self, record: bytes) -> None:
+        time.sleep(self.send_delay)
+        self.records.append(record)
+
+    def poll(self) -> int:
+        return 0
+
+    def release(self) -> None:
+        pass
+
+
+def test_pipelined_acks():
+    """
+    test
+    """
+    server = socket.create_server(('127.0.0.1', 0))
+    received = []
+
+    def serve():
+        connection, _ = server.accept()
+        with connection:
+            while True:
+                data = connection.recv(1024)
+                if not data:
+                    break
+                received.append(data)
+                time.sleep(0.05)    # Slow peer
+                try:
+                    connection.sendall(b'ok\n' * data.count(b';'))
+                except OSError:     # The transmitter closed the connection
+                    break
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+
+    transmitter = Transmitter('127.0.0.1', server.getsockname()[1], ack_delimiter=b'\n', max_in_flight=4)
+    transmitter.initialize()
+    start_time = time.perf_counter()
+    for _ in range(3):
+        transmitter.send_piece(b'piece;')
+    # The sends do not wait for the acknowledgements
+    assert time.perf_counter() - start_time < 0.05
+    assert transmitter.in_flight > 1
+
+    for _ in range(5):
+        transmitter.send_piece(b'piece;')
+    assert transmitter.in_flight <= 4
+    transmitter.release()
+    thread.join(2)
+    server.close()
+    assert b''.join(received) == b'piece;' * 8
+
+
+def test_async_never_blocks():
+    """
+    test
+    """
+    fake = FakeTransmitter(send_delay=0.2)
+    transmitter = AsyncTransmitter(fake, maxsize=2, policy=QueuePolicy.DROP_NEWEST)
+    transmitter.initialize()
+    start_time = time.perf_counter()
+    results = [transmitter.send_piece(bytes([i])) for i in range(10)]
+    assert time.perf_counter() - start_time < 0.1
+    assert not all(results)
+    assert transmitter.dropped == results.count(False)
+    transmitter.release(timeout=0.1)
+
+
+def test_async_reconnect():
+    """
+    test
+    """
+    fake = FakeTransmitter(failed_connections=2)
+    transmitter = AsyncTransmitter(fake, maxsize=16, backoff=(0.01, 0.02))
+    transmitter.initialize()
+    for i in range(5):
+        transmitter.send_piece(bytes([i]))
+    transmitter.release(timeout=2)
+    assert fake.connections == 3
+    assert transmitter.errors == 2
+    assert fake.records == [bytes([i]) for i in range(5)]
+    assert transmitter.sent == 5
+
+    # Initialized again after release, like the wrapped transmitter
+    transmitter.initialize()
+    assert transmitter.send_piece(b'x')
+    transmitter.release(timeout=2)
+    assert fake.records[-1] == b'x'
+    assert transmitter.sent == 1 and transmitter.dropped == 0
+
+
+def main():
+    """
+    main
+    """
+    test_pipelined_acks()
+    test_async_never_blocks()
+    test_async_reconnect()
+
+
+if __name__ == '__main__':
+    main()
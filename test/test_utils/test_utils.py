@@ -0,0 +1,75 @@
+"""
+test_utils.py
+"""
+
+import itertools
+
+import numpy as np
+
+from src import utils as ut
+
+
+def test_validate_roi():
+    """
+    test
+    """
+    assert ut.validate_roi(None, (640, 480)) == (0, 0, 640, 480)
+    assert ut.validate_roi((0, 60, 640, 360), (640, 480)) == (0, 60, 640, 360)
+    for roi in [(0, 200, 640, 360), (-1, 0, 10, 10), (0, 0, 0, 10), (0, 0, 10.5, 10)]:
+        try:
+            ut.validate_roi(roi, (640, 480))
+        except ValueError as e:
+            print('OK', e)
+        else:
+            raise AssertionError(f'ROI {roi} should be invalid')
+
+
+def test_crop_roi():
+    """
+    test
+    """
+    image = np.zeros((480, 640, 3), dtype=np.uint8)
+    crop = ut.crop_roi(image, (10, 60, 600, 360))
+    assert crop.shape == (360, 600, 3)
+    assert np.shares_memory(crop, image)
+    assert ut.crop_roi(image, None) is image
+    print('OK')
+
+
+def test_linear_sum_assignment():
+    """
+    test
+    """
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n_rows, n_cols = (int(i) for i in rng.integers(1, 6, size=2))
+        cost = rng.random((n_rows, n_cols))
+        rows, cols = ut.linear_sum_assignment(cost)
+        assert len(rows) == len(set(rows.tolist())) == min(n_rows, n_cols)
+        assert len(cols) == len(set(cols.tolist()))
+
+        # Brute force
+        if n_rows <= n_cols:
+            best = min(sum(cost[i, p[i]] for i in range(n_rows))
+                       for p in itertools.permutations(range(n_cols), n_rows))
+        else:
+            best = min(sum(cost[p[j], j] for j in range(n_cols))
+                       for p in itertools.permutations(range(n_rows), n_cols))
+        assert np.isclose(cost[rows, cols].sum(), best)
+
+    rows, cols = ut.linear_sum_assignment(np.empty((0, 3)))
+    assert len(rows) == len(cols) == 0
+    print('OK')
+
+
+def main():
+    """
+    main
+    """
+    test_validate_roi()
+    test_crop_roi()
+    test_linear_sum_assignment()
+
+
+if __name__ == '__main__':
+    main()